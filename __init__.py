@@ -1,6 +1,9 @@
-from .src.chunker2.chunk_extractor import ChunkExtractor2
-from .src.code_analyser.code_analyser import CodeAnalyser
-from .src.fetcher.git_handler import GitHandler
-from .src.fetcher.repository_manager import RepositoryManager
+from . import lazy
 
-__all__ = ["ChunkExtractor2", "CodeAnalyser", "GitHandler", "RepositoryManager"]
+__getattr__, __dir__, __all__ = lazy.lazyExports(__name__, {
+    "ChunkExtractor2": ".src.chunker2.chunk_extractor",
+    "CodeAnalyser": ".src.code_analyser.code_analyser",
+    "GitHandler": ".src.fetcher.git_handler",
+    "RepositoryManager": ".src.fetcher.repository_manager",
+    "Metrics": ".metrics",
+})
@@ -0,0 +1,134 @@
+import argparse
+import importlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+from typing import Callable, Dict
+
+# AST conversion and chunk-graph depth on deep and wide inputs: the cursor-based
+# walks against the recursive versions they replaced, by time, peak Python memory
+# (tracemalloc) and whether they finished at all
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+sys.path.insert(0, os.path.dirname(ROOT))
+
+
+def recursiveNodeToDict(node):
+    # The recursive conversion RepoAst.nodeToDict used before, kept as the baseline
+    return {
+        "type": node.type,
+        "start_point": node.start_point,
+        "end_point": node.end_point,
+        "children": [recursiveNodeToDict(child) for child in node.children],
+    }
+
+
+def recursiveMaxDepth(graph) -> int:
+    def depth(node_id: str) -> int:
+        return 1 + max((depth(child) for child in graph.edges.get(node_id, [])), default=0)
+    return depth(graph.root_id) if graph.root_id else 0
+
+
+# (language, source) per input; nesting is what the recursive versions choke on
+def deepJs(size: int) -> bytes:
+    return b"if (a) {" * size + b"b();" + b"}" * size
+
+
+def deepPython(size: int) -> bytes:
+    return b"x = " + b"(" * size + b"1" + b")" * size + b"\n"
+
+
+def wideJs(size: int) -> bytes:
+    return b"".join(b"function f%d(a, b) { return a + b * %d; }\n" % (i, i) for i in range(size))
+
+
+def minifiedJs(size: int) -> bytes:
+    return b"var x=" + b"+".join(b"a%d" % i for i in range(size)) + b";"
+
+
+INPUTS = {
+    "deep_js": ("javascript", deepJs),
+    "deep_python": ("python", deepPython),
+    "wide_js": ("javascript", wideJs),
+    "minified_js": ("javascript", minifiedJs),
+}
+
+
+def measure(function: Callable[[], object]) -> Dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        function()
+        error = None
+    except RecursionError as e:
+        error = f"RecursionError: {e}"
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 4), "peak_mb": round(peak / (1 << 20), 2), "error": error}
+
+
+def chainGraph(size: int):
+    models = importlib.import_module(PACKAGE + ".src.chunker.models")
+    graph = models.ChunkGraph()
+    previous = None
+    for index in range(size):
+        chunk_type = models.ChunkType.FILE if previous is None else models.ChunkType.FUNCTION
+        node = models.ChunkNode(f"f.py:{index}:{index}", chunk_type, "f.py", index, index, "")
+        graph.add_node(node)
+        if previous is not None:
+            graph.add_edge(previous, node.id)
+        previous = node.id
+    return graph
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark recursive against cursor-based AST traversal")
+    parser.add_argument("--size", type=int, default=5000, help="Nesting depth, or functions for the wide input")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", FutureWarning)
+    repo_ast = importlib.import_module(PACKAGE + ".src.ast_generator.repo_ast")
+    AstGenerator = importlib.import_module(PACKAGE + ".src.ast_generator.ast_generator").AstGenerator
+    generator = AstGenerator()
+    repoAst = repo_ast.RepoAst(generator)
+
+    results = {"size": args.size, "recursion_limit": sys.getrecursionlimit(), "inputs": {}}
+    for name, (language, build) in INPUTS.items():
+        source = build(args.size)
+        tree = generator.generateAstFromBytes(source, language)
+        root = tree.root_node
+        cases = {
+            "recursive_dict": lambda: recursiveNodeToDict(root),
+            "cursor_dict": lambda: repoAst.nodeToDict(root),
+            "cursor_dict_named": lambda: repoAst.nodeToDict(root, named_only=True),
+            "recursive_json": lambda: json.dump(recursiveNodeToDict(root), io.StringIO()),
+            "streamed_json": lambda: repoAst.writeNodeJson(root, io.StringIO()),
+        }
+        results["inputs"][name] = row = {"bytes": len(source), "nodes": root.descendant_count}
+        for case, function in cases.items():
+            row[case] = measure(function)
+            print(f"{name:12} {case:18} {row[case]['seconds']:8.3f} s {row[case]['peak_mb']:9.2f} MB  {row[case]['error'] or ''}")
+
+    graph = chainGraph(args.size)
+    results["chunk_graph"] = {
+        "recursive_max_depth": measure(lambda: recursiveMaxDepth(graph)),
+        "iterative_max_depth": measure(graph._get_max_depth),
+    }
+    for case, row in results["chunk_graph"].items():
+        print(f"{'chunk_graph':12} {case:18} {row['seconds']:8.3f} s {row['peak_mb']:9.2f} MB  {row['error'] or ''}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
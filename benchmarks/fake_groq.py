@@ -0,0 +1,194 @@
+import argparse
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# A local stand-in for the Groq chat completions API, for benchmarking the review
+# stage without network, keys or rate limits. It answers instructor's TOOLS-mode
+# requests with a tool call whose arguments are generated from the requested JSON
+# schema, after a configurable latency. Point the groq client at it with base_url
+# (or GROQ_BASE_URL)
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+_CHUNK_ID = re.compile(r"^### CHUNK (\S+)", re.MULTILINE)
+
+
+class SchemaFaker:
+    # Just enough of JSON schema for pydantic models: objects, $refs, arrays,
+    # integers with bounds, numbers, strings and booleans
+    def __init__(self, rng: random.Random, chunk_ids: List[str]):
+        self.rng = rng
+        self.chunk_ids = chunk_ids
+        self._next_id = itertools.count()
+
+    def value(self, schema: Dict, definitions: Dict, name: str = ""):
+        if "$ref" in schema:
+            return self.value(definitions[schema["$ref"].split("/")[-1]], definitions, name)
+        if "allOf" in schema:
+            return self.value(schema["allOf"][0], definitions, name)
+        if "anyOf" in schema:
+            return self.value(schema["anyOf"][0], definitions, name)
+
+        kind = schema.get("type")
+        if kind == "object" or "properties" in schema:
+            return {
+                key: self.value(child, definitions, key) for key, child in schema.get("properties", {}).items()
+            }
+        if kind == "array":
+            # A batch review answers every chunk the prompt numbered
+            count = len(self.chunk_ids) if self.chunk_ids else 1
+            return [self.value(schema.get("items", {}), definitions, name) for _ in range(count)]
+        if kind == "integer":
+            return self.rng.randint(int(schema.get("minimum", 1)), int(schema.get("maximum", 10)))
+        if kind == "number":
+            return round(self.rng.uniform(schema.get("minimum", 0.0), schema.get("maximum", 1.0)), 3)
+        if kind == "boolean":
+            return self.rng.random() < 0.5
+        if name == "chunk_id" and self.chunk_ids:
+            return self.chunk_ids[next(self._next_id) % len(self.chunk_ids)]
+        return f"synthetic {name or 'text'}"
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        latency: float = 0.2,
+        jitter: float = 0.1,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        super().__init__(address, FakeGroqHandler)
+        self.latency = latency
+        self.jitter = jitter
+        # Share of requests answered with a 429 and a short retry-after
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.rng.gauss(self.latency, self.jitter))
+
+    def throttle(self) -> bool:
+        with self.lock:
+            self.requests += 1
+            throttled = self.rng.random() < self.error_rate
+            self.throttled += throttled
+            return throttled
+
+    def startInBackground(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="fake-groq", daemon=True)
+        thread.start()
+        return thread
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.rstrip("/") != COMPLETIONS_PATH:
+            return self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        request = json.loads(body or b"{}")
+        time.sleep(self.server.delay())
+        if self.server.throttle():
+            return self._send(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}},
+                {"retry-after": "0.1"},
+            )
+        self._send(200, self.completion(request))
+
+    def completion(self, request: Dict) -> Dict:
+        messages = request.get("messages", [])
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        chunkIds = _CHUNK_ID.findall(prompt)
+
+        with self.server.lock:
+            rng = random.Random(self.server.rng.random())
+        tools = request.get("tools") or []
+        message: Dict = {"role": "assistant", "content": None}
+        if tools:
+            function = tools[0]["function"]
+            schema = function.get("parameters", {})
+            arguments = SchemaFaker(rng, chunkIds).value(schema, schema.get("$defs", {}))
+            message["tool_calls"] = [{
+                "id": f"call_{rng.getrandbits(32):08x}",
+                "type": "function",
+                "function": {"name": function["name"], "arguments": json.dumps(arguments)},
+            }]
+            finish = "tool_calls"
+        else:
+            message["content"] = "{}"
+            finish = "stop"
+
+        promptTokens = len(prompt) // 4
+        completionTokens = len(json.dumps(message)) // 4
+        return {
+            "id": f"chatcmpl-{rng.getrandbits(48):012x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish, "logprobs": None}],
+            "usage": {
+                "prompt_tokens": promptTokens,
+                "completion_tokens": completionTokens,
+                "total_tokens": promptTokens + completionTokens,
+            },
+        }
+
+    def _send(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        # Generous limits, so only the dispatcher's own budgets shape the traffic
+        self.send_header("x-ratelimit-remaining-requests", "100000")
+        self.send_header("x-ratelimit-remaining-tokens", "100000000")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve a fake Groq chat completions API")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeGroqServer(("127.0.0.1", args.port), args.latency, args.jitter, args.error_rate, args.seed)
+    # The first line tells a parent process where to connect
+    print(server.base_url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
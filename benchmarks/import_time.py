@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Import-time guard for the lazy package layout: every entry point is imported in a
+# fresh interpreter, timed, and checked for heavy dependencies it must not load
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+
+HEAVY_MODULES = ["groq", "instructor", "httpx", "llama_index", "tree_sitter_languages", "pygit2", "pydantic", "dotenv"]
+
+# module (relative to the package) -> heavy modules it is not allowed to import
+TARGETS = {
+    "": HEAVY_MODULES,
+    ".src": HEAVY_MODULES,
+    ".src.__main__": HEAVY_MODULES,
+    ".src.fetcher.parallel_cloner": ["groq", "instructor", "httpx", "llama_index", "tree_sitter_languages", "pydantic"],
+    ".src.code_analyser.scoring": ["groq", "instructor", "httpx", "llama_index", "tree_sitter_languages", "pygit2"],
+    ".src.code_analyser.code_analyser": ["groq", "instructor", "httpx", "llama_index", "tree_sitter_languages", "pygit2"],
+    ".src.chunker2.chunk_extractor": ["groq", "instructor", "httpx", "llama_index"],
+}
+
+PROBE = """
+import importlib, json, sys, time
+sys.path[:0] = [{parent!r}, {root!r}]
+start = time.perf_counter()
+importlib.import_module({module!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeat: int):
+    samples, loaded = [], []
+    for _ in range(repeat):
+        probe = PROBE.format(parent=os.path.dirname(ROOT), root=ROOT, module=module, heavy=HEAVY_MODULES)
+        output = subprocess.run(
+            [sys.executable, "-c", probe], capture_output=True, text=True, check=True, cwd=ROOT
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    return statistics.median(samples), loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure import time of each entry point")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None, help="Fail if any median import is slower")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if not PACKAGE.isidentifier():
+        print(f"The repository folder must be importable as a package, got {PACKAGE!r}", file=sys.stderr)
+        return 2
+
+    results, failed = [], False
+    for relative, forbidden in TARGETS.items():
+        module = PACKAGE + relative
+        try:
+            seconds, loaded = measure(module, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{module}: import failed\n{e.stderr}", file=sys.stderr)
+            failed = True
+            continue
+
+        leaked = [name for name in loaded if name in forbidden]
+        slow = args.max_seconds is not None and seconds > args.max_seconds
+        failed = failed or bool(leaked) or slow
+        results.append({"module": module, "seconds": round(seconds, 4), "loaded": loaded, "leaked": leaked})
+        status = "FAIL" if leaked or slow else "ok"
+        print(f"{status:4} {seconds * 1000:8.1f} ms  {module}" + (f"  leaked: {', '.join(leaked)}" if leaked else ""))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
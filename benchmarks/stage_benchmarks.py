@@ -0,0 +1,377 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# Stage benchmarks over a synthetic corpus: every stage runs in a fresh interpreter
+# (so peak RSS is its own), reads what the previous stage left in the work folder,
+# and reports throughput, peak RSS and the latency percentiles the metrics registry
+# recorded. Results are plain JSON; --compare flags regressions against a baseline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+STAGES = ["clone", "ast", "chunker", "chunker2", "review", "pipeline"]
+# What a stage reads from the work folder; run untimed first when not benchmarked themselves
+PREREQUISITES = {
+    "ast": ["clone"],
+    "chunker": ["clone"],
+    "chunker2": ["clone"],
+    "review": ["clone", "chunker2"],
+    "pipeline": ["clone"],
+}
+CLONE_FOLDER = "cloned_repos"
+SCHEMA_VERSION = 1
+
+
+def _import(module: str):
+    if os.path.dirname(ROOT) not in sys.path:
+        sys.path.insert(0, os.path.dirname(ROOT))
+    return importlib.import_module(PACKAGE + module)
+
+
+def _peakRssMb(who: int) -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1 << 20) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _clonedRepos() -> List[str]:
+    return sorted(
+        os.path.join(CLONE_FOLDER, name)
+        for name in os.listdir(CLONE_FOLDER)
+        if os.path.isdir(os.path.join(CLONE_FOLDER, name))
+    )
+
+
+def _codeAnalyser(config: Dict):
+    CodeAnalyser = _import(".src.code_analyser.code_analyser").CodeAnalyser
+    LlmDispatcher = _import(".src.code_analyser.llm_dispatcher").LlmDispatcher
+    ChunkDeduplicator = _import(".src.dedup.chunk_deduplicator").ChunkDeduplicator
+
+    # Budgets far above what the fake server can serve: the benchmark measures the
+    # pipeline, not the production rate limits
+    dispatcher = LlmDispatcher(
+        ["benchmark-key"],
+        max_in_flight=config["llm_in_flight"],
+        requests_per_minute=1e9,
+        tokens_per_minute=1e12,
+        base_url=config["llm_url"],
+    )
+    deduplicator = ChunkDeduplicator() if config["dedup"] else None
+    return CodeAnalyser(dispatcher=dispatcher, deduplicator=deduplicator)
+
+
+def stageClone(config: Dict) -> None:
+    GitHandler = _import(".src.fetcher.git_handler").GitHandler
+    RepositoryManager = _import(".src.fetcher.repository_manager").RepositoryManager
+    ParallelCloner = _import(".src.fetcher.parallel_cloner").ParallelCloner
+
+    shutil.rmtree(CLONE_FOLDER, ignore_errors=True)
+    cloner = ParallelCloner(RepositoryManager(GitHandler()), workers=config["clone_workers"])
+    results = cloner.clone_all(["file://" + path for path in config["repos"]], CLONE_FOLDER)
+    failed = [result for result in results if result.error]
+    if failed:
+        raise RuntimeError(f"{len(failed)} clones failed, first: {failed[0].error}")
+
+
+def stageAst(config: Dict) -> None:
+    from concurrent.futures import ProcessPoolExecutor
+
+    repo_ast = _import(".src.ast_generator.repo_ast")
+    AstGenerator = _import(".src.ast_generator.ast_generator").AstGenerator
+
+    repoAst = repo_ast.RepoAst(AstGenerator())
+    if config["ast_workers"] <= 1:
+        for repoPath in _clonedRepos():
+            repoAst.processDirectory(repoPath, ast_format=config["ast_format"])
+        return
+    with ProcessPoolExecutor(max_workers=config["ast_workers"], initializer=repo_ast.initWorker) as pool:
+        for repoPath in _clonedRepos():
+            repoAst.processDirectory(
+                repoPath, ast_format=config["ast_format"], workers=config["ast_workers"], executor=pool
+            )
+
+
+def stageChunker(config: Dict) -> None:
+    ChunkExtractor = _import(".src.chunker.chunk_extractor").ChunkExtractor
+    for repoPath in _clonedRepos():
+        ChunkExtractor(repoPath, ast_format=config["ast_format"]).extract_chunks()
+
+
+def stageChunker2(config: Dict) -> None:
+    ChunkExtractor2 = _import(".src.chunker2.chunk_extractor").ChunkExtractor2
+    ChunkExtractor2().processRepos(CLONE_FOLDER)
+
+
+def stageReview(config: Dict) -> None:
+    _codeAnalyser(config).processAllRepos(CLONE_FOLDER)
+
+
+def stagePipeline(config: Dict) -> None:
+    ChunkExtractor2 = _import(".src.chunker2.chunk_extractor").ChunkExtractor2
+    PipelineRunner = _import(".src.pipeline.pipeline_runner").PipelineRunner
+    PipelineRunner(ChunkExtractor2(), _codeAnalyser(config)).run(_clonedRepos())
+
+
+STAGE_FUNCTIONS = {
+    "clone": stageClone,
+    "ast": stageAst,
+    "chunker": stageChunker,
+    "chunker2": stageChunker2,
+    "review": stageReview,
+    "pipeline": stagePipeline,
+}
+
+
+def runChild(stage: str, config: Dict) -> Dict:
+    registry = _import(".metrics").registry
+    started = time.perf_counter()
+    STAGE_FUNCTIONS[stage](config)
+    seconds = time.perf_counter() - started
+    report = registry.report()
+
+    # Counters are summed over repositories; per-repository histograms (the stage
+    # timers) are covered by the report's stage totals instead
+    counters: Dict[str, float] = {}
+    for item in report["counters"]:
+        name = _metricName(item)
+        counters[name] = counters.get(name, 0) + item["value"]
+    latency = {
+        _metricName(item): {key: item[key] for key in ("count", "mean", "p50", "p90", "p99", "max") if key in item}
+        for item in report["histograms"]
+        if "repo" not in item["labels"]
+    }
+    return {
+        "seconds": seconds,
+        "peak_rss_mb": _peakRssMb(resource.RUSAGE_SELF),
+        "children_peak_rss_mb": _peakRssMb(resource.RUSAGE_CHILDREN),
+        "stages": report["stages"],
+        "counters": counters,
+        "latency": latency,
+    }
+
+
+def _metricName(item: Dict) -> str:
+    labels = ",".join(f"{key}={value}" for key, value in sorted(item["labels"].items()) if key != "repo")
+    return f"{item['name']}{{{labels}}}" if labels else item["name"]
+
+
+def runStage(stage: str, config: Dict, workdir: str, repeat: int) -> Dict:
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", stage, "--config", json.dumps(config)],
+            cwd=workdir,
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Stage {stage} failed:\n{completed.stderr[-4000:]}")
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    # Median time over the repeats, the worst memory, the counters and latencies of the median run
+    median = sorted(runs, key=lambda run: run["seconds"])[len(runs) // 2]
+    corpus = config["corpus"]
+    seconds = statistics.median(run["seconds"] for run in runs)
+    return {
+        "seconds": round(seconds, 4),
+        "runs": [round(run["seconds"], 4) for run in runs],
+        "files_per_second": round(corpus["files"] / seconds, 2) if seconds else None,
+        "mb_per_second": round(corpus["bytes"] / 1e6 / seconds, 3) if seconds else None,
+        "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+        "children_peak_rss_mb": max(run["children_peak_rss_mb"] for run in runs),
+        "stage_timers": median["stages"],
+        "counters": median["counters"],
+        "latency": median["latency"],
+    }
+
+
+def corpusStats(repoPaths: List[str]) -> Dict:
+    languageExtensions = _import(".src.ast_generator.languages").languageExtensions
+    files = size = 0
+    for repoPath in repoPaths:
+        for root, dirs, names in os.walk(repoPath):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in names:
+                if os.path.splitext(name)[1][1:].lower() in languageExtensions:
+                    files += 1
+                    size += os.path.getsize(os.path.join(root, name))
+    return {"repos": len(repoPaths), "files": files, "bytes": size}
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+    }
+
+
+def startFakeServer(args) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable, os.path.join(HERE, "fake_groq.py"),
+            "--latency", str(args.latency),
+            "--jitter", str(args.jitter),
+            "--error-rate", str(args.error_rate),
+            "--seed", str(args.seed),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    server.base_url = server.stdout.readline().strip()
+    return server
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    # A stage regresses when it got slower or bigger than the baseline by more than tolerance
+    regressions = []
+    if results.get("corpus") != baseline.get("corpus"):
+        print("warning: the baseline was measured on a different corpus", file=sys.stderr)
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous is None:
+            continue
+        for key in ("seconds", "peak_rss_mb"):
+            before, after = previous.get(key), current.get(key)
+            if not before or after is None:
+                continue
+            change = after / before - 1
+            status = "REGRESSION" if change > tolerance else "ok"
+            print(f"{status:10} {stage:10} {key:12} {before:10.3f} -> {after:10.3f} ({change:+.1%})")
+            if change > tolerance:
+                regressions.append(f"{stage}.{key}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on a synthetic corpus")
+    parser.add_argument("--workdir", help="Work folder (default: a temporary one, removed afterwards)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma separated subset of {STAGES}")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the median time is reported")
+    parser.add_argument("--repos", type=int, default=8)
+    parser.add_argument("--files", type=int, default=50, help="Source files per repository")
+    parser.add_argument("--lines", type=int, default=200, help="Mean lines per file")
+    parser.add_argument("--mix", help="Language mix by extension, e.g. py=3,js=1,go=1")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean fake LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake LLM calls answered with a 429")
+    parser.add_argument("--llm-in-flight", type=int, default=16)
+    parser.add_argument("--clone-workers", type=int, default=8)
+    parser.add_argument("--ast-workers", type=int, default=1)
+    parser.add_argument("--ast-format", choices=["json", "binary"], default="json")
+    parser.add_argument("--no-dedup", action="store_true")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown or growth before failing")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(runChild(args.child, json.loads(args.config))))
+        return 0
+
+    if not PACKAGE.isidentifier():
+        print(f"The repository folder must be importable as a package, got {PACKAGE!r}", file=sys.stderr)
+        return 2
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGE_FUNCTIONS]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    synthetic_repos = importlib.import_module("synthetic_repos")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="review-bench-")
+    server: Optional[subprocess.Popen] = None
+    try:
+        repos = synthetic_repos.generateCorpus(
+            os.path.join(workdir, "corpus"),
+            args.repos,
+            args.files,
+            args.lines,
+            synthetic_repos.parseMix(args.mix),
+            args.duplicate_ratio,
+            args.seed,
+        )
+        config = {
+            "repos": [os.path.abspath(path) for path in repos],
+            "corpus": corpusStats(repos),
+            "clone_workers": args.clone_workers,
+            "ast_workers": args.ast_workers,
+            "ast_format": args.ast_format,
+            "llm_in_flight": args.llm_in_flight,
+            "dedup": not args.no_dedup,
+            "llm_url": None,
+        }
+        if {"review", "pipeline"} & set(stages):
+            server = startFakeServer(args)
+            config["llm_url"] = server.base_url
+
+        results = {
+            "schema": SCHEMA_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": environment(),
+            "config": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("workdir", "output", "compare", "child", "config")
+            },
+            "corpus": config["corpus"],
+            "stages": {},
+        }
+        done = set()
+        for stage in stages:
+            for prerequisite in PREREQUISITES.get(stage, []):
+                if prerequisite not in done:
+                    runStage(prerequisite, config, workdir, 1)
+                    done.add(prerequisite)
+            results["stages"][stage] = stage_result = runStage(stage, config, workdir, args.repeat)
+            done.add(stage)
+            print(
+                f"{stage:10} {stage_result['seconds']:8.2f} s  {stage_result['files_per_second']:9.1f} files/s  "
+                f"{stage_result['peak_rss_mb']:8.1f} MB peak"
+            )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import argparse
+import importlib
+import os
+import random
+import shutil
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+# Synthetic hackathon repos for the stage benchmarks: seeded, so the same
+# arguments always produce byte-identical repositories and comparable numbers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+sys.path.insert(0, os.path.dirname(ROOT))
+# The package __init__s are lazy, so this loads the extension table and nothing else
+languageExtensions = importlib.import_module(PACKAGE + ".src.ast_generator.languages").languageExtensions
+
+DEFAULT_MIX = {"py": 4, "js": 2, "ts": 1, "java": 1, "go": 1}
+# Fixed commit dates keep the commit ids stable between runs
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_AUTHOR_DATE": "2024-01-01T00:00:00+0000",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_DATE": "2024-01-01T00:00:00+0000",
+}
+
+
+def _words(rng: random.Random, count: int) -> List[str]:
+    syllables = ["data", "user", "item", "load", "save", "calc", "node", "page", "team", "score", "repo", "task"]
+    return [rng.choice(syllables) + rng.choice(syllables).title() for _ in range(count)]
+
+
+def pythonFunction(rng: random.Random, name: str, lines: int) -> str:
+    args = _words(rng, rng.randint(1, 3))
+    body = [f"def {name}({', '.join(args)}):", f'    """Compute {name} for the given {args[0]}."""', "    result = []"]
+    for index in range(max(lines - 5, 1)):
+        var = rng.choice(args)
+        if index % 4 == 0:
+            body.append(f"    if {var} is not None and len(str({var})) > {rng.randint(1, 9)}:")
+            body.append(f"        result.append(str({var}).upper())")
+        else:
+            body.append(f"    {var}_{index} = {rng.randint(0, 999)} * {rng.randint(1, 99)} + len(result)")
+    body.append("    return result")
+    return "\n".join(body) + "\n"
+
+
+def braceFunction(rng: random.Random, name: str, lines: int, language: str) -> str:
+    args = _words(rng, rng.randint(1, 3))
+    if language == "go":
+        header = f"func {name}({', '.join(arg + ' int' for arg in args)}) int {{"
+        declare = "total := 0"
+    elif language == "java":
+        header = f"    public static int {name}({', '.join('int ' + arg for arg in args)}) {{"
+        declare = "int total = 0;"
+    elif language in ("typescript", "typescript react"):
+        header = f"export function {name}({', '.join(arg + ': number' for arg in args)}): number {{"
+        declare = "let total = 0;"
+    elif language in ("c", "c++", "c#"):
+        header = f"int {name}({', '.join('int ' + arg for arg in args)}) {{"
+        declare = "int total = 0;"
+    else:
+        header = f"function {name}({', '.join(args)}) {{"
+        declare = "let total = 0;"
+    end = "" if language == "go" else ";"
+    body = [header, f"    {declare}"]
+    for index in range(max(lines - 4, 1)):
+        var = rng.choice(args)
+        if index % 3 == 0:
+            body.append(f"    if ({var} > {rng.randint(0, 99)}) {{ total += {var} * {rng.randint(1, 9)}{end} }}")
+        else:
+            body.append(f"    total = total + {var} - {rng.randint(0, 999)}{end}")
+    body.append(f"    return total{end}")
+    body.append("    }" if language == "java" else "}")
+    return "\n".join(body) + "\n"
+
+
+def sourceFile(rng: random.Random, extension: str, lines: int) -> str:
+    language = languageExtensions.get(extension, "unknown")
+    functions, written = [], 0
+    while written < lines:
+        size = rng.randint(8, 40)
+        name = "".join(_words(rng, 1)) + str(len(functions))
+        if language == "python":
+            functions.append(pythonFunction(rng, name, size))
+        else:
+            functions.append(braceFunction(rng, name, size, language))
+        written += size
+
+    if language == "python":
+        return "import os\nimport json\n\n\n" + "\n\n".join(functions)
+    if language == "go":
+        return "package main\n\n" + "\n".join(functions)
+    if language == "java":
+        return "public class Main {\n" + "\n".join(functions) + "}\n"
+    return "\n".join(functions)
+
+
+def parseMix(value: Optional[str]) -> Dict[str, float]:
+    # "py=3,js=1" or "py,js"; extensions must be ones the pipeline knows
+    if not value:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for item in value.split(","):
+        extension, _, weight = item.partition("=")
+        extension = extension.strip().lstrip(".")
+        if extension not in languageExtensions:
+            raise ValueError(f"Unknown extension {extension!r}, expected one of {sorted(languageExtensions)}")
+        mix[extension] = float(weight or 1)
+    return mix
+
+
+def commitAll(repoPath: str) -> None:
+    env = dict(os.environ, **GIT_ENV)
+    for command in (["git", "init", "-q"], ["git", "add", "-A"], ["git", "commit", "-q", "-m", "Initial commit"]):
+        subprocess.run(command, cwd=repoPath, env=env, check=True, capture_output=True)
+
+
+def generateCorpus(
+    directory: str,
+    repos: int = 8,
+    files: int = 50,
+    lines: int = 200,
+    mix: Optional[Dict[str, float]] = None,
+    duplicate_ratio: float = 0.1,
+    seed: int = 0,
+) -> List[str]:
+    # duplicate_ratio of the files are copies of files in other repos, like shared templates
+    rng = random.Random(seed)
+    mix = mix or dict(DEFAULT_MIX)
+    extensions, weights = list(mix), list(mix.values())
+    os.makedirs(directory, exist_ok=True)
+
+    repoPaths, shared = [], []
+    for repoIndex in range(repos):
+        repoPath = os.path.join(directory, f"team{repoIndex:03d}")
+        # Regenerated from scratch, so a reused directory holds exactly this corpus
+        shutil.rmtree(repoPath, ignore_errors=True)
+        os.makedirs(repoPath)
+        for fileIndex in range(files):
+            if shared and rng.random() < duplicate_ratio:
+                extension, content = rng.choice(shared)
+            else:
+                extension = rng.choices(extensions, weights)[0]
+                content = sourceFile(rng, extension, max(int(rng.gauss(lines, lines / 3)), 10))
+                shared.append((extension, content))
+            folder = os.path.join(repoPath, "src", f"module{fileIndex % 5}")
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, f"file{fileIndex}.{extension}"), "w") as f:
+                f.write(content)
+        with open(os.path.join(repoPath, "README.md"), "w") as f:
+            f.write(f"# Team {repoIndex}\n\nSynthetic benchmark repository.\n")
+        commitAll(repoPath)
+        repoPaths.append(repoPath)
+    return repoPaths
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic git repositories for benchmarking")
+    parser.add_argument("directory")
+    parser.add_argument("--repos", type=int, default=8)
+    parser.add_argument("--files", type=int, default=50, help="Source files per repository")
+    parser.add_argument("--lines", type=int, default=200, help="Mean lines per file")
+    parser.add_argument("--mix", help="Language mix by extension, e.g. py=3,js=1,go=1")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generateCorpus(
+        args.directory, args.repos, args.files, args.lines, parseMix(args.mix), args.duplicate_ratio, args.seed
+    )
+    print("\n".join(paths))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+import importlib
+import sys
+from typing import Callable, Dict, List, Tuple
+
+
+def lazyExports(package: str, exports: Dict[str, str]) -> Tuple[Callable, Callable, List[str]]:
+    # (__getattr__, __dir__, __all__) for a package __init__. exports maps each public
+    # name to the module that defines it, relative to the package; a name is imported
+    # on first access, so importing the package does not pull in every stage's dependencies
+    namespace = sys.modules[package].__dict__
+
+    def __getattr__(name):
+        module = exports.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module, package), name)
+        namespace[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(exports))
+
+    return __getattr__, __dir__, list(exports)
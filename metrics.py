@@ -0,0 +1,282 @@
+import bisect
+import contextlib
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Seconds, from a fast parse to a slow LLM call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PROMETHEUS_PREFIX = "code_review_"
+PROFILERS = ("cprofile", "pyinstrument")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+    # Cumulative-friendly bucket counts plus exact count, sum, min and max;
+    # percentiles are interpolated inside the bucket they fall in
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, percentile: float) -> float:
+        if not self.count:
+            return math.nan
+        rank = percentile / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.buckets[index - 1] if index > 0 else self.min
+                high = self.buckets[index] if index < len(self.buckets) else self.max
+                low, high = max(low, self.min), min(high, self.max)
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        if not self.count:
+            return {"count": 0, "sum": 0.0}
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6),
+            "min": round(self.min, 6),
+            "max": round(self.max, 6),
+            "p50": round(self.percentile(50), 6),
+            "p90": round(self.percentile(90), 6),
+            "p99": round(self.percentile(99), 6),
+        }
+
+
+class Metrics:
+    # Process-wide counters, histograms and stage timers. Every stage records into
+    # the same registry, which a run exports once as a JSON report and, if asked,
+    # in the Prometheus text format for a node exporter textfile collector
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # One profiler at a time: cProfile cannot run two sessions side by side
+        self._profiling = threading.Lock()
+        self._profileIds = itertools.count(1)
+        self.reset()
+        self.profile_stages: Optional[set] = set()
+        self.profiler = "cprofile"
+        self.profile_dir = "profiles"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self._counters: Dict[Tuple[str, Labels], float] = {}
+            self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @contextlib.contextmanager
+    def stage(self, name: str, **labels):
+        # Times a pipeline stage into stage_seconds and runs the profiler around it when enabled
+        profiler = self._startProfiler(name)
+        try:
+            with self.timer("stage_seconds", stage=name, **labels):
+                yield
+        finally:
+            if profiler is not None:
+                self._stopProfiler(name, profiler)
+
+    def enableProfiling(
+        self, stages: Optional[Iterable[str]] = None, profiler: str = "cprofile", directory: str = "profiles"
+    ) -> None:
+        # stages=None profiles every stage; nested stages are covered by the outermost one
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler}, expected one of {PROFILERS}")
+        if profiler == "pyinstrument":
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError as e:
+                raise ImportError("The pyinstrument profiler needs pyinstrument installed") from e
+        self.profile_stages = None if stages is None else set(stages)
+        self.profiler = profiler
+        self.profile_dir = directory
+
+    def _startProfiler(self, name: str):
+        if self.profile_stages is not None and name not in self.profile_stages:
+            return None
+        if getattr(self._local, "profiling", False) or not self._profiling.acquire(blocking=False):
+            return None
+        self._local.profiling = True
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+        else:
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def _stopProfiler(self, name: str, profiler) -> None:
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{name}-{next(self._profileIds)}")
+            if self.profiler == "pyinstrument":
+                profiler.stop()
+                with open(path + ".html", "w") as f:
+                    f.write(profiler.output_html())
+            else:
+                profiler.disable()
+                # Readable with pstats, snakeviz or gprof2dot
+                profiler.dump_stats(path + ".prof")
+        finally:
+            self._local.profiling = False
+            self._profiling.release()
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _labels(labels)), 0)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        with self._lock:
+            return self._histograms.get((name, _labels(labels)))
+
+    def report(self) -> Dict:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            started = self.started
+
+        # Stage totals across their labels, the first thing to read when looking for the time
+        stages: Dict[str, Dict[str, float]] = {}
+        for (name, labels), histogram in histograms:
+            if name != "stage_seconds":
+                continue
+            stage = dict(labels)["stage"]
+            totals = stages.setdefault(stage, {"runs": 0, "seconds": 0.0, "max_seconds": 0.0})
+            totals["runs"] += histogram.count
+            totals["seconds"] = round(totals["seconds"] + histogram.sum, 6)
+            totals["max_seconds"] = round(max(totals["max_seconds"], histogram.max), 6)
+
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "seconds": round(time.time() - started, 3),
+            "stages": stages,
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters
+            ],
+            "histograms": [
+                {"name": name, "labels": dict(labels), **histogram.summary()}
+                for (name, labels), histogram in histograms
+            ],
+        }
+
+    def writeReport(self, path: str) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+
+        lines: List[str] = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = PROMETHEUS_PREFIX + name + "_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format(labels)} {_number(value)}")
+        for (name, labels), histogram in histograms:
+            metric = PROMETHEUS_PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (math.inf,), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _number(bound)
+                lines.append(f"{metric}_bucket{_format(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{metric}_sum{_format(labels)} {_number(histogram.sum)}")
+            lines.append(f"{metric}_count{_format(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def writePrometheus(self, path: str) -> None:
+        # Written aside and renamed, so a collector never reads half a file
+        temporary = path + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(self.prometheus())
+        os.replace(temporary, path)
+
+
+def _format(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# The registry every stage records into
+registry = Metrics()
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    registry.count(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    registry.observe(name, value, **labels)
+
+
+def timer(name: str, **labels):
+    return registry.timer(name, **labels)
+
+
+def stage(name: str, **labels):
+    return registry.stage(name, **labels)
@@ -1,13 +1,9 @@
-from .ast_generator.repo_ast import RepoAst
-from .ast_generator.ast_generator import AstGenerator
-from .chunker.chunk_extractor import ChunkExtractor
-from .chunker2.chunk_extractor import ChunkExtractor2
-from .code_analyser.code_analyser import CodeAnalyser
+from .. import lazy
 
-__all__ = [
-    "RepoAst",
-    "AstGenerator",
-    "ChunkExtractor",
-    "ChunkExtractor2",
-    "CodeAnalyser",
-]
+__getattr__, __dir__, __all__ = lazy.lazyExports(__name__, {
+    "RepoAst": ".ast_generator.repo_ast",
+    "AstGenerator": ".ast_generator.ast_generator",
+    "ChunkExtractor": ".chunker.chunk_extractor",
+    "ChunkExtractor2": ".chunker2.chunk_extractor",
+    "CodeAnalyser": ".code_analyser.code_analyser",
+})
@@ -1,16 +1,27 @@
-from .chunker2.chunk_extractor import ChunkExtractor2
-from .code_analyser.code_analyser import CodeAnalyser
-from .fetcher.git_handler import GitHandler
-from .fetcher.repository_manager import RepositoryManager
-import logger
+import argparse
+import os
+from .. import logger, metrics
+
+# Stage modules are imported inside the functions that use them, so --help and
+# clone-only runs do not load tree-sitter, llama-index or the LLM clients
 
 def fetch_repository(url: str, base_path: str) -> str:
+    from .fetcher.git_handler import GitHandler
+    from .fetcher.repository_manager import RepositoryManager
+
     git_handler = GitHandler()
     repo_manager = RepositoryManager(git_handler)
     
     repo_manager.clone_repository(url, base_path)
 
-def codeReviewer(repos):
+def codeReviewer(repos, use_cache=True, purge_cache=False, incremental=False, clone_workers=8, no_checkout=False, streaming=False, persist=True, leaderboard=None, leaderboard_format="parquet", deduplicate=True, report=None, prometheus=None):
+    from .chunker2.chunk_extractor import ChunkExtractor2
+    from .code_analyser.code_analyser import CodeAnalyser
+    from .code_analyser.review_cache import ReviewCache
+    from .code_analyser.score_aggregator import ScoreAggregator
+    from .fetcher.git_handler import GitHandler
+    from .fetcher.repository_manager import RepositoryManager
+
     logs = logger.setupLogger()
     if repos != []:
         repos = eval(repos)
@@ -19,14 +30,137 @@ def codeReviewer(repos):
 
     cloneRepoPath = "./cloned_repos"
 
-    chunk_extractor = ChunkExtractor2()
-    code_analyser = CodeAnalyser()
+    cache = None
+    if use_cache or purge_cache:
+        cache = ReviewCache(os.path.join(cloneRepoPath, ReviewCache.DEFAULT_FILENAME))
+        if purge_cache:
+            cache.purge()
+        if not use_cache:
+            cache.close()
+            cache = None
+
+    deduplicator = None
+    if deduplicate:
+        from .dedup.chunk_deduplicator import ChunkDeduplicator
+
+        # Copies of the same code across all repos of the run are reviewed once
+        deduplicator = ChunkDeduplicator()
+
+    code_analyser = CodeAnalyser(cache=cache, deduplicator=deduplicator)
+    # Chunks are sized to what one review request to this model can carry
+    chunk_extractor = ChunkExtractor2(model=code_analyser.model)
     git_handler = GitHandler()
     repo_manager = RepositoryManager(git_handler)
+    # Every review of the run, kept for the leaderboard export
+    aggregator = ScoreAggregator()
 
-    for repo in repos:
-        fetch_repository(repo, cloneRepoPath)
-    
-    repo_manager.complete_cleanup()
-    chunk_extractor.processRepos(cloneRepoPath)
-    code_analyser.processRepos(cloneRepoPath)
\ No newline at end of file
+    if incremental:
+        from .incremental.incremental_reviewer import IncrementalReviewer
+
+        # Keeps clones between runs and only re-reviews the review units of files changed
+        # since the last one. No IncrementalParser: a one-shot run has no trees from the
+        # previous run to reparse from, so it would only add a parse of the old version
+        reviewer = IncrementalReviewer(repo_manager, chunk_extractor, code_analyser)
+        scores = [reviewer.reviewRepository(repo, cloneRepoPath) for repo in repos]
+        if leaderboard:
+            # Only changed files were reviewed, so the full picture comes from the outputs on disk
+            for repo in repos:
+                code_analyser.scorer.loadInto(aggregator, repo_manager.get_repository_path(repo))
+    else:
+        from .fetcher.parallel_cloner import ParallelCloner
+
+        # Every stage reads the HEAD tree through RepositorySource, so a bare clone is enough
+        cloner = ParallelCloner(repo_manager, workers=clone_workers, bare=no_checkout)
+        with metrics.stage("clone"):
+            results = cloner.clone_all(repos, cloneRepoPath)
+
+        if streaming:
+            from .pipeline.pipeline_runner import PipelineRunner
+
+            runner = PipelineRunner(
+                chunk_extractor,
+                code_analyser,
+                persist_chunks=persist,
+                persist_outputs=persist,
+            )
+            with metrics.stage("pipeline"):
+                scores = runner.run([result.path for result in results if result.path], aggregator)
+        else:
+            chunk_extractor.processRepos(cloneRepoPath)
+            scores = code_analyser.processAllRepos(cloneRepoPath, aggregator)
+    key_metrics = code_analyser.dispatcherMetrics()
+    if key_metrics is not None:
+        logs.info(f"LLM key metrics: {key_metrics}")
+
+    if deduplicator is not None:
+        logs.info(f"Duplicate review units: {deduplicator.stats()}")
+        deduplicator.writeReport(os.path.join(cloneRepoPath, "duplicates.json"))
+
+    if leaderboard:
+        from .code_analyser.leaderboard import Leaderboard
+
+        with metrics.stage("leaderboard"):
+            board = Leaderboard.fromAggregator(aggregator, code_analyser.scorer.getGithubUrl)
+            paths = board.write(leaderboard, leaderboard_format)
+        logs.info(f"Leaderboard written to {', '.join(paths.values())}")
+
+    if cache is not None:
+        logs.info(f"Review cache stats: {cache.stats()}")
+        cache.close()
+
+    # Where the time went: stage timers, counters and latency histograms of the whole run
+    metrics.registry.writeReport(report or os.path.join(cloneRepoPath, "run_report.json"))
+    if prometheus:
+        metrics.registry.writePrometheus(prometheus)
+    return scores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Review hackathon repositories")
+    parser.add_argument("repos", help='List of repository URLs, e.g. \'["https://github.com/org/repo"]\'')
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk review cache")
+    parser.add_argument("--purge-cache", action="store_true", help="Clear the review cache before running")
+    parser.add_argument("--clone-workers", type=int, default=8, help="Number of repositories to clone in parallel")
+    parser.add_argument("--no-checkout", action="store_true", help="Clone bare and read sources straight from the git object store")
+    parser.add_argument("--streaming", action="store_true", help="Stream files through fetch, parse, chunk and review in memory")
+    parser.add_argument("--no-persist", action="store_true", help="With --streaming, skip writing chunk and output files")
+    parser.add_argument("--incremental", action="store_true", help="Only re-review files changed since the last reviewed commit")
+    parser.add_argument("--leaderboard", metavar="DIR", help="Export chunk and repo scores of all teams to DIR (needs pyarrow)")
+    parser.add_argument("--leaderboard-format", choices=("parquet", "ipc"), default="parquet", help="Parquet or Arrow IPC files")
+    parser.add_argument("--no-dedup", action="store_true", help="Review every copy of duplicated code separately")
+    parser.add_argument("--report", metavar="PATH", help="JSON run report (default: cloned_repos/run_report.json)")
+    parser.add_argument("--prometheus", metavar="PATH", help="Also write the metrics in Prometheus text format")
+    parser.add_argument("--profile", metavar="STAGE", action="append",
+                        help="Profile a stage (clone, chunk, review, pipeline, ...) or 'all'; repeatable")
+    parser.add_argument("--profiler", choices=metrics.PROFILERS, default="cprofile")
+    parser.add_argument("--profile-dir", default="profiles", help="Where profiles are written")
+    args = parser.parse_args()
+
+    if args.leaderboard:
+        from .code_analyser.leaderboard import requirePyarrow
+
+        # Fail before any cloning or reviewing rather than at export time
+        try:
+            requirePyarrow()
+        except ImportError as e:
+            parser.error(str(e))
+
+    if args.profile:
+        stages = None if "all" in args.profile else args.profile
+        metrics.registry.enableProfiling(stages, args.profiler, args.profile_dir)
+
+    codeReviewer(
+        args.repos,
+        use_cache=not args.no_cache,
+        purge_cache=args.purge_cache,
+        incremental=args.incremental,
+        clone_workers=args.clone_workers,
+        no_checkout=args.no_checkout,
+        streaming=args.streaming,
+        persist=not args.no_persist,
+        leaderboard=args.leaderboard,
+        leaderboard_format=args.leaderboard_format,
+        deduplicate=not args.no_dedup,
+        report=args.report,
+        prometheus=args.prometheus,
+    )
\ No newline at end of file
@@ -1,4 +1,12 @@
-from .repo_ast import RepoAst
-from .ast_generator import AstGenerator
+from ... import lazy
 
-__all__ = [RepoAst, AstGenerator]
\ No newline at end of file
+__getattr__, __dir__, __all__ = lazy.lazyExports(__name__, {
+    "RepoAst": ".repo_ast",
+    "AstGenerator": ".ast_generator",
+    "AstStore": ".ast_store",
+    "AstStoreWriter": ".ast_store",
+    "StoredNode": ".ast_store",
+    "ParserPool": ".parser_pool",
+    "IncrementalParser": ".incremental_parser",
+    "ParseUpdate": ".incremental_parser",
+})
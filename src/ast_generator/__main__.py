@@ -1,18 +1,57 @@
-from .repo_ast import RepoAst
+from .repo_ast import RepoAst, initWorker
 import os
 import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from .ast_generator import AstGenerator
+from ... import metrics
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate ASTs for every cloned repository")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Parser processes shared by all repositories")
+    parser.add_argument("--format", choices=["json", "binary"], default="json")
+    parser.add_argument("--report", metavar="PATH", help="Write parse timings and counters as JSON")
+    parser.add_argument("--prometheus", metavar="PATH", help="Also write them in Prometheus text format")
+    parser.add_argument("--profile", action="store_true", help="cProfile each repository's parse")
+    args = parser.parse_args()
+    if args.profile:
+        # Only the parent process is profiled; with --workers the parsing happens in the pool
+        metrics.registry.enableProfiling(["ast"])
+
     cloneRepoPath = './cloned_repos'
     logger = logging.getLogger(__name__)
     ast_generator = AstGenerator()
     repo_ast = RepoAst(ast_generator)
+
+    repoPaths = []
     for repoFolder in os.listdir(cloneRepoPath):
         repoPath = os.path.join(cloneRepoPath, repoFolder)
-        
+
         if os.path.isdir(repoPath):
             logger.info(f"Processing repository: {repoFolder}")
-            repo_ast.processDirectory(repoPath)
+            repoPaths.append(repoPath)
         else:
-            logger.info(f"Skipping non-directory item: {repoFolder}")
\ No newline at end of file
+            logger.info(f"Skipping non-directory item: {repoFolder}")
+
+    if args.workers <= 1:
+        for repoPath in repoPaths:
+            repo_ast.processDirectory(repoPath, ast_format=args.format)
+    else:
+        # One long-lived process pool; a thread per repo streams its files into it,
+        # so small repos never leave cores idle while a large one is still parsing
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=initWorker) as pool:
+            with ThreadPoolExecutor(max_workers=max(len(repoPaths), 1)) as feeders:
+                futures = [
+                    feeders.submit(
+                        repo_ast.processDirectory, repoPath, None, args.format, workers=args.workers, executor=pool
+                    )
+                    for repoPath in repoPaths
+                ]
+                for future in futures:
+                    future.result()
+
+    if args.report:
+        metrics.registry.writeReport(args.report)
+    if args.prometheus:
+        metrics.registry.writePrometheus(args.prometheus)
@@ -1,24 +1,30 @@
 import os
-from tree_sitter_languages import get_language, get_parser
 import logging
+from typing import Dict, Iterable, Optional
 from .languages import languageExtensions
+from .parser_pool import ParserPool, defaultParserPool
 
 
 class AstGenerator:
-    def __init__(self):
+    def __init__(self, pool: Optional[ParserPool] = None):
         self.logger = logging.getLogger(__name__)
+        self.pool = pool if pool is not None else defaultParserPool
+
+    def prewarm(self, languages: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        return self.pool.prewarm(languages)
 
     def detectLanguage(self, filePath: str) -> str:
         extension = os.path.splitext(filePath)[1][1:].lower()
         return languageExtensions.get(extension, "unknown")
 
     def generateAst(self, filePath: str, language: str):
-        lang = get_language(language)
+        lang = self.pool.language(language)
         if lang is None:
             self.logger.info(f"Language isn't supported of the file at: {filePath}")
+            return None
 
         try:
-            parser = get_parser(language)
+            parser = self.pool.parser(language)
             try:
                 with open(filePath, "r", encoding="utf-8") as file:
                     content = file.read()
@@ -32,3 +38,17 @@ class AstGenerator:
                 self.logger.info(f"Error parsing file: {e}")
         except Exception as e:
             self.logger.info(f"Error getting parser for language at: {filePath}")
+
+    def generateAstFromBytes(self, content: bytes, language: str, filePath: str = "<memory>", old_tree=None):
+        parser = self.pool.parser(language)
+        if parser is None:
+            self.logger.info(f"Error getting parser for language at: {filePath}")
+            return None
+
+        try:
+            # An edited old tree lets tree-sitter reuse every subtree outside the edits
+            if old_tree is not None:
+                return parser.parse(content, old_tree)
+            return parser.parse(content)
+        except Exception as e:
+            self.logger.info(f"Error parsing file: {e}")
@@ -0,0 +1,234 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Layout: header, then one uint32/int32 column per node field, then a JSON
+# footer holding the node type names and the per-file root indexes. Nodes of a
+# file are stored breadth-first, so a node's children occupy the contiguous
+# index range [first_child, first_child + child_count).
+MAGIC = b"ASTB"
+VERSION = 1
+HEADER = struct.Struct("<4sIIQQ")  # magic, version, byteorder flag, node count, footer offset
+COLUMNS = (
+    ("type_id", "I"),
+    ("start_row", "I"),
+    ("start_col", "I"),
+    ("end_row", "I"),
+    ("end_col", "I"),
+    ("parent", "i"),
+    ("first_child", "i"),
+    ("child_count", "I"),
+)
+_LITTLE = 1 if sys.byteorder == "little" else 0
+
+
+def flatten_tree(tree) -> Tuple[List[str], Dict[str, array]]:
+    # One file's nodes as breadth-first columns with file-local indexes and type ids
+    columns = {name: array(code) for name, code in COLUMNS}
+    types: Dict[str, int] = {}
+
+    pending = deque([(tree.root_node, -1)])
+    next_index = 1
+    index = 0
+    while pending:
+        node, parent = pending.popleft()
+        children = node.children
+        type_id = types.get(node.type)
+        if type_id is None:
+            type_id = types[node.type] = len(types)
+        columns["type_id"].append(type_id)
+        columns["start_row"].append(node.start_point[0])
+        columns["start_col"].append(node.start_point[1])
+        columns["end_row"].append(node.end_point[0])
+        columns["end_col"].append(node.end_point[1])
+        columns["parent"].append(parent)
+        columns["first_child"].append(next_index if children else -1)
+        columns["child_count"].append(len(children))
+
+        for child in children:
+            pending.append((child, index))
+        next_index += len(children)
+        index += 1
+
+    return sorted(types, key=types.get), columns
+
+
+class AstStoreWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.columns = {name: array(code) for name, code in COLUMNS}
+        self.type_ids: Dict[str, int] = {}
+        self.files: Dict[str, int] = {}
+
+    def _type_id(self, node_type: str) -> int:
+        type_id = self.type_ids.get(node_type)
+        if type_id is None:
+            type_id = self.type_ids[node_type] = len(self.type_ids)
+        return type_id
+
+    def add(self, file_path: str, tree) -> int:
+        return self.add_flat(file_path, *flatten_tree(tree))
+
+    def add_flat(self, file_path: str, types: List[str], columns: Dict[str, array]) -> int:
+        # Merges one file flattened by flatten_tree, possibly in another process:
+        # node indexes are shifted past the nodes already stored, type ids re-interned
+        root_index = len(self.columns["type_id"])
+        self.files[file_path] = root_index
+
+        type_ids = [self._type_id(node_type) for node_type in types]
+        self.columns["type_id"].extend(type_ids[type_id] for type_id in columns["type_id"])
+        for name in ("start_row", "start_col", "end_row", "end_col", "child_count"):
+            self.columns[name].extend(columns[name])
+        for name in ("parent", "first_child"):
+            self.columns[name].extend(
+                index + root_index if index >= 0 else -1 for index in columns[name]
+            )
+        return root_index
+
+    def close(self) -> str:
+        node_count = len(self.columns["type_id"])
+        types = sorted(self.type_ids, key=self.type_ids.get)
+
+        with open(self.path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, _LITTLE, node_count, 0))
+            for name, _ in COLUMNS:
+                self._align(f)
+                self.columns[name].tofile(f)
+            footer_offset = f.tell()
+            f.write(json.dumps({"types": types, "files": self.files}).encode("utf-8"))
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, _LITTLE, node_count, footer_offset))
+        return self.path
+
+    @staticmethod
+    def _align(f) -> None:
+        padding = -f.tell() % 8
+        if padding:
+            f.write(b"\0" * padding)
+
+
+class StoredNode:
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "AstStore", index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def type(self) -> str:
+        return self.store.types[self.store.type_id[self.index]]
+
+    @property
+    def start_point(self) -> Tuple[int, int]:
+        return (self.store.start_row[self.index], self.store.start_col[self.index])
+
+    @property
+    def end_point(self) -> Tuple[int, int]:
+        return (self.store.end_row[self.index], self.store.end_col[self.index])
+
+    @property
+    def parent(self) -> Optional["StoredNode"]:
+        parent = self.store.parent[self.index]
+        return StoredNode(self.store, parent) if parent >= 0 else None
+
+    @property
+    def child_count(self) -> int:
+        return self.store.child_count[self.index]
+
+    @property
+    def children(self) -> List["StoredNode"]:
+        first = self.store.first_child[self.index]
+        if first < 0:
+            return []
+        return [StoredNode(self.store, first + offset) for offset in range(self.child_count)]
+
+    # Dict-style access so consumers written against nodeToDict output work unchanged
+    def __getitem__(self, key: str):
+        if key in ("type", "start_point", "end_point", "children"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict:
+        return {
+            "type": self.type,
+            "start_point": self.start_point,
+            "end_point": self.end_point,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class AstStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, version, little, node_count, footer_offset = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not an AST store (or unsupported version): {path}")
+        if little != _LITTLE:
+            raise ValueError(f"AST store was written with a different byte order: {path}")
+
+        # Columns are zero-copy views into the mapping; nothing is parsed up front
+        offset = HEADER.size
+        self._views = []
+        for name, code in COLUMNS:
+            offset += -offset % 8
+            size = node_count * 4
+            column = view[offset:offset + size].cast(code)
+            self._views.append(column)
+            setattr(self, name, column)
+            offset += size
+
+        footer = json.loads(bytes(view[footer_offset:]).decode("utf-8"))
+        self.types: List[str] = footer["types"]
+        self.files: Dict[str, int] = footer["files"]
+        self.node_count = node_count
+        self._view = view
+
+    def node(self, index: int) -> StoredNode:
+        if not 0 <= index < self.node_count:
+            raise IndexError(index)
+        return StoredNode(self, index)
+
+    def root(self, file_path: str) -> StoredNode:
+        return StoredNode(self, self.files[file_path])
+
+    def iter_files(self) -> Iterator[Tuple[str, StoredNode]]:
+        for file_path, index in self.files.items():
+            yield file_path, StoredNode(self, index)
+
+    def close(self) -> None:
+        for column in self._views:
+            column.release()
+        self._views = []
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    @staticmethod
+    def reference(store_path: str, root_index: int) -> str:
+        # fileAstMap.json value pointing at one file's root inside a store
+        return f"{store_path}#{root_index}"
+
+    @staticmethod
+    def parse_reference(reference: str) -> Tuple[str, int]:
+        store_path, _, index = reference.rpartition("#")
+        return store_path, int(index)
+
+    @staticmethod
+    def is_reference(reference: str) -> bool:
+        store_path, _, index = reference.rpartition("#")
+        return bool(store_path) and index.isdigit() and os.path.splitext(store_path)[1] == ".astbin"
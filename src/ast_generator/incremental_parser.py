@@ -0,0 +1,177 @@
+import logging
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from .ast_generator import AstGenerator
+from ..fetcher.repository_manager import FileHunks, RepositoryManager
+from ..fetcher.repository_source import RepositorySource
+
+
+class CachedTree(NamedTuple):
+    oid: str
+    data: bytes
+    language: str
+    tree: Any
+
+
+class ParseUpdate(NamedTuple):
+    path: str
+    tree: Any
+    incremental: bool
+    # Inclusive 0-based line ranges in the new file
+    changed_lines: List[Tuple[int, int]]
+
+
+class IncrementalParser:
+    # Keeps the last tree of every file in memory so a new commit only costs
+    # tree-sitter an incremental reparse of the edited regions
+
+    def __init__(self, ast_generator: AstGenerator, repo_manager: RepositoryManager, max_files: int = 4096):
+        self.logger = logging.getLogger(__name__)
+        self.ast_generator = ast_generator
+        self.repo_manager = repo_manager
+        self.max_files = max_files
+        self._trees: "OrderedDict[str, CachedTree]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prime(self, repoPath: str, source: Optional[RepositorySource] = None) -> int:
+        if source is None:
+            source = RepositorySource.open(repoPath)
+        primed = 0
+        for blob in source.walk(include=self._isKnownLanguage):
+            language = self.ast_generator.detectLanguage(blob.path)
+            tree = self.ast_generator.generateAstFromBytes(blob.data, language, blob.path)
+            if tree is not None:
+                self._put(blob.path, CachedTree(blob.oid, blob.data, language, tree))
+                primed += 1
+        return primed
+
+    def update(self, repoPath: str, oldCommit: str, newCommit: str, source: Optional[RepositorySource] = None) -> Dict[str, ParseUpdate]:
+        if source is None:
+            source = RepositorySource.open(repoPath)
+
+        updates = {}
+        for relativePath, fileHunks in self.repo_manager.diff_hunks(repoPath, oldCommit, newCommit).items():
+            path = source.toPath(relativePath)
+            if not self._isKnownLanguage(path):
+                continue
+            try:
+                data = source.read(path)
+            except (OSError, KeyError):
+                continue
+            update = self.reparse(path, data, fileHunks, source.toPath(fileHunks.old_path))
+            if update is not None:
+                updates[path] = update
+        return updates
+
+    def reparse(self, path: str, data: bytes, fileHunks: FileHunks, oldPath: Optional[str] = None) -> Optional[ParseUpdate]:
+        language = self.ast_generator.detectLanguage(path)
+        cached = self._pop(oldPath or path)
+
+        # Only a tree of the exact old blob can be edited; anything else is a full parse
+        if cached is None or cached.oid != fileHunks.old_oid or cached.language != language:
+            tree = self.ast_generator.generateAstFromBytes(data, language, path)
+            if tree is None:
+                return None
+            self._put(path, CachedTree(fileHunks.new_oid, data, language, tree))
+            whole = [(0, tree.root_node.end_point[0])]
+            return ParseUpdate(path, tree, False, whole)
+
+        oldTree = cached.tree
+        edits = self.hunksToEdits(cached.data, data, fileHunks.hunks)
+        for edit in edits:
+            oldTree.edit(**edit)
+
+        tree = self.ast_generator.generateAstFromBytes(data, language, path, old_tree=oldTree)
+        if tree is None:
+            return None
+        self._put(path, CachedTree(fileHunks.new_oid, data, language, tree))
+
+        ranges = [(r.start_point[0], r.end_point[0]) for r in oldTree.changed_ranges(tree)]
+        # changed_ranges only covers structural changes; text edited inside a token is not in it
+        ranges += [(edit["start_point"][0], edit["new_end_point"][0]) for edit in edits]
+        changedLines = self.mergeRanges(ranges)
+        return ParseUpdate(path, tree, True, changedLines)
+
+    @staticmethod
+    def hunksToEdits(old: bytes, new: bytes, hunks: List[Tuple[int, int, int, int]]) -> List[Dict]:
+        # Edits are applied to the tree in order, so each is expressed in the
+        # document as it stands after the earlier ones: before a hunk, that is the new file
+        oldLines = IncrementalParser.lineOffsets(old)
+        newLines = IncrementalParser.lineOffsets(new)
+
+        edits = []
+        for oldStart, oldCount, newStart, newCount in hunks:
+            # git numbers lines from 1; an empty side names the line it follows
+            oldLine = oldStart - 1 if oldCount else oldStart
+            newLine = newStart - 1 if newCount else newStart
+
+            oldBegin = IncrementalParser._offset(old, oldLines, oldLine)
+            oldEnd = IncrementalParser._offset(old, oldLines, oldLine + oldCount)
+            startByte = IncrementalParser._offset(new, newLines, newLine)
+            newEnd = IncrementalParser._offset(new, newLines, newLine + newCount)
+
+            startPoint = IncrementalParser._point(newLines, startByte)
+            edits.append({
+                "start_byte": startByte,
+                "old_end_byte": startByte + (oldEnd - oldBegin),
+                "new_end_byte": newEnd,
+                "start_point": startPoint,
+                "old_end_point": IncrementalParser._advance(startPoint, old[oldBegin:oldEnd]),
+                "new_end_point": IncrementalParser._point(newLines, newEnd),
+            })
+        return edits
+
+    @staticmethod
+    def lineOffsets(data: bytes) -> List[int]:
+        offsets = [0]
+        index = data.find(b"\n")
+        while index != -1:
+            offsets.append(index + 1)
+            index = data.find(b"\n", index + 1)
+        return offsets
+
+    @staticmethod
+    def _offset(data: bytes, offsets: List[int], line: int) -> int:
+        return offsets[line] if line < len(offsets) else len(data)
+
+    @staticmethod
+    def _point(offsets: List[int], byte: int) -> Tuple[int, int]:
+        row = bisect_right(offsets, byte) - 1
+        return (row, byte - offsets[row])
+
+    @staticmethod
+    def _advance(point: Tuple[int, int], text: bytes) -> Tuple[int, int]:
+        newlines = text.count(b"\n")
+        if not newlines:
+            return (point[0], point[1] + len(text))
+        return (point[0] + newlines, len(text) - text.rfind(b"\n") - 1)
+
+    @staticmethod
+    def mergeRanges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        merged = []
+        for start, end in sorted(ranges):
+            end = max(start, end)
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def forget(self, path: str) -> None:
+        self._pop(path)
+
+    def _put(self, path: str, entry: CachedTree) -> None:
+        with self._lock:
+            self._trees[path] = entry
+            self._trees.move_to_end(path)
+            while len(self._trees) > self.max_files:
+                self._trees.popitem(last=False)
+
+    def _pop(self, path: str) -> Optional[CachedTree]:
+        with self._lock:
+            return self._trees.pop(path, None)
+
+    def _isKnownLanguage(self, path: str) -> bool:
+        return self.ast_generator.detectLanguage(path) != 'unknown'
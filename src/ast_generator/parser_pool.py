@@ -0,0 +1,59 @@
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+from tree_sitter_languages import get_language, get_parser
+from .languages import languageExtensions
+
+
+class ParserPool:
+    # Language objects are immutable and shared process-wide; tree-sitter parsers
+    # are not thread-safe, so each thread keeps its own warmed parser per language
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._languages: Dict[str, Optional[object]] = {}
+        self._languages_lock = threading.Lock()
+        self._local = threading.local()
+
+    def language(self, language: str):
+        try:
+            return self._languages[language]
+        except KeyError:
+            pass
+
+        with self._languages_lock:
+            if language not in self._languages:
+                try:
+                    self._languages[language] = get_language(language)
+                except Exception:
+                    # Remember unsupported grammars so they are not retried per file
+                    self._languages[language] = None
+            return self._languages[language]
+
+    def parser(self, language: str):
+        parsers = getattr(self._local, "parsers", None)
+        if parsers is None:
+            parsers = self._local.parsers = {}
+
+        if language not in parsers:
+            if self.language(language) is None:
+                parsers[language] = None
+            else:
+                try:
+                    parsers[language] = get_parser(language)
+                except Exception:
+                    parsers[language] = None
+        return parsers[language]
+
+    def prewarm(self, languages: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        if languages is None:
+            languages = set(languageExtensions.values())
+
+        loaded = {language: self.parser(language) is not None for language in languages}
+        self.logger.info(
+            f"Prewarmed {sum(loaded.values())}/{len(loaded)} tree-sitter grammars"
+        )
+        return loaded
+
+
+defaultParserPool = ParserPool()
@@ -1,56 +1,277 @@
 import os
+import time
 from .ast_generator import AstGenerator
+from .ast_store import AstStore, AstStoreWriter, flatten_tree
 import json
 import logging
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Collection, Dict, List, Optional, Tuple
+from ..fetcher.repository_source import RepositorySource
+from ... import metrics
+
+# Files are shipped to worker processes in batches of roughly this many bytes, so
+# one large file travels alone instead of holding up a batch of small ones
+DEFAULT_BATCH_BYTES = 1 << 20
+DEFAULT_BATCH_FILES = 256
+
+_workerRepoAst = None
+
+
+def initWorker():
+    # Runs once per worker process: grammars and parsers stay warm for its lifetime
+    global _workerRepoAst
+    _workerRepoAst = RepoAst(AstGenerator())
+    _workerRepoAst.ast_generator.prewarm()
+
+
+def parseBatch(
+    batch: List[Tuple[str, str, bytes]],
+    astsDir: str,
+    ast_format: str,
+    node_types: Optional[frozenset] = None,
+    named_only: bool = False,
+):
+    repoAst = _workerRepoAst if _workerRepoAst is not None else RepoAst(AstGenerator())
+    # Workers run one batch at a time, so the submitting RepoAst's filter can be set per batch
+    repoAst.node_types, repoAst.named_only = node_types, named_only
+    results = []
+    for filePath, relativePath, data in batch:
+        # Timed here, in the worker, and recorded by the parent when it merges the batch
+        started = time.perf_counter()
+        result = repoAst.parseFile(filePath, relativePath, data, astsDir, ast_format)
+        results.append((filePath, result, len(data), time.perf_counter() - started))
+    return results
+
 
 class RepoAst:
-    def __init__(self, ast_generator: AstGenerator):
+    def __init__(
+        self,
+        ast_generator: AstGenerator,
+        node_types: Optional[Collection[str]] = None,
+        named_only: bool = False,
+    ):
         self.logger = logging.getLogger(__name__)
         self.ast_generator = ast_generator
+        # Optional filter for the JSON ASTs: only these node types (and/or only named
+        # nodes) are written, e.g. to drop punctuation tokens from large files
+        self.node_types = frozenset(node_types) if node_types is not None else None
+        self.named_only = named_only
+
+    @staticmethod
+    def iterNodes(node, node_types: Optional[Collection[str]] = None, named_only: bool = False):
+        # Pre-order (node, depth) pairs from a tree cursor: no recursion, so deeply
+        # nested code cannot hit the recursion limit, and no node.children lists.
+        # Filtered out nodes are skipped and their kept descendants move up to the
+        # nearest kept ancestor; the starting node is always kept at depth 0
+        yield node, 0
+        cursor = node.walk()
+        if not cursor.goto_first_child():
+            return
+        levels = []
+        while True:
+            current = cursor.node
+            depth = levels[-1] if levels else 0
+            if (not named_only or current.is_named) and (node_types is None or current.type in node_types):
+                depth += 1
+                yield current, depth
+            levels.append(depth)
+            if cursor.goto_first_child():
+                continue
+            while True:
+                levels.pop()
+                if cursor.goto_next_sibling():
+                    break
+                if not levels:
+                    return
+                cursor.goto_parent()
+
+    def nodeToDict(self, node, node_types: Optional[Collection[str]] = None, named_only: bool = False):
+        root = None
+        stack = []
+        for current, depth in self.iterNodes(node, node_types, named_only):
+            result = {
+                "type": current.type,
+                "start_point": current.start_point,
+                "end_point": current.end_point,
+                "children": []
+            }
+            del stack[depth:]
+            if stack:
+                stack[-1]["children"].append(result)
+            else:
+                root = result
+            stack.append(result)
+        return root
+
+    def writeNodeJson(
+        self,
+        node,
+        f,
+        node_types: Optional[Collection[str]] = None,
+        named_only: bool = False,
+        indent: Optional[int] = None,
+    ):
+        # Streams what json.dump(self.nodeToDict(node), f, indent=indent) writes, byte
+        # for byte, without building the nested dicts (or recursing in the encoder).
+        # Indented output grows with the square of the nesting depth, so the AST
+        # files are written compact
+        if indent is None:
+            comma = ", "
+            line = lambda level: ""
+        else:
+            comma = ","
+            line = lambda level: "\n" + " " * (indent * level)
+
+        # A node's keys sit one level inside it, its children one level further;
+        # the whitespace only depends on the depth, so each depth gets one template
+        templates: Dict[int, str] = {}
+        closers: Dict[Tuple[int, bool], str] = {}
+        encoded: Dict[str, str] = {}
+
+        def template(depth):
+            keys, inner = line(2 * depth + 1), line(2 * depth + 2)
+            point = f"[{inner}%d{comma}{inner}%d{keys}]"
+            return (
+                f'{{{keys}"type": %s{comma}{keys}"start_point": {point}{comma}'
+                f'{keys}"end_point": {point}{comma}{keys}"children": ['
+            )
+
+        def closer(depth, has_children):
+            return f"{line(2 * depth + 1) if has_children else ''}]{line(2 * depth)}}}"
+
+        parts = []
+        # [depth, has children] of the nodes whose children list is still open
+        open_nodes = []
+        for current, depth in self.iterNodes(node, node_types, named_only):
+            while open_nodes and open_nodes[-1][0] >= depth:
+                key = tuple(open_nodes.pop())
+                parts.append(closers.get(key) or closers.setdefault(key, closer(*key)))
+            if open_nodes:
+                parts.append((comma if open_nodes[-1][1] else "") + line(2 * depth))
+                open_nodes[-1][1] = True
 
-    def nodeToDict(self, node):
-        result = {
-            "type": node.type,
-            "start_point": node.start_point,
-            "end_point": node.end_point,
-            "children": [self.nodeToDict(child) for child in node.children]
-        }
-        return result
+            node_type = current.type
+            type_json = encoded.get(node_type)
+            if type_json is None:
+                type_json = encoded[node_type] = json.dumps(node_type)
+            fmt = templates.get(depth)
+            if fmt is None:
+                fmt = templates[depth] = template(depth)
+            start_row, start_col = current.start_point
+            end_row, end_col = current.end_point
+            parts.append(fmt % (type_json, start_row, start_col, end_row, end_col))
+            open_nodes.append([depth, False])
+            if len(parts) >= 4096:
+                f.write("".join(parts))
+                parts.clear()
+        while open_nodes:
+            parts.append(closer(*open_nodes.pop()))
+        f.write("".join(parts))
 
-    def processDirectory(self, repoPath) -> str:
+    def processDirectory(
+        self,
+        repoPath,
+        source: Optional[RepositorySource] = None,
+        ast_format: str = 'json',
+        workers: int = 1,
+        executor: Optional[Executor] = None,
+        batch_bytes: int = DEFAULT_BATCH_BYTES,
+    ) -> str:
         astsDir = os.path.join(repoPath, 'asts')
         mappingFilePath = os.path.join(astsDir, 'fileAstMap.json')
         os.makedirs(astsDir, exist_ok=True)
 
+        if source is None:
+            source = RepositorySource.open(repoPath)
+
+        # 'binary' writes one memory-mappable store per repo instead of a JSON file per source
+        store = None
+        if ast_format == 'binary':
+            store = AstStoreWriter(os.path.join(astsDir, 'repo.astbin'))
+        elif ast_format != 'json':
+            raise ValueError(f"Unknown AST format: {ast_format}")
+
         fileAstMap = {}
-        for root, dirs, files in os.walk(repoPath):
-            if root.startswith(astsDir):
-                continue
 
-            for file in files:
-                filePath = os.path.join(root, file)
-                language = self.ast_generator.detectLanguage(filePath)
-                if language == 'unknown':
-                    self.logger.info(f"Skipping file with unknown language: {filePath}")
-                    continue
-                else:
-                    ast = self.ast_generator.generateAst(filePath, language)
-                    if ast is None:
-                        self.logger.info(f"Failed to generate AST for file: {filePath}")
-                        continue
-
-                astDict = self.nodeToDict(ast.root_node)
-
-                relative_path = os.path.relpath(filePath, repoPath)
-                astFileName = relative_path.replace(os.path.sep, '_') + '.json'
-                astFilePath = os.path.join(astsDir, astFileName)
-
-                with open(astFilePath, 'w') as astFile:
-                    json.dump(astDict, astFile, indent=2)
-                
-                fileAstMap[filePath] = astFilePath
-        
+        def merge(filePath, result, size, seconds):
+            metrics.count("files_parsed", stage="ast")
+            metrics.count("bytes_parsed", size, stage="ast")
+            metrics.observe("parse_seconds", seconds, stage="ast")
+            if result is None:
+                metrics.count("parse_failures", stage="ast")
+                self.logger.info(f"Failed to generate AST for file: {filePath}")
+            elif store is not None:
+                rootIndex = store.add_flat(filePath, *result)
+                fileAstMap[filePath] = AstStore.reference(store.path, rootIndex)
+            else:
+                fileAstMap[filePath] = result
+
+        blobs = source.walk(include=self._isKnownLanguage)
+        with metrics.stage("ast", repo=repoPath):
+            if executor is None and workers <= 1:
+                for blob in blobs:
+                    started = time.perf_counter()
+                    result = self.parseFile(blob.path, blob.relative_path, blob.data, astsDir, ast_format)
+                    merge(blob.path, result, len(blob.data), time.perf_counter() - started)
+            elif executor is not None:
+                # workers is then the size of the caller's executor
+                self._processParallel(blobs, executor, astsDir, ast_format, batch_bytes, merge, workers)
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=initWorker) as pool:
+                    self._processParallel(blobs, pool, astsDir, ast_format, batch_bytes, merge, workers)
+
+        if store is not None:
+            store.close()
+
         with open(mappingFilePath, 'w') as mapFile:
             json.dump(fileAstMap, mapFile, indent=2)
 
-        return mappingFilePath
\ No newline at end of file
+        return mappingFilePath
+
+    def _processParallel(self, blobs, executor: Executor, astsDir, ast_format, batch_bytes, merge, workers: int):
+        # Batches are merged in submission order so fileAstMap (and the store layout)
+        # match a sequential run; a bounded window keeps only a few batches per worker in memory
+        window = max(workers, 1) * 2
+        pending = deque()
+
+        def drain(limit):
+            while len(pending) > limit:
+                for filePath, result, size, seconds in pending.popleft().result():
+                    merge(filePath, result, size, seconds)
+
+        batch, size = [], 0
+        for blob in blobs:
+            batch.append((blob.path, blob.relative_path, blob.data))
+            size += len(blob.data)
+            if size >= batch_bytes or len(batch) >= DEFAULT_BATCH_FILES:
+                pending.append(executor.submit(parseBatch, batch, astsDir, ast_format, self.node_types, self.named_only))
+                batch, size = [], 0
+                drain(window)
+        if batch:
+            pending.append(executor.submit(parseBatch, batch, astsDir, ast_format, self.node_types, self.named_only))
+        drain(0)
+
+    def parseFile(self, filePath, relativePath, data: bytes, astsDir, ast_format: str = 'json'):
+        # Returns the JSON file written for the AST, or the flattened store columns
+        language = self.ast_generator.detectLanguage(filePath)
+        ast = self.ast_generator.generateAstFromBytes(data, language, filePath)
+        if ast is None:
+            return None
+
+        if ast_format == 'binary':
+            return flatten_tree(ast)
+
+        astFileName = relativePath.replace('/', '_') + '.json'
+        astFilePath = os.path.join(astsDir, astFileName)
+
+        with open(astFilePath, 'w') as astFile:
+            self.writeNodeJson(ast.root_node, astFile, self.node_types, self.named_only)
+
+        return astFilePath
+
+    def _isKnownLanguage(self, filePath) -> bool:
+        if self.ast_generator.detectLanguage(filePath) == 'unknown':
+            self.logger.info(f"Skipping file with unknown language: {filePath}")
+            return False
+        return True
@@ -1,4 +1,15 @@
-from .chunk_extractor import ChunkExtractor
-from .models import ChunkGraph, ChunkNode, ChunkType
+from ... import lazy
 
-__all__ = ["ChunkExtractor", "ChunkGraph", "ChunkNode", "ChunkType"]
+__getattr__, __dir__, __all__ = lazy.lazyExports(__name__, {
+    "ChunkExtractor": ".chunk_extractor",
+    "TreeChunkExtractor": ".tree_chunk_extractor",
+    "SourceReader": ".source_reader",
+    "SourceFile": ".source_reader",
+    "ChunkGraph": ".models",
+    "ChunkNode": ".models",
+    "ChunkType": ".models",
+    "ChunkStore": ".models",
+    "StoredChunk": ".models",
+    "DependencyIndex": ".dependency_index",
+    "Ref": ".dependency_index",
+})
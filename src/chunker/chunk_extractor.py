@@ -2,21 +2,35 @@ import json
 import os
 from typing import Dict, List, Optional, Tuple
 import logging
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from .models import ChunkNode, ChunkGraph, ChunkType
+from .models import ChunkGraph, ChunkStore, ChunkType, ID_ENTIRE_FILE, ID_IMMEDIATE
+from .dependency_index import DependencyIndex
 from ..ast_generator.ast_generator import AstGenerator
 from ..ast_generator.repo_ast import RepoAst
+from ..ast_generator.ast_store import AstStore, StoredNode
+from ..fetcher.repository_source import RepositorySource
+from .source_reader import SourceFile, SourceReader
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class ChunkExtractor:
-    def __init__(self, repo_path: str):
+    def __init__(self, repo_path: str, source: Optional[RepositorySource] = None, ast_format: str = 'json'):
         self.repo_path = repo_path
-        ast_generator = AstGenerator()
-        repo_ast = RepoAst(ast_generator)
-        self.ast_lookup_path = repo_ast.processDirectory(repo_path)
-        self.ast_lookup = self._load_ast_lookup()
+        self.source = source if source is not None else RepositorySource.open(repo_path)
+        self.reader = SourceReader(self.source)
+        # Every file's ChunkGraph is a view over this one store; content is read back through the reader
+        self.store = ChunkStore(self.reader)
+        self._ast_stores: Dict[str, AstStore] = {}
+        self._ast_stores_lock = threading.Lock()
+        self.ast_lookup = self._build_ast_lookup(ast_format)
+
+    def _build_ast_lookup(self, ast_format: str) -> Dict[str, str]:
+        # Source path -> where its AST is; subclasses that parse in memory override this
+        repo_ast = RepoAst(AstGenerator())
+        self.ast_lookup_path = repo_ast.processDirectory(self.repo_path, self.source, ast_format)
+        return self._load_ast_lookup()
 
     def _load_ast_lookup(self) -> Dict[str, str]:
         try:
@@ -35,66 +49,84 @@ class ChunkExtractor:
         if not ast:
             return None
 
-        graph = ChunkGraph()
-        self._process_node(ast, file_path, graph)
-        
-        if not graph.nodes:
-            self._create_single_file_chunk(file_path, ast, graph)
-        
+        graph = ChunkGraph(self.store)
+        # Every chunk of the file slices the same indexed buffer
+        with self.reader.open(file_path):
+            self._process_node(ast, file_path, graph)
+
+            if not graph.nodes:
+                self._create_single_file_chunk(file_path, ast, graph)
+
+        graph.compact()
         return graph
 
     def _load_ast(self, ast_file_path: str) -> Optional[Dict]:
+        if AstStore.is_reference(ast_file_path):
+            return self._load_stored_ast(ast_file_path)
         try:
             with open(ast_file_path, 'r') as f:
                 return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+        except (FileNotFoundError, json.JSONDecodeError, RecursionError) as e:
+            # json.load recurses per nesting level, so very deep ASTs cannot be read back
             logger.error(f"Error loading AST file {ast_file_path}: {str(e)}")
         return None
 
-    def _process_node(self, node: Dict, file_path: str, graph: ChunkGraph, parent_id: Optional[str] = None) -> Optional[str]:
+    def _load_stored_ast(self, reference: str) -> Optional[StoredNode]:
+        # Nodes are read lazily from the mapped store as the walk reaches them
+        store_path, root_index = AstStore.parse_reference(reference)
+        try:
+            with self._ast_stores_lock:
+                store = self._ast_stores.get(store_path)
+                if store is None:
+                    store = self._ast_stores[store_path] = AstStore(store_path)
+            return store.node(root_index)
+        except (FileNotFoundError, ValueError, IndexError) as e:
+            logger.error(f"Error loading AST store {store_path}: {str(e)}")
+        return None
+
+    def _process_node(self, node: Dict, file_path: str, graph: ChunkGraph, parent: Optional[int] = None) -> Optional[int]:
+        # Chunks are referred to by their index in the graph's store, not by id string
         chunk_type = self._get_chunk_type(node)
         if chunk_type:
-            chunk = self._create_chunk(node, file_path, chunk_type)
-            graph.add_node(chunk)
-            if parent_id:
-                graph.add_edge(parent_id, chunk.id)
+            chunk = self._create_chunk(node, file_path, chunk_type, graph)
+            if parent is not None:
+                graph.add_edge(parent, chunk)
 
             if chunk_type == ChunkType.FILE:
-                chunk = chunk._replace(imports=self._extract_imports(file_path, node))
-                graph.nodes[chunk.id] = chunk
-                self._extract_immediate_file_code(node, file_path, graph, chunk.id)
+                graph.set_imports(chunk, self._extract_imports(file_path, node))
+                self._extract_immediate_file_code(node, file_path, graph, chunk)
 
             for child in node.get('children', []):
-                child_id = self._process_node(child, file_path, graph, chunk.id)
-                if child_id:
-                    graph.add_edge(chunk.id, child_id)
+                child_chunk = self._process_node(child, file_path, graph, chunk)
+                if child_chunk is not None:
+                    graph.add_edge(chunk, child_chunk)
 
-            return chunk.id
+            return chunk
         else:
             for child in node.get('children', []):
-                self._process_node(child, file_path, graph, parent_id)
+                self._process_node(child, file_path, graph, parent)
         return None
 
-    def _create_chunk(self, node: Dict, file_path: str, chunk_type: ChunkType) -> ChunkNode:
-        return ChunkNode(
-            id=f"{file_path}:{node['start_point'][0]}:{node['end_point'][0]}",
-            type=chunk_type,
-            file_path=file_path,
-            start_line=node['start_point'][0],
-            end_line=node['end_point'][0],
-            content=self._get_node_content(file_path, node)
+    def _create_chunk(self, node: Dict, file_path: str, chunk_type: ChunkType, graph: ChunkGraph) -> int:
+        return graph.add_chunk(
+            chunk_type,
+            file_path,
+            node['start_point'][0],
+            node['end_point'][0],
+            self._get_source_file(file_path),
         )
 
     def _create_single_file_chunk(self, file_path: str, ast: Dict, graph: ChunkGraph) -> None:
-        chunk = ChunkNode(
-            id=f"{file_path}:entire_file",
-            type=ChunkType.FILE,
-            file_path=file_path,
-            start_line=1,
-            end_line=self._get_file_line_count(file_path),
-            content=self._get_file_content(file_path)
+        line_count = self._get_file_line_count(file_path)
+        graph.add_chunk(
+            ChunkType.FILE,
+            file_path,
+            1,
+            line_count,
+            self._get_source_file(file_path),
+            ID_ENTIRE_FILE,
+            content_lines=(0, line_count - 1),
         )
-        graph.add_node(chunk)
 
     @staticmethod
     def _get_chunk_type(node: Dict) -> Optional[ChunkType]:
@@ -104,27 +136,21 @@ class ChunkExtractor:
             'function_definition': ChunkType.FUNCTION,
         }.get(node.get('type'))
 
-    def _get_node_content(self, file_path: str, node: Dict) -> str:
-        try:
-            with open(file_path, 'r') as f:
-                lines = f.readlines()
-            return ''.join(lines[node['start_point'][0]:node['end_point'][0]+1])
-        except (FileNotFoundError, IndexError) as e:
-            logger.error(f"Error reading node content from {file_path}: {str(e)}")
-        return ""
+    def _read_lines(self, file_path: str) -> List[str]:
+        # Same lines text-mode readlines() gives, but served from the repository source
+        return self.reader.get(file_path).lines()
 
-    def _get_file_content(self, file_path: str) -> str:
+    def _get_source_file(self, file_path: str) -> Optional[SourceFile]:
+        # Chunks keep byte spans into it; an unreadable file gives chunks without content
         try:
-            with open(file_path, 'r') as f:
-                return f.read()
-        except FileNotFoundError:
-            logger.error(f"File not found: {file_path}")
-        return ""
+            return self.reader.get(file_path)
+        except FileNotFoundError as e:
+            logger.error(f"Error reading node content from {file_path}: {str(e)}")
+        return None
 
     def _get_file_line_count(self, file_path: str) -> int:
         try:
-            with open(file_path, 'r') as f:
-                return sum(1 for _ in f)
+            return self.reader.get(file_path).line_count
         except FileNotFoundError:
             logger.error(f"File not found: {file_path}")
         return 0
@@ -132,29 +158,27 @@ class ChunkExtractor:
     def _extract_imports(self, file_path: str, node: Dict) -> List[str]:
         imports = []
         try:
-            with open(file_path, 'r') as f:
-                lines = f.readlines()
-            
+            source_file = self.reader.get(file_path)
+
             for child in node.get('children', []):
                 if child.get('type') in ['import_statement', 'import_from_statement']:
                     start_line, end_line = child['start_point'][0], child['end_point'][0]
-                    imports.append(''.join(lines[start_line:end_line+1]).strip())
+                    imports.append(source_file.text(start_line, end_line).strip())
         except FileNotFoundError:
             logger.error(f"File not found while extracting imports: {file_path}")
         return imports
 
-    def _extract_immediate_file_code(self, node: Dict, file_path: str, graph: ChunkGraph, parent_id: str) -> None:
+    def _extract_immediate_file_code(self, node: Dict, file_path: str, graph: ChunkGraph, parent: int) -> None:
         for start, end in self._get_immediate_file_code(node):
-            immediate_chunk = ChunkNode(
-                id=f"{file_path}:immediate:{start}_{end}",
-                type=ChunkType.IMMEDIATE_CODE,
-                file_path=file_path,
-                start_line=start,
-                end_line=end,
-                content=self._get_node_content(file_path, {'start_point': [start, 0], 'end_point': [end, 0]})
+            immediate_chunk = graph.add_chunk(
+                ChunkType.IMMEDIATE_CODE,
+                file_path,
+                start,
+                end,
+                self._get_source_file(file_path),
+                ID_IMMEDIATE,
             )
-            graph.add_node(immediate_chunk)
-            graph.add_edge(parent_id, immediate_chunk.id)
+            graph.add_edge(parent, immediate_chunk)
 
     @staticmethod
     def _get_immediate_file_code(node: Dict) -> List[Tuple[int, int]]:
@@ -192,7 +216,8 @@ class ChunkExtractor:
                     file_path, graph, output_path = result
                     chunk_graphs[file_path] = graph
                     chunkGraphMap[file_path] = output_path
-        
+        self.reader.close()
+
         if export_to_json:
             os.makedirs(os.path.join(self.repo_path, "asts"), exist_ok=True)
             for file_path, graph in chunk_graphs.items():
@@ -202,8 +227,19 @@ class ChunkExtractor:
             with open(os.path.join(self.repo_path, 'asts', 'chunkGraphMap.json'), 'w') as f:
                 json.dump(chunkGraphMap, f, indent=2)
 
+            with open(os.path.join(self.repo_path, 'asts', 'dependencyGraph.json'), 'w') as f:
+                json.dump(self.build_dependency_index(chunk_graphs).to_dict(), f, indent=2)
+
         return chunk_graphs
 
+    def build_dependency_index(self, chunk_graphs: Optional[Dict[str, ChunkGraph]] = None) -> DependencyIndex:
+        # Cross-file links between the chunks; keep the index and call update_file as files change
+        if chunk_graphs is None:
+            chunk_graphs = self.extract_chunks(export_to_json=False)
+        index = DependencyIndex(self.repo_path)
+        index.update_files(chunk_graphs)
+        return index
+
     @staticmethod
     def _export_graph_to_json(graph: ChunkGraph, file_path: str) -> None:
         with open(file_path, 'w') as f:
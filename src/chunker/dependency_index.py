@@ -0,0 +1,441 @@
+import ast
+import logging
+import os
+import re
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+from .models import ChunkGraph, ChunkType
+
+logger = logging.getLogger(__name__)
+
+# Repo-wide dependency graph over the chunks of ChunkExtractor. The imports each
+# file chunk carries are resolved to in-repo modules, and every use of a name they
+# bind links the top-level chunk using it to the definition in the other file.
+# Files are indexed one at a time and linking only looks names up in dicts, so a
+# build is linear in repo size; updating a file relinks it and its importers only.
+
+_DOTTED_NAME = re.compile(r"[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*")
+_DEFINITION = re.compile(r"^[ \t]*(?:async[ \t]+)?(?:def|class)[ \t]+(\w+)")
+MAX_SIGNATURE_LINES = 12
+
+
+class Ref(NamedTuple):
+    # A file (name None) or one of its top-level definitions. As the source of an
+    # edge, name None stands for the file's module-level code
+    file_path: str
+    name: Optional[str] = None
+
+
+class _FileEntry:
+    __slots__ = ("file_path", "module", "symbols", "imports", "bindings", "stars", "uses", "edges", "lookups")
+
+    def __init__(self, file_path: str, module: str):
+        self.file_path = file_path
+        self.module = module
+        # Top-level definition name -> signature
+        self.symbols: Dict[str, str] = {}
+        # Absolute dotted names the file imports
+        self.imports: List[str] = []
+        # Local name -> absolute dotted name it is bound to
+        self.bindings: Dict[str, str] = {}
+        # Modules imported with *
+        self.stars: List[str] = []
+        # Source chunk (definition name, None for module-level code) -> dotted names it uses
+        self.uses: Dict[Optional[str], Set[str]] = {}
+        # Set when linked: resolved (source, target) edges and every module name looked up
+        self.edges: Set[Tuple[Ref, Ref]] = set()
+        self.lookups: Set[str] = set()
+
+
+def module_name(relative_path: str) -> str:
+    # pkg/sub/mod.py -> pkg.sub.mod; a package's __init__.py is the package itself
+    parts = os.path.splitext(relative_path)[0].replace(os.path.sep, "/").split("/")
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts.pop()
+    return ".".join(part for part in parts if part not in ("", "."))
+
+
+def signature(content: str) -> str:
+    # A definition's header, up to the colon that closes it
+    lines = []
+    depth = 0
+    for line in content.splitlines():
+        lines.append(line.rstrip())
+        code = line.split("#", 1)[0]
+        depth += sum(code.count(bracket) for bracket in "([{") - sum(code.count(bracket) for bracket in ")]}")
+        if (depth <= 0 and code.rstrip().endswith(":")) or len(lines) >= MAX_SIGNATURE_LINES:
+            break
+    return "\n".join(lines)
+
+
+class DependencyIndex:
+    def __init__(self, repo_path: str = "."):
+        self.repo_path = repo_path
+        self._files: Dict[str, _FileEntry] = {}
+        # Every dotted suffix of every module name -> files; scripts often import
+        # siblings by a shorter name than their path from the repo root
+        self._modules: Dict[str, Set[str]] = defaultdict(set)
+        # Module name -> files whose resolution looked it up, relinked when it changes
+        self._lookups: Dict[str, Set[str]] = defaultdict(set)
+        self._dependents: Dict[Ref, Set[Ref]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __contains__(self, file_path: str) -> bool:
+        return file_path in self._files
+
+    def update_file(self, file_path: str, graph: Optional[ChunkGraph]) -> None:
+        self.update_files({file_path: graph})
+
+    def update_files(self, graphs: Mapping[str, Optional[ChunkGraph]]) -> None:
+        # A graph of None removes the file. All files are read before any is linked,
+        # so a full build links every file exactly once
+        changed = set()
+        for file_path, graph in graphs.items():
+            old = self._files.pop(file_path, None)
+            if old is not None:
+                self._unlink(old)
+                self._unregister(old)
+                changed.add(old.module)
+            if graph is None:
+                continue
+            entry = self._read(file_path, graph)
+            self._files[file_path] = entry
+            self._register(entry)
+            changed.add(entry.module)
+
+        relink = set(file_path for file_path, graph in graphs.items() if graph is not None)
+        for module in changed:
+            for name in self._suffixes(module):
+                relink.update(self._lookups.get(name, ()))
+        for file_path in sorted(relink):
+            entry = self._files.get(file_path)
+            if entry is not None:
+                self._unlink(entry)
+                self._link(entry)
+
+    def remove_file(self, file_path: str) -> None:
+        self.update_files({file_path: None})
+
+    def _read(self, file_path: str, graph: ChunkGraph) -> _FileEntry:
+        relative_path = os.path.relpath(file_path, self.repo_path)
+        entry = _FileEntry(file_path, module_name(relative_path))
+        root = graph.root
+        if root is None:
+            return entry
+
+        for statement in root.imports:
+            self._read_import(entry, statement, os.path.basename(file_path) == "__init__.py")
+
+        # Top-level chunks: definitions become symbols, every chunk records the
+        # dotted names it uses whose head an import bound
+        bound = set(entry.bindings)
+        for chunk in graph.child_chunks(root.index):
+            name = None
+            content = chunk.content
+            if chunk.type in (ChunkType.CLASS, ChunkType.FUNCTION):
+                match = _DEFINITION.match(content)
+                if match:
+                    name = match.group(1)
+                    entry.symbols[name] = self._symbol_signature(graph, chunk, content)
+            uses = entry.uses.setdefault(name, set())
+            for token in set(_DOTTED_NAME.findall(content)):
+                head = token.split(".", 1)[0]
+                if head in bound or (entry.stars and head not in entry.symbols):
+                    uses.add(token)
+        return entry
+
+    @staticmethod
+    def _symbol_signature(graph: ChunkGraph, chunk, content: str) -> str:
+        # A class is its header and the headers of its methods
+        header = signature(content)
+        if chunk.type != ChunkType.CLASS:
+            return header
+        methods = [signature(child.content) for child in graph.child_chunks(chunk.index) if child.type == ChunkType.FUNCTION]
+        return "\n".join([header] + methods)
+
+    def _read_import(self, entry: _FileEntry, statement: str, is_package: bool) -> None:
+        try:
+            tree = ast.parse(statement)
+        except SyntaxError:
+            logger.info(f"Unparsable import in {entry.file_path}: {statement}")
+            return
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    entry.imports.append(alias.name)
+                    if alias.asname:
+                        entry.bindings[alias.asname] = alias.name
+                    else:
+                        head = alias.name.split(".", 1)[0]
+                        entry.bindings[head] = head
+            elif isinstance(node, ast.ImportFrom):
+                base = self._absolute(entry.module, is_package, node.level, node.module)
+                if base is None:
+                    continue
+                for alias in node.names:
+                    if alias.name == "*":
+                        entry.stars.append(base)
+                        entry.imports.append(base)
+                        continue
+                    target = f"{base}.{alias.name}" if base else alias.name
+                    entry.imports.append(target)
+                    entry.bindings[alias.asname or alias.name] = target
+
+    @staticmethod
+    def _absolute(module: str, is_package: bool, level: int, name: Optional[str]) -> Optional[str]:
+        if not level:
+            return name
+        parts = module.split(".") if module else []
+        package = parts if is_package else parts[:-1]
+        if level - 1 > len(package):
+            return None
+        base = package[:len(package) - (level - 1)]
+        return ".".join(base + (name.split(".") if name else []))
+
+    @staticmethod
+    def _suffixes(module: str) -> List[str]:
+        parts = module.split(".")
+        return [".".join(parts[start:]) for start in range(len(parts))]
+
+    def _register(self, entry: _FileEntry) -> None:
+        for name in self._suffixes(entry.module):
+            self._modules[name].add(entry.file_path)
+
+    def _unregister(self, entry: _FileEntry) -> None:
+        for name in self._suffixes(entry.module):
+            files = self._modules.get(name)
+            if files is not None:
+                files.discard(entry.file_path)
+                if not files:
+                    del self._modules[name]
+
+    def _module_file(self, module: str, importer: str) -> Optional[str]:
+        files = self._modules.get(module)
+        if not files:
+            return None
+        if len(files) == 1:
+            return next(iter(files))
+        # Several modules share the name: the one nearest the importer wins
+        return min(files, key=lambda path: (-len(os.path.commonpath([path, importer])), len(path), path))
+
+    def _link(self, entry: _FileEntry) -> None:
+        resolved: Dict[str, Optional[Ref]] = {}
+
+        def resolve(dotted: str) -> Optional[Ref]:
+            # The longest prefix naming a module, and the definition after it if any
+            if dotted in resolved:
+                return resolved[dotted]
+            ref = None
+            parts = dotted.split(".")
+            for end in range(len(parts), 0, -1):
+                module = ".".join(parts[:end])
+                entry.lookups.add(module)
+                target = self._module_file(module, entry.file_path)
+                if target is None:
+                    continue
+                if target != entry.file_path:
+                    name = parts[end] if end < len(parts) else None
+                    ref = Ref(target, name if name in self._files[target].symbols else None)
+                break
+            resolved[dotted] = ref
+            return ref
+
+        edges = set()
+        module_code = Ref(entry.file_path)
+        for dotted in entry.imports:
+            ref = resolve(dotted)
+            if ref is not None:
+                edges.add((module_code, ref))
+
+        for name, tokens in entry.uses.items():
+            source = Ref(entry.file_path, name)
+            for token in tokens:
+                head, _, rest = token.partition(".")
+                bound = entry.bindings.get(head)
+                if bound is not None:
+                    ref = resolve(f"{bound}.{rest}" if rest else bound)
+                else:
+                    ref = self._resolve_star(entry, head)
+                if ref is not None:
+                    edges.add((source, ref))
+
+        entry.edges = edges
+        for source, target in edges:
+            self._dependents[target].add(source)
+        for module in entry.lookups:
+            self._lookups[module].add(entry.file_path)
+
+    def _resolve_star(self, entry: _FileEntry, name: str) -> Optional[Ref]:
+        for module in entry.stars:
+            entry.lookups.add(module)
+            target = self._module_file(module, entry.file_path)
+            if target is not None and target != entry.file_path and name in self._files[target].symbols:
+                return Ref(target, name)
+        return None
+
+    def _unlink(self, entry: _FileEntry) -> None:
+        for source, target in entry.edges:
+            sources = self._dependents.get(target)
+            if sources is not None:
+                sources.discard(source)
+                if not sources:
+                    del self._dependents[target]
+        for module in entry.lookups:
+            files = self._lookups.get(module)
+            if files is not None:
+                files.discard(entry.file_path)
+                if not files:
+                    del self._lookups[module]
+        entry.edges = set()
+        entry.lookups = set()
+
+    def _refs(self, file_path: str) -> List[Ref]:
+        entry = self._files.get(file_path)
+        if entry is None:
+            return []
+        return [Ref(file_path)] + [Ref(file_path, name) for name in entry.symbols]
+
+    def _step(self, ref: Ref, forward: bool) -> Set[Ref]:
+        # One hop at file level (name None) or at chunk level
+        if ref.name is None and ref.file_path in self._files:
+            if forward:
+                return {Ref(target.file_path) for _, target in self._files[ref.file_path].edges}
+            return {
+                Ref(source.file_path)
+                for target in self._refs(ref.file_path)
+                for source in self._dependents.get(target, ())
+            }
+        if forward:
+            entry = self._files.get(ref.file_path)
+            return {target for source, target in entry.edges if source == ref} if entry else set()
+        return set(self._dependents.get(ref, ()))
+
+    def _walk(self, ref: Ref, forward: bool, transitive: bool) -> List[Ref]:
+        found = self._step(ref, forward)
+        if transitive:
+            queue = deque(found)
+            while queue:
+                for following in self._step(queue.popleft(), forward):
+                    if following not in found:
+                        found.add(following)
+                        queue.append(following)
+        found.discard(ref)
+        return sorted(found, key=lambda item: (item.file_path, item.name or ""))
+
+    def dependencies(self, file_path: str, name: Optional[str] = None, transitive: bool = False) -> List[Ref]:
+        # What a file, or one of its definitions, uses from other files
+        return self._walk(Ref(file_path, name), True, transitive)
+
+    def dependents(self, file_path: str, name: Optional[str] = None, transitive: bool = False) -> List[Ref]:
+        # Who uses a file, or one of its definitions: its callers and importers
+        return self._walk(Ref(file_path, name), False, transitive)
+
+    def components(self) -> List[List[str]]:
+        # Strongly connected files (import cycles) in dependency order: every group
+        # comes after all the groups it imports. Iterative Tarjan
+        successors = {
+            file_path: sorted({target.file_path for _, target in entry.edges})
+            for file_path, entry in self._files.items()
+        }
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        groups: List[List[str]] = []
+
+        for start in sorted(successors):
+            if start in index:
+                continue
+            index[start] = low[start] = len(index)
+            stack.append(start)
+            on_stack.add(start)
+            work = [(start, iter(successors[start]))]
+            while work:
+                node, pending = work[-1]
+                for following in pending:
+                    if following not in index:
+                        index[following] = low[following] = len(index)
+                        stack.append(following)
+                        on_stack.add(following)
+                        work.append((following, iter(successors.get(following, ()))))
+                        break
+                    if following in on_stack:
+                        low[node] = min(low[node], index[following])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        group = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            group.append(member)
+                            if member == node:
+                                break
+                        groups.append(sorted(group))
+        return groups
+
+    def topological_order(self) -> List[str]:
+        # Dependencies before their dependents; the files of an import cycle are adjacent
+        return [file_path for group in self.components() for file_path in group]
+
+    def cycles(self) -> List[List[str]]:
+        return [group for group in self.components() if len(group) > 1]
+
+    def signature(self, file_path: str, name: str) -> Optional[str]:
+        entry = self._files.get(file_path)
+        return entry.symbols.get(name) if entry is not None else None
+
+    def context(self, file_path: str, name: Optional[str] = None, max_chars: Optional[int] = None) -> str:
+        # The signatures of what a chunk (or, with name None, any chunk of the file)
+        # uses from other files: enough for a reviewer to follow the calls without
+        # being sent the files themselves
+        entry = self._files.get(file_path)
+        if entry is None:
+            return ""
+        targets = sorted(
+            {target for source, target in entry.edges if target.name is not None and (name is None or source.name == name)},
+            key=lambda target: (target.file_path, target.name),
+        )
+
+        sections: Dict[str, List[str]] = {}
+        size = 0
+        for target in targets:
+            text = self.signature(target.file_path, target.name)
+            if not text:
+                continue
+            if max_chars is not None and size + len(text) > max_chars:
+                break
+            sections.setdefault(target.file_path, []).append(text)
+            size += len(text) + 1
+        return "\n\n".join(
+            f"# {os.path.relpath(path, self.repo_path)}\n" + "\n".join(texts) for path, texts in sections.items()
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "files": len(self._files),
+            "symbols": sum(len(entry.symbols) for entry in self._files.values()),
+            "edges": sum(len(entry.edges) for entry in self._files.values()),
+            "file_edges": sum(len({target.file_path for _, target in entry.edges}) for entry in self._files.values()),
+            "cycles": len(self.cycles()),
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "files": {
+                file_path: {
+                    "module": entry.module,
+                    "symbols": sorted(entry.symbols),
+                    "dependencies": [ref.file_path for ref in self.dependencies(file_path)],
+                    "dependents": [ref.file_path for ref in self.dependents(file_path)],
+                }
+                for file_path, entry in sorted(self._files.items())
+            },
+            "order": self.topological_order(),
+            "cycles": self.cycles(),
+        }
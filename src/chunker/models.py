@@ -1,7 +1,10 @@
-from typing import Dict, List, Optional, NamedTuple
+from typing import Dict, Iterator, List, Optional, NamedTuple, Tuple, Union
 from enum import Enum
 import logging
+import threading
+from array import array
 from collections import Counter
+from collections.abc import Mapping, MutableMapping
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -23,38 +26,430 @@ class ChunkNode(NamedTuple):
     children: List[str] = []
     imports: List[str] = []
 
+CHUNK_TYPES = list(ChunkType)
+_TYPE_CODES = {chunk_type: code for code, chunk_type in enumerate(CHUNK_TYPES)}
+
+# How a chunk's string id is spelled from its file and lines, so ids are never stored
+ID_SPAN = 0         # "{file_path}:{start_line}:{end_line}"
+ID_IMMEDIATE = 1    # "{file_path}:immediate:{start_line}_{end_line}"
+ID_ENTIRE_FILE = 2  # "{file_path}:entire_file"
+ID_CUSTOM = 3       # anything else, kept as given
+
+ChunkRef = Union[str, int]
+
+
+class ChunkStore:
+    # Repo-wide chunk columns shared by the ChunkGraph of every file. A chunk is an
+    # integer index into parallel arrays, edges are CSR offsets and targets, and
+    # content is a (file id, byte offset, length) span that is only decoded, through
+    # the shared SourceReader, when asked for. Appends are thread-safe.
+
+    def __init__(self, reader=None):
+        # Without a reader there is nothing to decode spans from later, so content
+        # is kept as strings, like the old per-node tuples
+        self.reader = reader
+        self.files: List[str] = []
+        self._file_ids: Dict[str, int] = {}
+        self.file_id = array('I')
+        self.type_code = array('B')
+        self.id_format = array('B')
+        self.start_line = array('i')
+        self.end_line = array('i')
+        self.offset = array('q')
+        self.length = array('q')
+        # Sparse columns: literal content, imports of file chunks, ids that follow no format
+        self._content: Dict[int, str] = {}
+        self._imports: Dict[int, List[str]] = {}
+        self._custom_ids: Dict[int, str] = {}
+        # CSR edges of the nodes compacted so far, plus the edges added since
+        self._offsets = array('I', [0])
+        self._targets = array('I')
+        self._pending_parents = array('I')
+        self._pending_children = array('I')
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.type_code)
+
+    def intern_file(self, file_path: str) -> int:
+        with self._lock:
+            file_id = self._file_ids.get(file_path)
+            if file_id is None:
+                file_id = self._file_ids[file_path] = len(self.files)
+                self.files.append(file_path)
+            return file_id
+
+    def add(
+        self,
+        file_path: str,
+        chunk_type: ChunkType,
+        start_line: int,
+        end_line: int,
+        span: Optional[Tuple[int, int]] = None,
+        content: Optional[str] = None,
+        id_format: int = ID_SPAN,
+        custom_id: Optional[str] = None,
+        imports: Optional[List[str]] = None,
+        index: Optional[int] = None,
+    ) -> int:
+        # Appends a chunk, or overwrites chunk `index` in place; span is (offset, length)
+        offset, length = span if span is not None else (-1, 0)
+        with self._lock:
+            values = (self.intern_file(file_path), _TYPE_CODES[chunk_type], id_format, start_line, end_line, offset, length)
+            columns = (self.file_id, self.type_code, self.id_format, self.start_line, self.end_line, self.offset, self.length)
+            if index is None:
+                index = len(self.type_code)
+                for column, value in zip(columns, values):
+                    column.append(value)
+            else:
+                for column, value in zip(columns, values):
+                    column[index] = value
+            for sparse, value in ((self._content, content), (self._custom_ids, custom_id), (self._imports, imports or None)):
+                if value is None:
+                    sparse.pop(index, None)
+                else:
+                    sparse[index] = value
+        return index
+
+    def set_imports(self, index: int, imports: List[str]) -> None:
+        with self._lock:
+            if imports:
+                self._imports[index] = imports
+            else:
+                self._imports.pop(index, None)
+
+    def imports(self, index: int) -> List[str]:
+        return self._imports.get(index, [])
+
+    def chunk_type(self, index: int) -> ChunkType:
+        return CHUNK_TYPES[self.type_code[index]]
+
+    def file_path(self, index: int) -> str:
+        return self.files[self.file_id[index]]
+
+    def node_id(self, index: int) -> str:
+        id_format = self.id_format[index]
+        if id_format == ID_CUSTOM:
+            return self._custom_ids[index]
+        return _format_id(id_format, self.files[self.file_id[index]], self.start_line[index], self.end_line[index])
+
+    def content(self, index: int) -> str:
+        text = self._content.get(index)
+        if text is not None:
+            return text
+        offset = self.offset[index]
+        if offset < 0 or self.reader is None:
+            return ""
+        file_path = self.files[self.file_id[index]]
+        try:
+            return self.reader.get(file_path).decode(offset, offset + self.length[index])
+        except (FileNotFoundError, UnicodeDecodeError) as e:
+            logger.error(f"Error reading node content from {file_path}: {str(e)}")
+        return ""
+
+    def add_edge(self, parent: int, child: int) -> None:
+        with self._lock:
+            self._pending_parents.append(parent)
+            self._pending_children.append(child)
+
+    def children(self, index: int) -> array:
+        with self._lock:
+            if self._pending_parents:
+                self._compact_edges()
+            offsets = self._offsets
+            if index + 1 >= len(offsets):
+                return array('I')
+            return self._targets[offsets[index]:offsets[index + 1]]
+
+    def _compact_edges(self) -> None:
+        # Merges the pending edges into the CSR arrays; a node keeps its edges in the
+        # order they were added, duplicates included
+        count = len(self.type_code)
+        old_offsets, old_targets = self._offsets, self._targets
+        compacted = len(old_offsets) - 1
+
+        degree = array('I', [0]) * count
+        for node in range(compacted):
+            degree[node] = old_offsets[node + 1] - old_offsets[node]
+        for parent in self._pending_parents:
+            degree[parent] += 1
+
+        offsets = array('I', [0]) * (count + 1)
+        for node in range(count):
+            offsets[node + 1] = offsets[node] + degree[node]
+        targets = array('I', [0]) * offsets[count]
+
+        fill = offsets[:count]
+        for node in range(compacted):
+            start, end = old_offsets[node], old_offsets[node + 1]
+            if end > start:
+                targets[fill[node]:fill[node] + end - start] = old_targets[start:end]
+                fill[node] += end - start
+        for parent, child in zip(self._pending_parents, self._pending_children):
+            targets[fill[parent]] = child
+            fill[parent] += 1
+
+        self._offsets, self._targets = offsets, targets
+        del self._pending_parents[:]
+        del self._pending_children[:]
+
+    def nbytes(self) -> int:
+        # Size of the column and edge arrays, without the sparse dicts
+        columns = (
+            self.file_id, self.type_code, self.id_format, self.start_line, self.end_line, self.offset, self.length,
+            self._offsets, self._targets, self._pending_parents, self._pending_children,
+        )
+        return sum(column.itemsize * len(column) for column in columns)
+
+
+class StoredChunk:
+    # A chunk of a ChunkStore with the ChunkNode fields as properties; content is
+    # decoded on access, children are the ids of its outgoing edges
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: ChunkStore, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def id(self) -> str:
+        return self.store.node_id(self.index)
+
+    @property
+    def type(self) -> ChunkType:
+        return self.store.chunk_type(self.index)
+
+    @property
+    def file_path(self) -> str:
+        return self.store.file_path(self.index)
+
+    @property
+    def start_line(self) -> int:
+        return self.store.start_line[self.index]
+
+    @property
+    def end_line(self) -> int:
+        return self.store.end_line[self.index]
+
+    @property
+    def content(self) -> str:
+        return self.store.content(self.index)
+
+    @property
+    def children(self) -> List[str]:
+        return [self.store.node_id(child) for child in self.store.children(self.index)]
+
+    @property
+    def imports(self) -> List[str]:
+        return self.store.imports(self.index)
+
+    def _asdict(self) -> Dict:
+        return {field: getattr(self, field) for field in ChunkNode._fields}
+
+    def _replace(self, **changes) -> ChunkNode:
+        return ChunkNode(**{**self._asdict(), **changes})
+
+    def __repr__(self) -> str:
+        return f"StoredChunk({self.id!r}, {self.type})"
+
+
+class _NodeView(MutableMapping):
+    # graph.nodes: chunk id -> StoredChunk; assigning a ChunkNode adds or replaces it
+    def __init__(self, graph: "ChunkGraph"):
+        self.graph = graph
+
+    def __getitem__(self, node_id: str) -> StoredChunk:
+        return StoredChunk(self.graph.store, self.graph.index(node_id))
+
+    def __setitem__(self, node_id: str, node: ChunkNode) -> None:
+        if node.id != node_id:
+            raise ValueError(f"Chunk {node.id} assigned under id {node_id}")
+        self.graph.add_node(node)
+
+    def __delitem__(self, node_id: str) -> None:
+        raise TypeError("Chunks cannot be removed from a ChunkGraph")
+
+    def __contains__(self, node_id) -> bool:
+        return node_id in self.graph._id_index()
+
+    def __iter__(self) -> Iterator[str]:
+        store = self.graph.store
+        return (store.node_id(index) for index in self.graph._indices)
+
+    def __len__(self) -> int:
+        return len(self.graph._indices)
+
+    def values(self) -> List[StoredChunk]:
+        store = self.graph.store
+        return [StoredChunk(store, index) for index in self.graph._indices]
+
+
+class _EdgeView(Mapping):
+    # graph.edges: parent id -> child ids, for the chunks that have children
+    def __init__(self, graph: "ChunkGraph"):
+        self.graph = graph
+
+    def __getitem__(self, node_id: str) -> List[str]:
+        store = self.graph.store
+        children = store.children(self.graph.index(node_id))
+        if not children:
+            raise KeyError(node_id)
+        return [store.node_id(child) for child in children]
+
+    def __iter__(self) -> Iterator[str]:
+        store = self.graph.store
+        return (store.node_id(index) for index in self.graph._indices if store.children(index))
+
+    def __len__(self) -> int:
+        store = self.graph.store
+        return sum(1 for index in self.graph._indices if store.children(index))
+
+
 class ChunkGraph:
-    def __init__(self):
-        self.nodes: Dict[str, ChunkNode] = {}
-        self.edges: Dict[str, List[str]] = {}
-        self.root_id: Optional[str] = None
+    # The chunks added through it, as a view over a ChunkStore that many graphs (a
+    # repo's files) can share; ChunkGraph() gets a private store. nodes and edges
+    # keep their dict interfaces, but ids must name chunks that were added
+    def __init__(self, store: Optional[ChunkStore] = None):
+        self.store = store if store is not None else ChunkStore()
+        self._indices = array('I')
+        # id -> index, needed while chunks are added by id; compact() drops it
+        self._ids: Optional[Dict[str, int]] = {}
+        self._root: Optional[int] = None
+
+    @property
+    def root_id(self) -> Optional[str]:
+        return self.store.node_id(self._root) if self._root is not None else None
+
+    @property
+    def nodes(self) -> _NodeView:
+        return _NodeView(self)
+
+    @property
+    def edges(self) -> _EdgeView:
+        return _EdgeView(self)
+
+    @property
+    def root(self) -> Optional[StoredChunk]:
+        return StoredChunk(self.store, self._root) if self._root is not None else None
+
+    def chunk(self, node: ChunkRef) -> StoredChunk:
+        return StoredChunk(self.store, self.index(node))
+
+    def child_chunks(self, node: ChunkRef) -> List[StoredChunk]:
+        # Each child once, in the order its first edge was added
+        children = dict.fromkeys(self.store.children(self.index(node)))
+        return [StoredChunk(self.store, child) for child in children]
+
+    def _id_index(self) -> Dict[str, int]:
+        if self._ids is None:
+            self._ids = {self.store.node_id(index): index for index in self._indices}
+        return self._ids
+
+    def index(self, node: ChunkRef) -> int:
+        return node if isinstance(node, int) else self._id_index()[node]
+
+    def compact(self) -> None:
+        # Drops the id lookup once the graph is built; it is rebuilt if ever needed
+        self._ids = None
+
+    def _put(self, node_id: str, chunk_type: ChunkType, **fields) -> int:
+        ids = self._id_index()
+        index = self.store.add(chunk_type=chunk_type, index=ids.get(node_id), **fields)
+        if node_id not in ids:
+            ids[node_id] = index
+            self._indices.append(index)
+        if chunk_type == ChunkType.FILE and self._root is None:
+            self._root = index
+        return index
 
     def add_node(self, node: ChunkNode) -> None:
-        self.nodes[node.id] = node
-        if node.type == ChunkType.FILE and self.root_id is None:
-            self.root_id = node.id
+        # Content given as a string is kept as one; extractors use add_chunk instead
+        id_format = ID_CUSTOM
+        for candidate in (ID_SPAN, ID_IMMEDIATE, ID_ENTIRE_FILE):
+            if node.id == _format_id(candidate, node.file_path, node.start_line, node.end_line):
+                id_format = candidate
+                break
+        self._put(
+            node.id,
+            node.type,
+            file_path=node.file_path,
+            start_line=node.start_line,
+            end_line=node.end_line,
+            content=node.content,
+            id_format=id_format,
+            custom_id=node.id if id_format == ID_CUSTOM else None,
+            imports=list(node.imports),
+        )
+
+    def add_chunk(
+        self,
+        chunk_type: ChunkType,
+        file_path: str,
+        start_line: int,
+        end_line: int,
+        source_file=None,
+        id_format: int = ID_SPAN,
+        content_lines: Optional[Tuple[int, int]] = None,
+    ) -> int:
+        # Content is lines start_line..end_line (or content_lines) of source_file,
+        # stored as a byte span when the store can read the file again later
+        span = content = None
+        if source_file is not None:
+            low, high = source_file.line_span(*(content_lines or (start_line, end_line)))
+            if self.store.reader is not None:
+                span = (low, high - low)
+            else:
+                content = source_file.decode(low, high)
+        node_id = _format_id(id_format, file_path, start_line, end_line)
+        return self._put(
+            node_id,
+            chunk_type,
+            file_path=file_path,
+            start_line=start_line,
+            end_line=end_line,
+            span=span,
+            content=content,
+            id_format=id_format,
+        )
+
+    def set_imports(self, node: ChunkRef, imports: List[str]) -> None:
+        self.store.set_imports(self.index(node), imports)
 
-    def add_edge(self, parent_id: str, child_id: str) -> None:
-        if parent_id not in self.edges:
-            self.edges[parent_id] = []
-        self.edges[parent_id].append(child_id)
+    def add_edge(self, parent_id: ChunkRef, child_id: ChunkRef) -> None:
+        self.store.add_edge(self.index(parent_id), self.index(child_id))
 
     def generate_summary(self) -> Dict:
-        if not self.nodes:
+        if not self._indices:
             return {"error": "No nodes in the graph"}
-        
-        node_types = Counter(node.type for node in self.nodes.values())
+
+        node_types = Counter(self.store.type_code[index] for index in self._indices)
+        edge_count = sum(len(self.store.children(index)) for index in self._indices)
         return {
-            'total_nodes': len(self.nodes),
-            'node_types': {chunk_type.value: node_types[chunk_type] for chunk_type in ChunkType},
-            'avg_children': sum(len(children) for children in self.edges.values()) / len(self.nodes),
+            'total_nodes': len(self._indices),
+            'node_types': {chunk_type.value: node_types[_TYPE_CODES[chunk_type]] for chunk_type in ChunkType},
+            'avg_children': edge_count / len(self._indices),
             'max_depth': self._get_max_depth(),
         }
 
     def _get_max_depth(self) -> int:
-        def depth(node_id: str) -> int:
-            return 1 + max((depth(child) for child in self.edges.get(node_id, [])), default=0)
-        return depth(self.root_id) if self.root_id else 0
+        # Iterative, so deeply nested chunks cannot hit the recursion limit. Edges may
+        # list a child more than once, so a node is only expanded again when reached
+        # deeper than before; deeper than the node count means a cycle
+        if self._root is None:
+            return 0
+        deepest: Dict[int, int] = {}
+        max_depth = 0
+        stack = [(self._root, 1)]
+        while stack:
+            index, depth = stack.pop()
+            if deepest.get(index, 0) >= depth:
+                continue
+            if depth > len(self._indices) + 1:
+                raise ValueError(f"Cycle in chunk graph through {self.store.node_id(index)}")
+            deepest[index] = depth
+            max_depth = max(max_depth, depth)
+            stack.extend((child, depth + 1) for child in self.store.children(index))
+        return max_depth
 
     def to_dict(self) -> Dict:
     #     id: str
@@ -65,16 +460,26 @@ class ChunkGraph:
     # content: str
     # children: List[str] = []
     # imports: List[str] = []
-        return {
-            node_id: {
-                'id': node.id,
-                'type': node.type.value,
-                'file_path': node.file_path,
-                'start_line': node.start_line,
-                'end_line': node.end_line,
-                'content': node.content,
-                'children': self.edges.get(node_id, []),
-                'imports': node.imports
+        store = self.store
+        result = {}
+        for index in self._indices:
+            node_id = store.node_id(index)
+            result[node_id] = {
+                'id': node_id,
+                'type': store.chunk_type(index).value,
+                'file_path': store.file_path(index),
+                'start_line': store.start_line[index],
+                'end_line': store.end_line[index],
+                'content': store.content(index),
+                'children': [store.node_id(child) for child in store.children(index)],
+                'imports': store.imports(index)
             }
-            for node_id, node in self.nodes.items()
-        }
\ No newline at end of file
+        return result
+
+
+def _format_id(id_format: int, file_path: str, start_line: int, end_line: int) -> str:
+    if id_format == ID_ENTIRE_FILE:
+        return f"{file_path}:entire_file"
+    if id_format == ID_IMMEDIATE:
+        return f"{file_path}:immediate:{start_line}_{end_line}"
+    return f"{file_path}:{start_line}:{end_line}"
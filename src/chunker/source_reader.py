@@ -0,0 +1,145 @@
+import mmap
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+from ..fetcher.repository_source import RepositorySource
+
+# Same line breaks text-mode readlines() honours
+_LINE_BREAK = re.compile(rb'\r\n?|\n')
+
+
+class SourceFile:
+    # One file's bytes (mapped for working trees) plus the offset of every line start
+
+    def __init__(self, path: str, buffer):
+        self.path = path
+        self._buffer = buffer
+        self.view = memoryview(buffer)
+        self._crlf = buffer.find(b'\r') != -1
+
+        starts = array('q', [0])
+        if self._crlf:
+            starts.extend(match.end() for match in _LINE_BREAK.finditer(self.view))
+        else:
+            find = self._buffer.find
+            index = find(b'\n')
+            while index != -1:
+                starts.append(index + 1)
+                index = find(b'\n', index + 1)
+
+        size = len(self.view)
+        self.line_count = len(starts) if starts[-1] < size else len(starts) - 1
+        # offsets[i] is where line i starts; offsets[line_count] is the end of the file
+        del starts[self.line_count:]
+        starts.append(size)
+        self.offsets = starts
+
+    def line_span(self, start: int, end: int) -> Tuple[int, int]:
+        # Byte range of lines start..end inclusive, clamped like lines[start:end + 1]
+        count = self.line_count
+        return self.offsets[min(start, count)], self.offsets[min(max(end + 1, start), count)]
+
+    def line_bytes(self, start: int, end: int) -> memoryview:
+        low, high = self.line_span(start, end)
+        return self.view[low:high]
+
+    def byte_range(self, start: int, end: int) -> memoryview:
+        return self.view[start:end]
+
+    def decode(self, low: int, high: int) -> str:
+        text = str(self.view[low:high], 'utf-8')
+        if self._crlf:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+    def text(self, start: int = 0, end: int = -1) -> str:
+        if end < 0:
+            end = self.line_count - 1
+        return self.decode(*self.line_span(start, end))
+
+    def lines(self) -> List[str]:
+        return [self.text(line, line) for line in range(self.line_count)]
+
+    def close(self) -> None:
+        self.view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            try:
+                self._buffer.close()
+            except BufferError:
+                # A caller still holds a slice; the mapping goes when that does
+                pass
+
+
+class SourceReader:
+    # Shared by every chunk of a file: it is read and indexed once, kept while its
+    # graph is built, then left to LRU eviction
+
+    def __init__(self, source: RepositorySource, max_files: int = 32):
+        self.source = source
+        self.max_files = max_files
+        self._files: "OrderedDict[str, SourceFile]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_path: str) -> SourceFile:
+        with self._lock:
+            source_file = self._files.get(file_path)
+            if source_file is not None:
+                self._files.move_to_end(file_path)
+                return source_file
+
+        try:
+            source_file = SourceFile(file_path, self.source.buffer(file_path))
+        except KeyError:
+            raise FileNotFoundError(file_path)
+
+        with self._lock:
+            existing = self._files.get(file_path)
+            if existing is None:
+                self._files[file_path] = source_file
+                self._evict()
+        if existing is not None:
+            source_file.close()
+            return existing
+        return source_file
+
+    @contextmanager
+    def open(self, file_path: str) -> Iterator[None]:
+        # Pinned files are never evicted, so slices stay valid for the whole block
+        with self._lock:
+            self._pins[file_path] = self._pins.get(file_path, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[file_path] -= 1
+                if not self._pins[file_path]:
+                    del self._pins[file_path]
+                self._evict()
+
+    def release(self, file_path: str) -> None:
+        with self._lock:
+            if file_path in self._pins:
+                return
+            source_file = self._files.pop(file_path, None)
+        if source_file is not None:
+            source_file.close()
+
+    def close(self) -> None:
+        with self._lock:
+            files = list(self._files.values())
+            self._files.clear()
+        for source_file in files:
+            source_file.close()
+
+    def _evict(self) -> None:
+        if len(self._files) <= self.max_files:
+            return
+        for file_path in list(self._files):
+            if len(self._files) <= self.max_files:
+                break
+            if file_path not in self._pins:
+                self._files.pop(file_path).close()
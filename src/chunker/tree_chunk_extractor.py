@@ -0,0 +1,137 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+from .chunk_extractor import ChunkExtractor
+from .models import ChunkGraph, ChunkType, ID_IMMEDIATE
+from ..ast_generator.ast_generator import AstGenerator
+from ..fetcher.repository_source import RepositorySource
+from .source_reader import SourceFile
+
+logger = logging.getLogger(__name__)
+
+IMPORT_TYPES = ('import_statement', 'import_from_statement')
+DEFINITION_TYPES = ('function_definition', 'class_definition')
+
+
+class TreeChunkExtractor(ChunkExtractor):
+    # Same chunks as ChunkExtractor, but walks the live tree-sitter tree with a
+    # TreeCursor instead of writing, reloading and walking a JSON copy of it
+
+    def __init__(self, repo_path: str, source: Optional[RepositorySource] = None):
+        self.ast_generator = AstGenerator()
+        super().__init__(repo_path, source)
+
+    def _build_ast_lookup(self, ast_format: str) -> Dict[str, str]:
+        # Nothing is written: every known-language file maps to itself and is parsed on demand
+        return {
+            file_path: file_path
+            for file_path in self.source.listPaths(include=self._is_known_language)
+        }
+
+    def _is_known_language(self, file_path: str) -> bool:
+        return self.ast_generator.detectLanguage(file_path) != 'unknown'
+
+    def extract_file_chunks(self, file_path: str) -> Optional[ChunkGraph]:
+        if file_path not in self.ast_lookup:
+            logger.warning(f"No AST found for file: {file_path}")
+            return None
+
+        with self.reader.open(file_path):
+            try:
+                source_file = self.reader.get(file_path)
+            except FileNotFoundError as e:
+                logger.error(f"Error reading source {file_path}: {str(e)}")
+                return None
+
+            data = bytes(source_file.view)
+            try:
+                # Chunk content is decoded lazily, so undecodable files are turned away here
+                data.decode('utf-8')
+                language = self.ast_generator.detectLanguage(file_path)
+                tree = self.ast_generator.generateAstFromBytes(data, language, file_path)
+                if tree is None:
+                    return None
+
+                graph = ChunkGraph(self.store)
+                self._walk(tree.walk(), file_path, source_file, graph)
+                if not graph.nodes:
+                    self._create_single_file_chunk(file_path, None, graph)
+            except UnicodeDecodeError as e:
+                logger.error(f"Error reading source {file_path}: {str(e)}")
+                return None
+
+        graph.compact()
+        return graph
+
+    def _walk(self, cursor, file_path: str, source_file: SourceFile, graph: ChunkGraph) -> None:
+        # Each open level is (chunk index or None, parent index the node was given);
+        # the event order matches the recursive dict walk edge for edge
+        levels: List[Tuple[Optional[int], Optional[int]]] = []
+        parent_id: Optional[int] = None
+
+        while True:
+            node = cursor.node
+            chunk_id = self._enter(node, file_path, source_file, graph, parent_id)
+            levels.append((chunk_id, parent_id))
+            if chunk_id is not None:
+                parent_id = chunk_id
+
+            if cursor.goto_first_child():
+                continue
+
+            while True:
+                chunk_id, parent_id = levels.pop()
+                if chunk_id is not None and levels and levels[-1][0] is not None:
+                    graph.add_edge(levels[-1][0], chunk_id)
+                if cursor.goto_next_sibling():
+                    break
+                if not cursor.goto_parent():
+                    return
+
+    def _enter(self, node, file_path: str, source_file: SourceFile, graph: ChunkGraph, parent_id: Optional[int]) -> Optional[int]:
+        chunk_type = self._get_chunk_type({'type': node.type})
+        if not chunk_type:
+            return None
+
+        start, end = node.start_point[0], node.end_point[0]
+        chunk = graph.add_chunk(chunk_type, file_path, start, end, source_file)
+        if parent_id is not None:
+            graph.add_edge(parent_id, chunk)
+
+        if chunk_type == ChunkType.FILE:
+            children = self._child_spans(node)
+            imports = [
+                source_file.text(child_start, child_end).strip()
+                for child_type, child_start, child_end in children
+                if child_type in IMPORT_TYPES
+            ]
+            graph.set_imports(chunk, imports)
+            self._add_immediate_code(node, children, file_path, source_file, graph, chunk)
+
+        return chunk
+
+    @staticmethod
+    def _child_spans(node) -> List[Tuple[str, int, int]]:
+        spans = []
+        cursor = node.walk()
+        if cursor.goto_first_child():
+            while True:
+                child = cursor.node
+                spans.append((child.type, child.start_point[0], child.end_point[0]))
+                if not cursor.goto_next_sibling():
+                    break
+        return spans
+
+    def _add_immediate_code(self, node, children, file_path: str, source_file: SourceFile, graph: ChunkGraph, parent_id: int) -> None:
+        ranges = []
+        current_line = node.start_point[0]
+        for child_type, child_start, child_end in children:
+            if child_type in DEFINITION_TYPES:
+                if current_line < child_start:
+                    ranges.append((current_line, child_start - 1))
+                current_line = child_end + 1
+        if current_line < node.end_point[0]:
+            ranges.append((current_line, node.end_point[0]))
+
+        for start, end in ranges:
+            immediate_chunk = graph.add_chunk(ChunkType.IMMEDIATE_CODE, file_path, start, end, source_file, ID_IMMEDIATE)
+            graph.add_edge(parent_id, immediate_chunk)
@@ -1,3 +1,5 @@
-from .chunk_extractor import ChunkExtractor2
+from ... import lazy
 
-__all__ = ["ChunkExtractor2"]
\ No newline at end of file
+__getattr__, __dir__, __all__ = lazy.lazyExports(__name__, {
+    "ChunkExtractor2": ".chunk_extractor",
+})
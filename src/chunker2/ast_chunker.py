@@ -0,0 +1,124 @@
+import io
+from typing import List, Optional, Tuple
+from ..ast_generator.ast_generator import AstGenerator
+from .token_counter import TokenCounter
+from ... import metrics
+
+
+class AstChunker:
+    # Packs whole top-level statements, classes and functions into chunks of at most
+    # max_tokens. Only a definition that is too large on its own is split: first
+    # along its children, and as a last resort by lines with a small overlap
+
+    def __init__(
+        self,
+        max_tokens: int,
+        token_counter: Optional[TokenCounter] = None,
+        ast_generator: Optional[AstGenerator] = None,
+        overlap_lines: int = 2,
+    ):
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter or TokenCounter()
+        self.ast_generator = ast_generator or AstGenerator()
+        self.overlap_lines = overlap_lines
+
+    def chunk(self, filePath: str, data: bytes, tree=None) -> List[str]:
+        text = data.decode("utf-8", errors="ignore")
+        lines = io.StringIO(text, newline=None).readlines()
+        if not lines:
+            return []
+
+        language = self.ast_generator.detectLanguage(filePath)
+        if tree is None and language != "unknown":
+            tree = self.ast_generator.generateAstFromBytes(data, language, filePath)
+
+        if tree is None:
+            pieces = self._splitLines(lines, 0, len(lines))
+        else:
+            pieces = self._split(tree.root_node, lines, 0, len(lines))
+        return self._pack(pieces)
+
+    def _tokens(self, lines: List[str], start: int, end: int) -> int:
+        return self.token_counter.count("".join(lines[start:end]))
+
+    def _split(self, node, lines: List[str], start: int, end: int) -> List[Tuple[str, int]]:
+        # Returns (text, tokens) pieces covering lines[start:end] in order
+        tokens = self._tokens(lines, start, end)
+        if tokens <= self.max_tokens:
+            return [("".join(lines[start:end]), tokens)]
+
+        # A wrapper with a single multi-line child (decorators, a function's body)
+        # is split along that child's children instead
+        children = [child for child in node.children if start <= child.start_point[0] < end]
+        while True:
+            starts = sorted({start} | {child.start_point[0] for child in children})
+            if len(starts) > 1 or not children:
+                break
+            widest = max(children, key=lambda child: child.end_point[0] - child.start_point[0])
+            children = [child for child in widest.children if start <= child.start_point[0] < end]
+
+        if len(starts) == 1:
+            return self._splitLines(lines, start, end)
+
+        byStart = {}
+        for child in children:
+            byStart.setdefault(child.start_point[0], child)
+
+        pieces = []
+        bounds = starts + [end]
+        for low, high in zip(bounds, bounds[1:]):
+            child = byStart.get(low)
+            if child is None:
+                pieces.extend(self._splitLines(lines, low, high))
+            else:
+                pieces.extend(self._split(child, lines, low, high))
+        return pieces
+
+    def _splitLines(self, lines: List[str], start: int, end: int) -> List[Tuple[str, int]]:
+        pieces = []
+        low = start
+        while low < end:
+            high = low
+            tokens = 0
+            while high < end:
+                lineTokens = self.token_counter.count(lines[high])
+                if high > low and tokens + lineTokens > self.max_tokens:
+                    break
+                tokens += lineTokens
+                high += 1
+
+            if high == low + 1 and tokens > self.max_tokens:
+                # One line over budget (minified code): cut it by characters
+                pieces.extend(self._splitText(lines[low]))
+            else:
+                pieces.append(("".join(lines[low:high]), tokens))
+
+            if high >= end:
+                break
+            # Repeat a few lines so the next piece starts with some context
+            low = max(high - self.overlap_lines, low + 1)
+        return pieces
+
+    def _splitText(self, text: str) -> List[Tuple[str, int]]:
+        tokens = self.token_counter.count(text)
+        parts = -(-tokens // self.max_tokens)
+        width = -(-len(text) // parts)
+        pieces = []
+        for offset in range(0, len(text), width):
+            piece = text[offset:offset + width]
+            pieces.append((piece, self.token_counter.count(piece)))
+        return pieces
+
+    def _pack(self, pieces: List[Tuple[str, int]]) -> List[str]:
+        chunks = []
+        current, tokens = [], 0
+        for text, pieceTokens in pieces:
+            if current and tokens + pieceTokens > self.max_tokens:
+                chunks.append("".join(current))
+                current, tokens = [], 0
+            current.append(text)
+            tokens += pieceTokens
+        if current:
+            chunks.append("".join(current))
+        metrics.count("chunk_tokens", sum(pieceTokens for _, pieceTokens in pieces), exact=self.token_counter.exact)
+        return [chunk for chunk in chunks if chunk.strip()]
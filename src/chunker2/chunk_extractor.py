@@ -1,15 +1,54 @@
 import os
+import glob
 import json
-from llama_index.core import SimpleDirectoryReader
-from llama_index.core.node_parser import SentenceSplitter
+import threading
+import time
+from typing import Dict, List, Optional
 from ..ast_generator import languages
-from ... import logger
+from ..fetcher.repository_source import RepositorySource
+from .ast_chunker import AstChunker
+from .token_counter import DEFAULT_MODEL, TokenCounter, reviewBudget
+from ... import logger, metrics
 import concurrent.futures
 
 
 class ChunkExtractor2:
-    def __init__(self):
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        token_budget: Optional[int] = None,
+        backend: str = "ast",
+        chunk_size: int = 20000,
+        chunk_overlap: int = 500,
+    ):
         self.logger = logger.setupLogger()
+        if backend not in ("ast", "sentence"):
+            raise ValueError(f"Unknown chunking backend: {backend}")
+        self.backend = backend
+        self.token_counter = TokenCounter()
+        # Tokens of code one review request may carry for the target model, with more
+        # slack when counts are only estimated
+        self.token_budget = (
+            token_budget if token_budget is not None else reviewBudget(model, exact=self.token_counter.exact)
+        )
+        self.ast_chunker = AstChunker(self.token_budget, self.token_counter)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._local = threading.local()
+
+    def splitter(self):
+        # Building a splitter loads its tokenizer; keep one per worker thread
+        parser = getattr(self._local, "splitter", None)
+        if parser is None:
+            # llama-index is only needed by this backend and takes seconds to import
+            try:
+                from llama_index.core.node_parser import SentenceSplitter
+            except ImportError as e:
+                raise ImportError("The 'sentence' chunking backend needs llama-index installed") from e
+            parser = self._local.splitter = SentenceSplitter.from_defaults(
+                chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
+            )
+        return parser
 
     def detectLanguage(self, filePath):
         extension = os.path.splitext(filePath)[1][1:].lower()
@@ -20,7 +59,8 @@ class ChunkExtractor2:
             mapping = {}
             repoPath = os.path.join(root_folder, repoName)
             if os.path.isdir(repoPath):
-                self.processRepo(repoPath, mapping)
+                with metrics.stage("chunk", repo=repoPath):
+                    self.processRepo(repoPath, mapping)
 
             with open(os.path.join(repoPath, "file_chunk_mapping.json"), "w") as f:
                 json.dump(mapping, f, indent=2)
@@ -40,39 +80,155 @@ class ChunkExtractor2:
             ]
             concurrent.futures.wait(futures)
 
-    def processRepo(self, repoPath, mapping):
+    def processRepo(self, repoPath, mapping, source: Optional[RepositorySource] = None):
+        chunkFolder = os.path.join(repoPath, "chunk_data")
+        os.makedirs(chunkFolder, exist_ok=True)
+
+        if source is None:
+            source = RepositorySource.open(repoPath)
+
+        # Skips directories starting with a dot, vendored directories and generated files
+        for blob in source.walk():
+            self.processFile(blob.path, chunkFolder, mapping, blob.data)
+
+    def updateFiles(
+        self,
+        repoPath,
+        changedFiles,
+        deletedFiles,
+        mapping,
+        source: Optional[RepositorySource] = None,
+        trees: Optional[Dict] = None,
+    ):
+        # Returns (chunk files written with new text, chunk files no longer written).
+        # trees maps a file to an already parsed tree of its new content
         chunkFolder = os.path.join(repoPath, "chunk_data")
         os.makedirs(chunkFolder, exist_ok=True)
 
-        for root, dirs, files in os.walk(repoPath):
-            dirs[:] = [
-                d for d in dirs if not d.startswith(".")
-            ]  # Skip directories starting with a dot
+        if source is None:
+            source = RepositorySource.open(repoPath)
 
-            for file in files:
-                filePath = os.path.join(root, file)
-                if os.path.isfile(filePath):
-                    self.processFile(filePath, chunkFolder, mapping)
+        previous = {}
+        for filePath in list(changedFiles) + list(deletedFiles):
+            chunkFilePath = mapping.pop(filePath, None)
+            if not chunkFilePath:
+                continue
+            for partFilePath in self.partFilePaths(chunkFilePath):
+                previous[partFilePath] = self.readChunkFile(partFilePath)
+                os.remove(partFilePath)
 
-    def processFile(self, filePath, chunkFolder, mapping):
+        written = []
+        for filePath in changedFiles:
+            if source.skipPath(filePath):
+                continue
+            try:
+                content = source.read(filePath)
+            except (OSError, KeyError):
+                continue
+            tree = trees.get(filePath) if trees else None
+            written.extend(self.processFile(filePath, chunkFolder, mapping, content, tree))
+
+        # A chunk file written back with the same text still has a valid review
+        rechunked = [path for path in written if previous.get(path) != self.readChunkFile(path)]
+        # Chunk files that were not written again belong to deleted or now-skipped sources
+        stale = sorted(set(previous) - set(written))
+        return rechunked, stale
+
+    def processFile(self, filePath, chunkFolder, mapping, content: Optional[bytes] = None, tree=None) -> List[str]:
         try:
             language = self.detectLanguage(filePath)
             if language == "unknown":
                 self.logger.info(f"Skipping file with unknown language: {filePath}")
-                return
-            reader = SimpleDirectoryReader(input_files=[filePath])
-            documents = reader.load_data()
-            parser = SentenceSplitter.from_defaults(chunk_size=20000, chunk_overlap=500)
-            nodes = parser.get_nodes_from_documents(documents)
-
-            relativePath = os.path.relpath(filePath, "cloned_repos")
-            chunkFileName = relativePath.replace(os.path.sep, "_") + "_chunks.txt"
-            chunkFilePath = os.path.join(chunkFolder, chunkFileName)
+                return []
+            chunks = self.chunkContent(filePath, content, tree)
+            partFilePaths = self.writeChunks(filePath, chunkFolder, chunks)
 
-            with open(chunkFilePath, "w", encoding="utf-8") as f:
-                for node in nodes:
-                    f.write(f"Chunk: {node.text}\n\n")
-
-            mapping[filePath] = chunkFilePath
+            mapping[filePath] = partFilePaths[0]
+            return partFilePaths
         except Exception as e:
             self.logger.info(f"Error processing file {filePath}: {str(e)}")
+        return []
+
+    def writeChunks(self, filePath, chunkFolder, chunks: List[str]) -> List[str]:
+        # One chunk file per review request; only files over the token budget get parts
+        chunkFilePath = self.chunkFilePath(filePath, chunkFolder)
+        partFilePaths = []
+        for index, group in enumerate(self.groupChunks(chunks) or [[]]):
+            partFilePath = self.partFilePath(chunkFilePath, index)
+            with open(partFilePath, "w", encoding="utf-8") as f:
+                f.write(self.formatChunks(group))
+            partFilePaths.append(partFilePath)
+        return partFilePaths
+
+    def groupChunks(self, chunks: List[str]) -> List[List[str]]:
+        groups = []
+        current, tokens = [], 0
+        for chunk in chunks:
+            chunkTokens = self.token_counter.count(chunk)
+            if current and tokens + chunkTokens > self.token_budget:
+                groups.append(current)
+                current, tokens = [], 0
+            current.append(chunk)
+            tokens += chunkTokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def chunkContent(self, filePath, content: Optional[bytes] = None, tree=None) -> List[str]:
+        if content is None:
+            content = self.loadFile(filePath)
+
+        started = time.perf_counter()
+        chunks = self._chunkContent(filePath, content, tree)
+        metrics.observe("chunk_seconds", time.perf_counter() - started, backend=self.backend)
+        metrics.count("files_chunked", backend=self.backend)
+        metrics.count("bytes_chunked", len(content), backend=self.backend)
+        metrics.count("chunks", len(chunks), backend=self.backend)
+        return chunks
+
+    def _chunkContent(self, filePath, content: bytes, tree=None) -> List[str]:
+        if self.backend == "ast":
+            return self.ast_chunker.chunk(filePath, content, tree)
+
+        from llama_index.core import Document
+
+        document = Document(
+            text=content.decode("utf-8", errors="ignore"),
+            metadata={"file_path": filePath, "file_name": os.path.basename(filePath)},
+        )
+        nodes = self.splitter().get_nodes_from_documents([document])
+        return [node.text for node in nodes]
+
+    @staticmethod
+    def loadFile(filePath) -> bytes:
+        # Plain read instead of a SimpleDirectoryReader per file: no metadata extraction
+        with open(filePath, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def readChunkFile(path) -> str:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+    @staticmethod
+    def formatChunks(chunks: List[str]) -> str:
+        # The review unit: every chunk of one file, as the analyser reads it
+        return "".join(f"Chunk: {chunk}\n\n" for chunk in chunks)
+
+    @staticmethod
+    def chunkFilePath(filePath, chunkFolder) -> str:
+        relativePath = os.path.relpath(filePath, "cloned_repos")
+        chunkFileName = relativePath.replace(os.path.sep, "_") + "_chunks.txt"
+        return os.path.join(chunkFolder, chunkFileName)
+
+    @staticmethod
+    def partFilePath(chunkFilePath, index: int) -> str:
+        if index == 0:
+            return chunkFilePath
+        return f"{chunkFilePath[:-len('.txt')]}.part{index}.txt"
+
+    @staticmethod
+    def partFilePaths(chunkFilePath) -> List[str]:
+        # The mapped chunk file plus every extra part written next to it
+        pattern = glob.escape(chunkFilePath[:-len(".txt")]) + ".part*.txt"
+        return [path for path in [chunkFilePath] + glob.glob(pattern) if os.path.exists(path)]
@@ -0,0 +1,59 @@
+import logging
+from typing import Optional
+
+# tiktoken is in requirements.txt. Without it, or when the encoding cannot be
+# downloaded on an offline runner, counts fall back to the chars/4 estimate the
+# dispatcher uses, which undercounts dense code; budgets leave more room for that
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Context windows of the models the analyser is run against
+MODEL_CONTEXT_TOKENS = {
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.1-70b-versatile": 131072,
+    "mixtral-8x7b-32768": 32768,
+    "gemma2-9b-it": 8192,
+}
+DEFAULT_MODEL = "llama3-8b-8192"
+# System prompt, message framing and the structured review the model writes back
+RESERVED_TOKENS = 2048
+# Share of the budget left unused for the gap between the counter and the model's
+# own tokenizer: cl100k_base is not the llama, mixtral or gemma vocabulary, and
+# those split code into up to ~15% more tokens. The chars/4 estimate is off further
+TOKENIZER_MARGIN = 0.15
+ESTIMATE_MARGIN = 0.3
+
+
+def reviewBudget(model: str = DEFAULT_MODEL, reserved: int = RESERVED_TOKENS, exact: bool = True) -> int:
+    context = MODEL_CONTEXT_TOKENS.get(model, MODEL_CONTEXT_TOKENS[DEFAULT_MODEL])
+    margin = TOKENIZER_MARGIN if exact else ESTIMATE_MARGIN
+    return max(int((context - reserved) * (1 - margin)), 256)
+
+
+class TokenCounter:
+    def __init__(self, encoding: Optional[str] = "cl100k_base"):
+        self._encoding = None
+        if tiktoken is not None and encoding is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                # The encoding files may not be cached on an offline runner
+                logger.warning(f"Token counts fall back to a chars/4 estimate, {encoding} is unavailable: {e}")
+                self._encoding = None
+        elif encoding is not None:
+            logger.warning("Token counts fall back to a chars/4 estimate, tiktoken is not installed")
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
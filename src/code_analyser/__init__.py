@@ -1,3 +1,12 @@
-from .code_analyser import CodeAnalyser
+from ... import lazy
 
-__all__ = ["CodeAnalyser"]
\ No newline at end of file
+__getattr__, __dir__, __all__ = lazy.lazyExports(__name__, {
+    "CodeAnalyser": ".code_analyser",
+    "ReviewCache": ".review_cache",
+    "LlmDispatcher": ".llm_dispatcher",
+    "KeyPool": ".key_pool",
+    "ChunkBatcher": ".chunk_batcher",
+    "RepoScorer": ".scoring",
+    "ScoreAggregator": ".score_aggregator",
+    "Leaderboard": ".leaderboard",
+})
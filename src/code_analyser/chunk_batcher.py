@@ -0,0 +1,45 @@
+from typing import Generic, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class ChunkBatcher(Generic[T]):
+    # Tokens of the "### CHUNK <id>" header and separator each chunk adds to a batch prompt
+    CHUNK_OVERHEAD = 8
+
+    def __init__(
+        self,
+        token_budget: int = 4000,
+        small_chunk_tokens: int = 1000,
+        max_chunks: int = 8,
+    ):
+        self.token_budget = token_budget
+        self.small_chunk_tokens = small_chunk_tokens
+        self.max_chunks = max_chunks
+
+    @staticmethod
+    def estimateTokens(code: str) -> int:
+        return len(code) // 4 + 1
+
+    def isSmall(self, code: str) -> bool:
+        return self.estimateTokens(code) <= self.small_chunk_tokens
+
+    def pack(self, items: List[Tuple[T, str]]) -> List[List[Tuple[T, str]]]:
+        # items are (id, code) pairs; each batch's code fits token_budget.
+        # First-fit decreasing keeps the number of requests close to minimal
+        ordered = sorted(items, key=lambda item: self.estimateTokens(item[1]), reverse=True)
+        batches: List[List[Tuple[T, str]]] = []
+        sizes: List[int] = []
+
+        for item in ordered:
+            tokens = self.estimateTokens(item[1]) + self.CHUNK_OVERHEAD
+            for index, batch in enumerate(batches):
+                if len(batch) < self.max_chunks and sizes[index] + tokens <= self.token_budget:
+                    batch.append(item)
+                    sizes[index] += tokens
+                    break
+            else:
+                batches.append([item])
+                sizes.append(tokens)
+
+        return batches
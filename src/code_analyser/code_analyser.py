@@ -1,30 +1,25 @@
-from groq import Groq
-import instructor
 import os
 import json
 import time
-from .code_file_eval_model import CodeReviewModel
-from collections import defaultdict
-from ... import logger
-import subprocess
+from typing import TYPE_CHECKING, List, Optional
+from .code_file_eval_model import BatchReviewModel, CodeReviewModel
+from .chunk_batcher import ChunkBatcher
+from .review_cache import ReviewCache
+from .score_aggregator import ScoreAggregator
+from .scoring import OUTPUT_SUFFIX, RepoScorer
+from ... import logger, metrics
 from dotenv import load_dotenv
 import concurrent.futures
-import random
-
-load_dotenv()
+import threading
+from collections import defaultdict
 
+if TYPE_CHECKING:
+    from ..dedup.chunk_deduplicator import ChunkDeduplicator
+    from .llm_dispatcher import LlmDispatcher
 
-class CodeAnalyser:
-    def __init__(self):
-        self.logger = logger.setupLogger()
-
-    def get_code(self, file_path: str):
-        with open(file_path, "r") as f:
-            code = f.read()
-        return code
+load_dotenv()
 
-    def getOutput(self, filePath: str):
-        sys_prompt = """
+SYS_PROMPT = """
         You are an expert code reviewer evaluating a project for a hackathon.\n
         Your task is to analyze the given code and provide a comprehensive review.\n
         Focus on readability maintainability, consistency, commenting, correctness, completeness, error handling, efficiency, scalability, security, test coverage, innovation, creativity, complexity score, project impact,technical complexity, and practicality.\n
@@ -39,63 +34,290 @@ class CodeAnalyser:
         NOTE: THIS IS MEANT TO VIEWED BY THE JUDGES OF THE HACKATHON, MAKE IT SUCH THAT, IT ASSISTS THEM IN THEIR EVALUATION.\n
         """
 
-        keys = os.getenv("API_KEYS")
-        random_key = random.choice(keys.split(","))
-
-        client = Groq(api_key=random_key)
-        client = instructor.from_groq(client, mode=instructor.Mode.TOOLS)
-
-        output = client.chat.completions.create(
-            model="llama3-8b-8192",  # llama-3.1-70b-versatile  "mixtral-8x7b-32768",
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {
-                    "role": "user",
-                    "content": self.get_code(filePath),
-                },
-            ],
-            response_model=CodeReviewModel,
+BATCH_SYS_PROMPT = SYS_PROMPT + """
+        You will receive several independent code chunks. Each chunk starts with a line of the form "### CHUNK <id>".\n
+        Review every chunk on its own and return exactly one review per chunk, with chunk_id set to that chunk's <id>.\n
+        """
+
+
+class CodeAnalyser:
+    # llama-3.1-70b-versatile  "mixtral-8x7b-32768",
+    DEFAULT_MODEL = "llama3-8b-8192"
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        cache: Optional[ReviewCache] = None,
+        dispatcher: Optional["LlmDispatcher"] = None,
+        batch_token_budget: int = 4000,
+        deduplicator: Optional["ChunkDeduplicator"] = None,
+    ):
+        self.logger = logger.setupLogger()
+        self.model = model
+        self.cache = cache
+        # Reviews complete on the dispatcher's event loop; SQLite writes happen here instead
+        self._cache_writer = (
+            concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="review-cache")
+            if cache is not None
+            else None
+        )
+        # Small chunks of a repo share one request, up to batch_token_budget; 0 disables
+        self.batcher = ChunkBatcher(token_budget=batch_token_budget) if batch_token_budget > 0 else None
+        self._dispatcher = dispatcher
+        self.scorer = RepoScorer()
+        # Duplicate review units across the run reuse the review of their cluster's representative
+        self.deduplicator = deduplicator
+        self._shared = {}
+        self._shared_lock = threading.Lock()
+
+    @property
+    def dispatcher(self) -> "LlmDispatcher":
+        if self._dispatcher is None:
+            # groq and instructor are only imported once a review is actually sent
+            from .llm_dispatcher import LlmDispatcher
+
+            self._dispatcher = LlmDispatcher.fromEnv()
+        return self._dispatcher
+
+    def dispatcherMetrics(self):
+        # None when nothing was sent, without creating a client just to ask
+        return self._dispatcher.metrics() if self._dispatcher is not None else None
+
+    def get_code(self, file_path: str):
+        with open(file_path, "r") as f:
+            code = f.read()
+        return code
+
+    def buildMessages(self, code: str):
+        return [
+            {"role": "system", "content": SYS_PROMPT},
+            {
+                "role": "user",
+                "content": code,
+            },
+        ]
+
+    def buildBatchMessages(self, items):
+        chunks = "\n\n".join(
+            f"### CHUNK {chunkId}\n{code}" for chunkId, code in items
         )
-        return output
+        return [
+            {"role": "system", "content": BATCH_SYS_PROMPT},
+            {
+                "role": "user",
+                "content": chunks,
+            },
+        ]
 
-    def processAllRepos(self, root_folder):
-        scores = []
+    def lookupCache(self, code: str, batched: bool = False):
+        # Returns (review, key to store a single review under). Reviews taken from a
+        # batch are stored under their own key, checked first for batchable code
+        if self.cache is None:
+            return None, None
+        cacheKey = ReviewCache.makeKey(SYS_PROMPT, self.model, CodeReviewModel, code)
+        if batched:
+            cached = self.cache.get(self.batchCacheKey(code), CodeReviewModel)
+            if cached is not None:
+                return cached, cacheKey
+        return self.cache.get(cacheKey, CodeReviewModel), cacheKey
 
-        def process_single_repo(repoName):
-            mapping = {}
-            repoPath = os.path.join(root_folder, repoName)
-            score_summary = None
+    def batchCacheKey(self, code: str) -> str:
+        return ReviewCache.makeKey(BATCH_SYS_PROMPT, self.model, CodeReviewModel, code)
 
-            if os.path.isdir(repoPath):
-                self.processRepo(repoPath, mapping)
-                score_summary = self.finalScores(repoPath)
+    def resolveReview(self, future: concurrent.futures.Future, review, cacheKey: Optional[str]) -> None:
+        # Called on the event loop: the cache write goes to the writer thread, and the
+        # future completes once the review is stored
+        if cacheKey is None:
+            future.set_result(review)
+            return
 
-                with open(os.path.join(repoPath, "file_output_mapping.json"), "w") as f:
-                    json.dump(mapping, f, indent=2)
+        def store():
+            try:
+                self.cache.put(cacheKey, review)
+            except Exception as e:
+                self.logger.warning(f"Could not cache review: {e}")
+            future.set_result(review)
+
+        self._cache_writer.submit(store)
+
+    def submitReview(self, code: str) -> concurrent.futures.Future:
+        cached, cacheKey = self.lookupCache(code)
+        if cached is not None:
+            metrics.count("review_units", source="cache")
+            future = concurrent.futures.Future()
+            future.set_result(cached)
+            return future
+        metrics.count("review_units", source="single")
+        return self.dispatchReview(code, cacheKey)
+
+    def dispatchReview(self, code: str, cacheKey: Optional[str]) -> concurrent.futures.Future:
+        future = self.dispatcher.submit(
+            self.model, self.buildMessages(code), CodeReviewModel
+        )
+        if cacheKey is None:
+            return future
+        stored = concurrent.futures.Future()
 
-            return score_summary
+        def store(done):
+            if done.exception() is not None:
+                stored.set_exception(done.exception())
+            else:
+                self.resolveReview(stored, done.result(), cacheKey)
 
+        future.add_done_callback(store)
+        return stored
+
+    def dispatchBatch(self, items) -> List[concurrent.futures.Future]:
+        # items are (code, cacheKey) pairs; chunk ids are batch positions so the
+        # model never has to echo long paths back
+        numbered = [(str(index + 1), code) for index, (code, _) in enumerate(items)]
+        batchFuture = self.dispatcher.submit(
+            self.model, self.buildBatchMessages(numbered), BatchReviewModel
+        )
+        futures = [concurrent.futures.Future() for _ in items]
+
+        def forward(source, target):
+            def done(finished):
+                if finished.exception() is not None:
+                    target.set_exception(finished.exception())
+                else:
+                    target.set_result(finished.result())
+
+            source.add_done_callback(done)
+
+        def split(done):
+            reviews = {}
+            if done.exception() is not None:
+                self.logger.info(f"Batch review failed, retrying chunks singly: {done.exception()}")
+            else:
+                reviews = {review.chunk_id.strip(): review.review for review in done.result().reviews}
+
+            for (chunkId, _), (code, cacheKey), future in zip(numbered, items, futures):
+                review = reviews.get(chunkId)
+                if review is None:
+                    forward(self.dispatchReview(code, cacheKey), future)
+                    continue
+                # Stored under the batch key: it was not produced by the single-review prompt
+                self.resolveReview(future, review, self.batchCacheKey(code) if cacheKey is not None else None)
+
+        batchFuture.add_done_callback(split)
+        return futures
+
+    def submitUnit(self, key: str, code: str, group: Optional[str] = None) -> concurrent.futures.Future:
+        return self.submitUnits([(key, code, group)])[0]
+
+    def submitUnits(self, units) -> List[concurrent.futures.Future]:
+        # units are (key, code, group) triples of named review units; returns one future per
+        # unit. A duplicate of a unit seen earlier in the run shares its review, and small
+        # units are packed into batch requests
+        futures: List[Optional[concurrent.futures.Future]] = [None] * len(units)
+        batchable = []
+        duplicates = []
+        for index, (key, code, group) in enumerate(units):
+            try:
+                if self.deduplicator is not None:
+                    representative = self.deduplicator.assign(key, code, group).representative
+                    if representative != key:
+                        duplicates.append((index, representative))
+                        continue
+                small = self.batcher is not None and self.batcher.isSmall(code)
+                cached, cacheKey = self.lookupCache(code, batched=small)
+                if cached is not None:
+                    metrics.count("review_units", source="cache")
+                    future = concurrent.futures.Future()
+                    future.set_result(cached)
+                elif small:
+                    # Keyed by position, so the batcher sizes batches by the code itself
+                    batchable.append(((index, cacheKey), code))
+                    continue
+                else:
+                    metrics.count("review_units", source="single")
+                    future = self.dispatchReview(code, cacheKey)
+            except Exception as e:
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+            futures[index] = future
+            self.shareReview(key, future)
+
+        if batchable:
+            for batch in self.batcher.pack(batchable):
+                if len(batch) == 1:
+                    metrics.count("review_units", source="single")
+                    (_, cacheKey), code = batch[0]
+                    batchFutures = [self.dispatchReview(code, cacheKey)]
+                else:
+                    metrics.count("review_units", len(batch), source="batch")
+                    batchFutures = self.dispatchBatch([(code, cacheKey) for (_, cacheKey), code in batch])
+                for ((index, _), _), future in zip(batch, batchFutures):
+                    futures[index] = future
+                    self.shareReview(units[index][0], future)
+
+        # Each copy gets its own output and score, from the one review of its representative
+        for index, representative in duplicates:
+            future = self.sharedReview(representative)
+            if future is None:
+                # Its representative may not be submitted yet; reviewing the copy is still correct
+                key, code, _ = units[index]
+                future = self.submitReview(code)
+                self.shareReview(key, future)
+            else:
+                metrics.count("review_units", source="duplicate")
+            futures[index] = future
+
+        return futures
+
+    def sharedReview(self, key: str) -> Optional[concurrent.futures.Future]:
+        with self._shared_lock:
+            return self._shared.get(key)
+
+    def shareReview(self, key: str, future: concurrent.futures.Future) -> None:
+        if self.deduplicator is not None:
+            with self._shared_lock:
+                self._shared[key] = future
+
+    def resetDeduplication(self) -> None:
+        if self.deduplicator is not None:
+            self.deduplicator.reset()
+        with self._shared_lock:
+            self._shared.clear()
+
+    def getOutput(self, filePath: str):
+        return self.submitReview(self.get_code(filePath)).result()
+
+    def processAllRepos(self, root_folder, aggregator: Optional[ScoreAggregator] = None):
         repo_names = [
             repoName
             for repoName in os.listdir(root_folder)
             if os.path.isdir(os.path.join(root_folder, repoName))
         ]
 
-        # Use ThreadPoolExecutor to parallelize processing of repositories
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Submit tasks for each repository and collect the results
-            futures = [
-                executor.submit(process_single_repo, repoName)
-                for repoName in repo_names
-            ]
-            for future in concurrent.futures.as_completed(futures):
-                score_summary = future.result()
-                if score_summary is not None:
-                    scores.append(score_summary)
+        # Every chunk of every repo goes through the one dispatcher, which owns
+        # the global concurrency and rate-limit budgets
+        mappings = {}
+        pending = []
+        self.resetDeduplication()
+        with metrics.stage("review"):
+            for repoName in repo_names:
+                repoPath = os.path.join(root_folder, repoName)
+                mappings[repoPath] = {}
+                pending.extend(self.submitRepo(repoPath, mappings[repoPath]))
+
+            # Scores are aggregated as reviews complete instead of re-reading every output file
+            if aggregator is None:
+                aggregator = ScoreAggregator()
+            self.collect(pending, aggregator)
+
+        scores = self.scorer.scoreRepos(aggregator, list(mappings))
+        for repoPath, mapping in mappings.items():
+            with open(os.path.join(repoPath, "file_output_mapping.json"), "w") as f:
+                json.dump(mapping, f, indent=2)
 
         return scores
 
     def processRepo(self, repoPath, mapping):
+        self.collect(self.submitRepo(repoPath, mapping))
+
+    def submitRepo(self, repoPath, mapping):
         outputFolder = os.path.join(repoPath, "output_data")
         os.makedirs(outputFolder, exist_ok=True)
         chunkFolderPath = os.path.join(repoPath, "chunk_data")
@@ -105,65 +327,88 @@ class CodeAnalyser:
             for file in os.listdir(chunkFolderPath)
             if os.path.isfile(os.path.join(chunkFolderPath, file))
         ]
+        return self.submitFiles(file_paths, outputFolder, mapping)
 
-        def process_single_file(filePath):
-            self.processFile(filePath, outputFolder, mapping)
+    def updateFiles(self, repoPath, chunkFiles, staleChunkFiles, mapping):
+        outputFolder = os.path.join(repoPath, "output_data")
+        os.makedirs(outputFolder, exist_ok=True)
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Submit all the files to be processed in parallel
-            futures = [
-                executor.submit(process_single_file, filePath)
-                for filePath in file_paths
-            ]
-            # Wait for all tasks to complete
-            concurrent.futures.wait(futures)
+        # Drop previous outputs first so a failed re-review never leaves a stale score
+        for chunkFile in list(chunkFiles) + list(staleChunkFiles):
+            outputFilePath = mapping.pop(chunkFile, None)
+            if outputFilePath and os.path.exists(outputFilePath):
+                os.remove(outputFilePath)
 
-    def processFile(self, filePath, outputFolder, mapping):
-        try:
-            output = self.getOutput(filePath).model_dump_json(indent=2)
+        self.collect(self.submitFiles(chunkFiles, outputFolder, mapping))
 
-            relativePath = os.path.relpath(filePath, "cloned_repos")
-            ouputFileName = relativePath.replace(os.path.sep, "_") + "_output.txt"
-            outputFilePath = os.path.join(outputFolder, ouputFileName)
+    def submitFiles(self, file_paths, outputFolder, mapping):
+        group = os.path.dirname(outputFolder)
+        units = []
+        for filePath in file_paths:
+            try:
+                units.append((filePath, self.get_code(filePath), group))
+            except Exception as e:
+                self.logger.info(f"Error processing file {filePath}: {str(e)}")
+
+        return [
+            (future, filePath, outputFolder, mapping, self.codeWeights(code))
+            for (filePath, code, _), future in zip(units, self.submitUnits(units))
+        ]
 
-            with open(outputFilePath, "w", encoding="utf-8") as f:
-                f.write(output)
+    def collect(self, pending, aggregator: Optional[ScoreAggregator] = None):
+        # Duplicates share their representative's future, so one future may have several units
+        futures = defaultdict(list)
+        for future, *rest in pending:
+            futures[future].append(rest)
+        for future in concurrent.futures.as_completed(futures):
+            for filePath, outputFolder, mapping, (size, lines) in futures[future]:
+                try:
+                    review = future.result()
+                    self.writeOutput(review, filePath, outputFolder, mapping)
+                except Exception as e:
+                    metrics.count("review_failures")
+                    self.logger.info(f"Error processing file {filePath}: {str(e)}")
+                    continue
+                if aggregator is not None:
+                    repoPath = os.path.dirname(outputFolder)
+                    aggregator.add(repoPath, review, filePath, size, lines, self.chunkId(filePath))
 
-            mapping[filePath] = outputFilePath
+    @staticmethod
+    def codeWeights(code: str):
+        # (characters, lines) of a review unit, for size-weighted scores
+        return len(code), code.count("\n") + 1
+
+    def processFile(self, filePath, outputFolder, mapping):
+        try:
+            self.writeOutput(self.getOutput(filePath), filePath, outputFolder, mapping)
         except Exception as e:
             self.logger.info(f"Error processing file {filePath}: {str(e)}")
 
-    def finalScores(self, repoPath):
-        directory = os.path.join(repoPath, "output_data")
-        score_aggregation = defaultdict(int)
-        files = 0
+    def writeOutput(self, review, filePath, outputFolder, mapping):
+        output = review.model_dump_json(indent=2)
+        outputFilePath = self.outputFilePath(filePath, outputFolder)
 
-        for filename in os.listdir(directory):
-            if filename.endswith(".txt"):
-                with open(os.path.join(directory, filename), "r") as file:
-                    data = json.load(file)
+        with open(outputFilePath, "w", encoding="utf-8") as f:
+            f.write(output)
 
-                for key, value in data.items():
-                    if isinstance(value, dict) and "score" in value:
-                        score_aggregation[key] += value["score"]
-            files += 1
+        mapping[filePath] = outputFilePath
 
-        for category in score_aggregation:
-            score_aggregation[category] = round(score_aggregation[category] / files, 1)
+    @staticmethod
+    def chunkId(filePath) -> str:
+        # Stable name of a review unit, shared by its output file and the leaderboard
+        relativePath = os.path.relpath(filePath, "cloned_repos")
+        return relativePath.replace(os.path.sep, "_")
 
-        score_aggregation["repo_link"] = self.getGithubUrl(repoPath)
-        return score_aggregation
+    @staticmethod
+    def outputFilePath(filePath, outputFolder) -> str:
+        ouputFileName = CodeAnalyser.chunkId(filePath) + OUTPUT_SUFFIX
+        return os.path.join(outputFolder, ouputFileName)
+
+    def finalScores(self, repoPath):
+        return self.scorer.finalScores(repoPath)
+
+    def scoreReviews(self, reviews, repoPath):
+        return self.scorer.scoreReviews(reviews, repoPath)
 
     def getGithubUrl(self, repoPath):
-        try:
-            result = subprocess.run(
-                ["git", "config", "--get", "remote.origin.url"],
-                cwd=repoPath,
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-            return result.stdout.strip()
-        except subprocess.CalledProcessError:
-            self.logger.warning(f"Unable to get GitHub URL for repo: {repoPath}")
-            return "Unknown Repository"
+        return self.scorer.getGithubUrl(repoPath)
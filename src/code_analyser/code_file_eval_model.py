@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel, Field
 
 
@@ -38,3 +39,12 @@ class CodeReviewModel(BaseModel):
     project_impact: CodeReviewCategory
     technical_complexity: CodeReviewCategory
     practicality: CodeReviewCategory
+
+
+class ChunkReview(BaseModel):
+    chunk_id: str = Field(..., description="Id of the chunk this review belongs to")
+    review: CodeReviewModel
+
+
+class BatchReviewModel(BaseModel):
+    reviews: List[ChunkReview]
@@ -0,0 +1,257 @@
+import re
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import groq
+import httpx
+import instructor
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        self._refill()
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+
+def parseResetDuration(value: str) -> Optional[float]:
+    # Groq reports resets as Go durations such as "2m59.56s" or "120ms"
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value or "")
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class NoUsableKeyError(RuntimeError):
+    # Every key of the pool was rejected by the API; retrying cannot succeed
+    pass
+
+
+class KeyState:
+    LATENCY_WINDOW = 1000
+
+    def __init__(self, key: str, requests_per_minute: float, tokens_per_minute: float, index: int = 0):
+        self.key = key
+        # Position in the pool; keys may share their last characters, so it keeps labels apart
+        self.index = index
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.cooldown_until = 0.0
+        # Set once the API rejects the key; it is not tried again this run
+        self.disabled = False
+
+        # Latest quota reported by the API; None until the first response
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.limit_requests: Optional[int] = None
+        self.limit_tokens: Optional[int] = None
+        self.requests_reset_at = 0.0
+        self.tokens_reset_at = 0.0
+
+        self.request_count = 0
+        self.token_count = 0
+        self.throttle_count = 0
+        self.error_count = 0
+        self.latencies = deque(maxlen=self.LATENCY_WINDOW)
+
+        self.client: Optional[groq.AsyncGroq] = None
+        self.instructor: Optional[instructor.AsyncInstructor] = None
+
+    @property
+    def label(self) -> str:
+        return f"#{self.index} ...{self.key[-4:]}"
+
+    def delay(self, estimated_tokens: float) -> float:
+        now = time.monotonic()
+        delays = [
+            self.cooldown_until - now,
+            self.requests.delay(1),
+            self.tokens.delay(estimated_tokens),
+        ]
+        if self.remaining_requests is not None and self.remaining_requests < 1:
+            delays.append(self.requests_reset_at - now)
+        if self.remaining_tokens is not None and self.remaining_tokens < estimated_tokens:
+            delays.append(self.tokens_reset_at - now)
+        return max(0.0, *delays)
+
+    def headroom(self, estimated_tokens: float) -> float:
+        # Fraction of the reported quota still available; unknown keys rank first
+        # so that every key gets probed once
+        fractions = []
+        if self.remaining_requests is not None and self.limit_requests:
+            fractions.append(self.remaining_requests / self.limit_requests)
+        if self.remaining_tokens is not None and self.limit_tokens:
+            fractions.append((self.remaining_tokens - estimated_tokens) / self.limit_tokens)
+        return min(fractions) if fractions else 1.0
+
+    def reserve(self, estimated_tokens: float) -> None:
+        self.requests.consume(1)
+        self.tokens.consume(estimated_tokens)
+        if self.remaining_requests is not None:
+            self.remaining_requests -= 1
+        if self.remaining_tokens is not None:
+            self.remaining_tokens -= int(estimated_tokens)
+
+    def updateFromHeaders(self, headers: httpx.Headers) -> None:
+        now = time.monotonic()
+        for attribute, header in (
+            ("remaining_requests", "x-ratelimit-remaining-requests"),
+            ("remaining_tokens", "x-ratelimit-remaining-tokens"),
+            ("limit_requests", "x-ratelimit-limit-requests"),
+            ("limit_tokens", "x-ratelimit-limit-tokens"),
+        ):
+            value = headers.get(header)
+            if value is not None and value.isdigit():
+                setattr(self, attribute, int(value))
+
+        reset = parseResetDuration(headers.get("x-ratelimit-reset-requests"))
+        if reset is not None:
+            self.requests_reset_at = now + reset
+        reset = parseResetDuration(headers.get("x-ratelimit-reset-tokens"))
+        if reset is not None:
+            self.tokens_reset_at = now + reset
+
+    def metrics(self) -> Dict:
+        latencies = list(self.latencies)
+        return {
+            "requests": self.request_count,
+            "tokens": self.token_count,
+            "throttles": self.throttle_count,
+            "errors": self.error_count,
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens,
+            "cooling_down": self.cooldown_until > time.monotonic(),
+            "disabled": self.disabled,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p90": percentile(latencies, 90),
+            "latency_p99": percentile(latencies, 99),
+        }
+
+
+class KeyPool:
+    def __init__(
+        self,
+        api_keys: List[str],
+        requests_per_minute: float = 30,
+        tokens_per_minute: float = 30000,
+        throttle_cooldown: float = 30.0,
+        base_url: Optional[str] = None,
+        timeout: float = 120.0,
+        max_connections: int = 16,
+    ):
+        keys = [key.strip() for key in api_keys if key.strip()]
+        if not keys:
+            raise ValueError("KeyPool needs at least one API key")
+
+        self.throttle_cooldown = throttle_cooldown
+        self.states: Dict[str, KeyState] = {}
+        for key in dict.fromkeys(keys):
+            state = KeyState(key, requests_per_minute, tokens_per_minute, len(self.states))
+            state.client = groq.AsyncGroq(
+                api_key=key,
+                base_url=base_url,
+                timeout=timeout,
+                max_retries=0,  # retries are owned by the dispatcher
+                http_client=httpx.AsyncClient(
+                    timeout=timeout,
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_connections,
+                    ),
+                    event_hooks={"response": [self._headerHook(state)]},
+                ),
+            )
+            state.instructor = instructor.from_groq(state.client, mode=instructor.Mode.TOOLS)
+            self.states[key] = state
+
+    @staticmethod
+    def _headerHook(state: KeyState):
+        async def hook(response: httpx.Response) -> None:
+            state.updateFromHeaders(response.headers)
+
+        return hook
+
+    @property
+    def usable(self) -> bool:
+        return any(not state.disabled for state in self.states.values())
+
+    def checkUsable(self) -> None:
+        if not self.usable:
+            raise NoUsableKeyError(f"All {len(self.states)} API keys were rejected by the API; check API_KEYS")
+
+    def choose(self, estimated_tokens: float) -> Tuple[Optional[KeyState], float]:
+        self.checkUsable()
+        ready = []
+        soonest = None
+        for state in self.states.values():
+            if state.disabled:
+                continue
+            delay = state.delay(estimated_tokens)
+            if delay <= 0:
+                ready.append(state)
+            elif soonest is None or delay < soonest:
+                soonest = delay
+
+        if not ready:
+            return None, soonest
+        best = max(ready, key=lambda state: state.headroom(estimated_tokens))
+        best.reserve(estimated_tokens)
+        return best, 0.0
+
+    def recordSuccess(self, state: KeyState, latency: float, estimated_tokens: int, used_tokens: Optional[int]) -> None:
+        state.request_count += 1
+        state.latencies.append(latency)
+        if used_tokens:
+            state.token_count += used_tokens
+            # Settle the estimate against what the API actually billed
+            state.tokens.consume(used_tokens - estimated_tokens)
+
+    def recordThrottle(self, state: KeyState, retry_after: Optional[float]) -> None:
+        state.request_count += 1
+        state.throttle_count += 1
+        cooldown = retry_after if retry_after is not None else self.throttle_cooldown
+        state.cooldown_until = max(state.cooldown_until, time.monotonic() + cooldown)
+
+    def recordAuthError(self, state: KeyState) -> None:
+        state.request_count += 1
+        state.error_count += 1
+        # A rejected key stays rejected: cooling it down would only stall every request behind it
+        state.disabled = True
+
+    def recordError(self, state: KeyState) -> None:
+        state.request_count += 1
+        state.error_count += 1
+
+    def metrics(self) -> Dict[str, Dict]:
+        return {state.label: state.metrics() for state in self.states.values()}
+
+    async def close(self) -> None:
+        for state in self.states.values():
+            await state.client.close()
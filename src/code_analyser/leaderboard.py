@@ -0,0 +1,228 @@
+import argparse
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .score_aggregator import ScoreAggregator
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed to export or query a leaderboard
+    pa = pc = pq = None
+
+# Long-format tables, one row per (review unit or repo, category)
+CHUNK_TABLE = "chunks"
+REPO_TABLE = "repos"
+FORMATS = {"parquet": ".parquet", "ipc": ".arrow"}
+LEVELS = (CHUNK_TABLE, REPO_TABLE)
+
+
+def requirePyarrow() -> None:
+    if pa is None:
+        raise ImportError("The leaderboard needs pyarrow: pip install pyarrow")
+
+
+class Leaderboard:
+    # Scores of every review unit and every repo across all teams, in two columnar
+    # tables that can be written once after a run and ranked or filtered without
+    # re-reading thousands of output files:
+    #   chunks: repo, repo_url, file_path, chunk_id, category, score
+    #   repos:  repo, repo_url, category, score, reviews
+    # Repo and category columns are dictionary encoded, so each name is stored once
+
+    def __init__(self, chunks: "pa.Table", repos: "pa.Table"):
+        requirePyarrow()
+        self.chunks = chunks
+        self.repos = repos
+
+    @classmethod
+    def fromAggregator(
+        cls,
+        aggregator: ScoreAggregator,
+        repoUrl: Optional[Callable[[str], str]] = None,
+        weight: Optional[str] = None,
+    ) -> "Leaderboard":
+        requirePyarrow()
+        repos, repoIds, files, chunkIds, scores = aggregator.snapshot()
+        urls = pa.array([repoUrl(repo) if repoUrl else None for repo in repos], type=pa.string())
+        repoNames = pa.array(repos, type=pa.string())
+        categories = pa.array(aggregator.categories, type=pa.string())
+
+        # Every scored (review, category) cell becomes one row
+        rows, columns = np.nonzero(~np.isnan(scores))
+        reviewRepos = pa.array(repoIds[rows], type=pa.int32())
+        chunks = pa.table({
+            "repo": pa.DictionaryArray.from_arrays(reviewRepos, repoNames),
+            "repo_url": pa.DictionaryArray.from_arrays(reviewRepos, urls),
+            "file_path": pa.array(files, type=pa.string()).take(pa.array(rows)),
+            "chunk_id": pa.array(chunkIds, type=pa.string()).take(pa.array(rows)),
+            "category": pa.DictionaryArray.from_arrays(pa.array(columns, type=pa.int32()), categories),
+            "score": pa.array(scores[rows, columns], type=pa.float32()),
+        })
+
+        # Per repo means come from the aggregator, so they match the reported scores
+        tableRepos, means = aggregator.table(weight)
+        counts = np.zeros(means.shape, dtype=np.int64)
+        np.add.at(counts, repoIds, ~np.isnan(scores))
+        repoRows, repoColumns = np.nonzero(~np.isnan(means[:len(repos)]))
+        repoIndex = pa.array(repoRows, type=pa.int32())
+        repoTable = pa.table({
+            "repo": pa.DictionaryArray.from_arrays(repoIndex, pa.array(tableRepos[:len(repos)], type=pa.string())),
+            "repo_url": pa.DictionaryArray.from_arrays(repoIndex, urls),
+            "category": pa.DictionaryArray.from_arrays(pa.array(repoColumns, type=pa.int32()), categories),
+            "score": pa.array(means[repoRows, repoColumns], type=pa.float64()),
+            "reviews": pa.array(counts[repoRows, repoColumns], type=pa.int64()),
+        })
+        return cls(chunks, repoTable)
+
+    @staticmethod
+    def tablePath(directory: str, name: str, format: str = "parquet") -> str:
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format: {format}, expected one of {tuple(FORMATS)}")
+        return os.path.join(directory, name + FORMATS[format])
+
+    def write(self, directory: str, format: str = "parquet") -> Dict[str, str]:
+        os.makedirs(directory, exist_ok=True)
+        paths = {}
+        for name, table in ((CHUNK_TABLE, self.chunks), (REPO_TABLE, self.repos)):
+            path = self.tablePath(directory, name, format)
+            if format == "parquet":
+                pq.write_table(table, path, compression="zstd")
+            else:
+                with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            paths[name] = path
+        return paths
+
+    @classmethod
+    def load(cls, directory: str) -> "Leaderboard":
+        requirePyarrow()
+        tables = {}
+        for name in LEVELS:
+            parquetPath = cls.tablePath(directory, name, "parquet")
+            if os.path.exists(parquetPath):
+                tables[name] = pq.read_table(parquetPath)
+            else:
+                # IPC files are memory mapped, so a query only touches the columns it reads
+                with pa.memory_map(cls.tablePath(directory, name, "ipc")) as source:
+                    tables[name] = pa.ipc.open_file(source).read_all()
+        return cls(tables[CHUNK_TABLE], tables[REPO_TABLE])
+
+    def _table(self, level: str) -> "pa.Table":
+        if level not in LEVELS:
+            raise ValueError(f"Unknown level: {level}, expected one of {LEVELS}")
+        return self.chunks if level == CHUNK_TABLE else self.repos
+
+    @staticmethod
+    def _order(table: "pa.Table", sort_keys: List[Tuple[str, str]]) -> "pa.Array":
+        # Arrow cannot sort dictionary columns, so only the keys are decoded
+        keys = {}
+        for name, _ in sort_keys:
+            column = table[name]
+            keys[name] = pc.cast(column, column.type.value_type) if pa.types.is_dictionary(column.type) else column
+        return pc.sort_indices(pa.table(keys), sort_keys=sort_keys)
+
+    def filter(
+        self,
+        level: str = CHUNK_TABLE,
+        repos: Optional[Sequence[str]] = None,
+        categories: Optional[Sequence[str]] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+    ) -> "pa.Table":
+        table = self._table(level)
+        conditions = []
+        if repos is not None:
+            conditions.append(pc.is_in(pc.cast(table["repo"], pa.string()), value_set=pa.array(list(repos), pa.string())))
+        if categories is not None:
+            conditions.append(
+                pc.is_in(pc.cast(table["category"], pa.string()), value_set=pa.array(list(categories), pa.string()))
+            )
+        if min_score is not None:
+            conditions.append(pc.greater_equal(table["score"], min_score))
+        if max_score is not None:
+            conditions.append(pc.less_equal(table["score"], max_score))
+        mask = None
+        for condition in conditions:
+            mask = condition if mask is None else pc.and_(mask, condition)
+        return table if mask is None else table.filter(mask)
+
+    def rank(self, category: Optional[str] = None, limit: Optional[int] = None) -> "pa.Table":
+        # Repos by their mean score in one category, or across all categories when none is given
+        if category is None:
+            table = self.repos.group_by(["repo", "repo_url"]).aggregate([("score", "mean"), ("reviews", "sum")])
+            table = table.rename_columns({"score_mean": "score", "reviews_sum": "reviews"})
+        else:
+            table = self.filter(REPO_TABLE, categories=[category]).drop_columns(["category"])
+        table = table.select(["repo", "repo_url", "score", "reviews"])
+        table = table.take(self._order(table, [("score", "descending"), ("repo", "ascending")]))
+        if limit is not None:
+            table = table.slice(0, limit)
+        return table.append_column("rank", pa.array(np.arange(1, len(table) + 1), type=pa.int32()))
+
+    def topK(self, k: int, level: str = CHUNK_TABLE, categories: Optional[Sequence[str]] = None) -> "pa.Table":
+        # The k best rows of every category, best first within each category
+        table = self.filter(level, categories=categories)
+        if not len(table):
+            return table
+        table = table.take(self._order(table, [("category", "ascending"), ("score", "descending")]))
+
+        # Position of each row inside its category run of the sorted table
+        category = pc.cast(table["category"], pa.string())
+        codes = pc.dictionary_encode(category).combine_chunks().indices.to_numpy(zero_copy_only=False)
+        positions = np.arange(len(codes))
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        runStart = starts[np.searchsorted(starts, positions, side="right") - 1]
+        return table.filter(pa.array(positions - runStart < k))
+
+
+def exportRepos(
+    repoPaths: Sequence[str], directory: str, format: str = "parquet", weight: Optional[str] = None
+) -> Tuple[Leaderboard, Dict[str, str]]:
+    from .scoring import RepoScorer
+
+    scorer = RepoScorer()
+    aggregator = ScoreAggregator()
+    for repoPath in repoPaths:
+        scorer.loadInto(aggregator, repoPath)
+    leaderboard = Leaderboard.fromAggregator(aggregator, scorer.getGithubUrl, weight)
+    return leaderboard, leaderboard.write(directory, format)
+
+
+def printTable(table: "pa.Table") -> None:
+    columns: List[str] = table.column_names
+    print("\t".join(columns))
+    for row in table.to_pylist():
+        print("\t".join(str(row[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or query the cross-repo leaderboard")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write the leaderboard of already reviewed repositories")
+    export.add_argument("directory", help="Folder to write the leaderboard tables to")
+    export.add_argument("repoPaths", nargs="+", help="Cloned repositories with an output_data folder")
+    export.add_argument("--format", choices=tuple(FORMATS), default="parquet")
+    export.add_argument("--weight", choices=ScoreAggregator.WEIGHTS, help="Weight repo means by chunk size or lines")
+
+    rank = commands.add_parser("rank", help="Rank repositories")
+    rank.add_argument("directory")
+    rank.add_argument("--category", help="Rank by one category instead of the mean of all")
+    rank.add_argument("--limit", type=int)
+
+    top = commands.add_parser("top", help="Best k chunks or repos of each category")
+    top.add_argument("directory")
+    top.add_argument("-k", type=int, default=10)
+    top.add_argument("--level", choices=LEVELS, default=CHUNK_TABLE)
+    top.add_argument("--category", action="append", dest="categories")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        _, paths = exportRepos(args.repoPaths, args.directory, args.format, args.weight)
+        print("\n".join(paths.values()))
+    elif args.command == "rank":
+        printTable(Leaderboard.load(args.directory).rank(args.category, args.limit))
+    else:
+        printTable(Leaderboard.load(args.directory).topK(args.k, args.level, args.categories))
@@ -0,0 +1,239 @@
+import asyncio
+import concurrent.futures
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Type
+import groq
+from pydantic import BaseModel
+from tenacity import AsyncRetrying, retry_if_not_exception_type, stop_after_attempt
+from .key_pool import KeyPool, KeyState
+from ... import logger, metrics
+
+
+class LlmDispatcher:
+    RETRYABLE_ERRORS = (
+        groq.RateLimitError,
+        groq.InternalServerError,
+        groq.APIConnectionError,
+        groq.APITimeoutError,
+    )
+    KEY_ERRORS = (groq.AuthenticationError, groq.PermissionDeniedError)
+    # Attempts instructor gets at a response that fails validation, re-asking each time
+    VALIDATION_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        api_keys: List[str],
+        max_in_flight: int = 8,
+        requests_per_minute: float = 30,
+        tokens_per_minute: float = 30000,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        output_tokens: int = 1024,
+        base_url: Optional[str] = None,
+        timeout: float = 120.0,
+    ):
+        self.logger = logger.setupLogger()
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.output_tokens = output_tokens
+        # One pooled client per key, built up front and reused for every request
+        self.key_pool = KeyPool(
+            api_keys,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            base_url=base_url,
+            timeout=timeout,
+            max_connections=max_in_flight,
+        )
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def fromEnv(cls) -> "LlmDispatcher":
+        keys = os.getenv("API_KEYS", "")
+        return cls(
+            keys.split(","),
+            max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "8")),
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30")),
+            tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "30000")),
+            base_url=os.getenv("GROQ_BASE_URL"),
+        )
+
+    def _ensureLoop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_in_flight)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(
+                    target=run, name="llm-dispatcher", daemon=True
+                )
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    def submit(
+        self, model: str, messages: List[Dict[str, str]], response_model: Type[BaseModel]
+    ) -> concurrent.futures.Future:
+        loop = self._ensureLoop()
+        return asyncio.run_coroutine_threadsafe(
+            self.complete(model, messages, response_model), loop
+        )
+
+    def estimateTokens(self, messages: List[Dict[str, str]]) -> int:
+        # ~4 characters per token is close enough for budgeting
+        chars = sum(len(message["content"]) for message in messages)
+        return chars // 4 + self.output_tokens
+
+    async def _acquireKey(self, estimated_tokens: int) -> KeyState:
+        # Takes an in-flight slot together with a key, and gives the slot back while
+        # waiting for a key's budget so waiting requests never hold up sending ones.
+        # The caller releases the slot once the request is done
+        while True:
+            await self._semaphore.acquire()
+            try:
+                state, delay = self.key_pool.choose(estimated_tokens)
+            except BaseException:
+                self._semaphore.release()
+                raise
+            if state is not None:
+                return state
+            self._semaphore.release()
+            await asyncio.sleep(delay)
+
+    async def complete(
+        self, model: str, messages: List[Dict[str, str]], response_model: Type[BaseModel]
+    ) -> BaseModel:
+        estimated = self.estimateTokens(messages)
+        attempt = 0
+        while True:
+            state = await self._acquireKey(estimated)
+            try:
+                started = time.monotonic()
+                try:
+                    output, completion = await state.instructor.chat.completions.create_with_completion(
+                        model=model,
+                        messages=messages,
+                        response_model=response_model,
+                        # instructor would retry API errors too, around the key pool and
+                        # its budgets; those surface here instead, to be retried below
+                        max_retries=AsyncRetrying(
+                            stop=stop_after_attempt(self.VALIDATION_ATTEMPTS),
+                            retry=retry_if_not_exception_type(groq.APIError),
+                        ),
+                    )
+                except Exception as e:
+                    error = self._findApiError(e)
+                    metrics.count("llm_calls", model=model, outcome=type(error).__name__)
+                    retry_after = self._retryAfter(error)
+                    if isinstance(error, groq.RateLimitError):
+                        self.key_pool.recordThrottle(state, retry_after)
+                    elif isinstance(error, self.KEY_ERRORS):
+                        self.logger.error(f"API key {state.label} rejected, taking it out of rotation")
+                        self.key_pool.recordAuthError(state)
+                    else:
+                        self.key_pool.recordError(state)
+
+                    if isinstance(error, self.KEY_ERRORS):
+                        # Fails at once when that was the last key, instead of retrying into nothing
+                        self.key_pool.checkUsable()
+                    retryable = isinstance(error, self.RETRYABLE_ERRORS + self.KEY_ERRORS)
+                    if not retryable or attempt >= self.max_retries:
+                        raise
+                    if isinstance(error, self.KEY_ERRORS):
+                        # Another key can take the request straight away
+                        retry_after = 0.0
+
+                    delay = self._backoff(attempt, retry_after)
+                    self.logger.warning(
+                        f"LLM request failed ({type(error).__name__}), "
+                        f"retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})"
+                    )
+                else:
+                    latency = time.monotonic() - started
+                    usage = getattr(completion, "usage", None)
+                    self.key_pool.recordSuccess(
+                        state,
+                        latency,
+                        estimated,
+                        usage.total_tokens if usage is not None else None,
+                    )
+                    metrics.count("llm_calls", model=model, outcome="success")
+                    metrics.observe("llm_latency_seconds", latency, model=model)
+                    if usage is not None:
+                        metrics.count("llm_prompt_tokens", usage.prompt_tokens, model=model)
+                        metrics.count("llm_completion_tokens", usage.completion_tokens, model=model)
+                    return output
+            finally:
+                self._semaphore.release()
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def metrics(self) -> Dict[str, Dict]:
+        return self.key_pool.metrics()
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            # A server asking for more than max_delay still gets no more than that
+            return min(retry_after, self.max_delay) + random.uniform(0, self.base_delay)
+        # Full jitter keeps concurrent retries from stampeding in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def _findApiError(error: BaseException) -> BaseException:
+        # instructor wraps transport errors in its own retry exceptions
+        seen = set()
+        current = error
+        while current is not None and id(current) not in seen:
+            if isinstance(current, groq.APIError):
+                return current
+            seen.add(id(current))
+            current = current.__cause__ or current.__context__
+        return error
+
+    @staticmethod
+    def _retryAfter(error: BaseException) -> Optional[float]:
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        value = response.headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, parsed.timestamp() - time.time())
+
+    def close(self) -> None:
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self.key_pool.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Type
+from pydantic import BaseModel
+from ... import logger
+
+
+class ReviewCache:
+    DEFAULT_FILENAME = ".review_cache.sqlite"
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.logger = logger.setupLogger()
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reviews (
+                key TEXT PRIMARY KEY,
+                review TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS reviews_last_access ON reviews (last_access)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def makeKey(
+        sys_prompt: str, model: str, response_model: Type[BaseModel], code: str
+    ) -> str:
+        schema = json.dumps(response_model.model_json_schema(), sort_keys=True)
+        digest = hashlib.sha256()
+        for part in (sys_prompt, model, schema, code):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str, response_model: Type[BaseModel]) -> Optional[BaseModel]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT review FROM reviews WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE reviews SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+
+        try:
+            review = response_model.model_validate_json(row[0])
+        except ValueError as e:
+            # Schema drift should already change the key, but never trust a bad row
+            self.logger.warning(f"Discarding unreadable cache entry {key}: {e}")
+            self.delete(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return review
+
+    def put(self, key: str, review: BaseModel) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reviews (key, review, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, review.model_dump_json(), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM reviews WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.max_entries <= 0:
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM reviews").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM reviews WHERE key IN "
+                "(SELECT key FROM reviews ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.logger.info(f"Evicted {overflow} entries from review cache")
+
+    def purge(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM reviews")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self.hits = 0
+            self.misses = 0
+        self.logger.info(f"Purged review cache at: {self.path}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM reviews").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,177 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .code_file_eval_model import CodeReviewModel
+
+CATEGORIES: Tuple[str, ...] = tuple(CodeReviewModel.model_fields)
+
+
+class ScoreAggregator:
+    # Reviews are appended as they complete into one (reviews x categories) array;
+    # every statistic is then a single vectorized pass over it, for one repo or all
+    WEIGHTS = ("size", "lines")
+
+    def __init__(self, categories: Sequence[str] = CATEGORIES, capacity: int = 1024):
+        self.categories = tuple(categories)
+        self._index = {category: column for column, category in enumerate(self.categories)}
+        self._scores = np.full((capacity, len(self.categories)), np.nan, dtype=np.float32)
+        # Per review: repo id, code size in characters, lines of code
+        self._repo_ids = np.zeros(capacity, dtype=np.int32)
+        self._sizes = np.zeros(capacity, dtype=np.float64)
+        self._lines = np.zeros(capacity, dtype=np.float64)
+        self._repos: Dict[str, int] = {}
+        self._files: List[Optional[str]] = []
+        self._chunk_ids: List[Optional[str]] = []
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def repos(self) -> List[str]:
+        return list(self._repos)
+
+    def add(
+        self,
+        repo: str,
+        review,
+        file_path: Optional[str] = None,
+        size: int = 0,
+        lines: int = 0,
+        chunk_id: Optional[str] = None,
+    ) -> None:
+        if hasattr(review, "model_dump"):
+            review = review.model_dump()
+
+        row = np.full(len(self.categories), np.nan, dtype=np.float32)
+        for key, value in review.items():
+            column = self._index.get(key)
+            if column is not None and isinstance(value, dict) and "score" in value:
+                row[column] = value["score"]
+
+        with self._lock:
+            if self._count == len(self._scores):
+                self._grow()
+            index = self._count
+            self._scores[index] = row
+            self._repo_ids[index] = self._repos.setdefault(repo, len(self._repos))
+            self._sizes[index] = size
+            self._lines[index] = lines
+            self._files.append(file_path)
+            self._chunk_ids.append(chunk_id)
+            self._count += 1
+
+    def extend(self, repo: str, reviews) -> None:
+        for review in reviews:
+            self.add(repo, review)
+
+    def snapshot(self) -> Tuple[List[str], np.ndarray, List[Optional[str]], List[Optional[str]], np.ndarray]:
+        # (repos, repo id per review, file paths, chunk ids, reviews x categories scores)
+        with self._lock:
+            count = self._count
+            return (
+                list(self._repos),
+                self._repo_ids[:count].copy(),
+                list(self._files),
+                list(self._chunk_ids),
+                self._scores[:count].copy(),
+            )
+
+    def _grow(self) -> None:
+        capacity = len(self._scores) * 2
+        scores = np.full((capacity, len(self.categories)), np.nan, dtype=np.float32)
+        scores[:self._count] = self._scores[:self._count]
+        self._scores = scores
+        self._repo_ids = np.resize(self._repo_ids, capacity)
+        self._sizes = np.resize(self._sizes, capacity)
+        self._lines = np.resize(self._lines, capacity)
+
+    def _weights(self, weight: Optional[str], count: int) -> np.ndarray:
+        if weight is None:
+            return np.ones(count)
+        if weight == "size":
+            weights = self._sizes[:count]
+        elif weight == "lines":
+            weights = self._lines[:count]
+        else:
+            raise ValueError(f"Unknown weight: {weight}, expected one of {self.WEIGHTS}")
+        # A review without a recorded size still counts, as if it were the smallest
+        return np.where(weights > 0, weights, 1.0)
+
+    def table(self, weight: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+        # (repos, repos x categories means); NaN where a repo has no score for a category
+        with self._lock:
+            count = self._count
+            scores = self._scores[:count].astype(np.float64)
+            repo_ids = self._repo_ids[:count]
+            repos = list(self._repos)
+
+        weights = self._weights(weight, count)[:, None]
+        valid = ~np.isnan(scores)
+        sums = np.zeros((len(repos), len(self.categories)))
+        totals = np.zeros_like(sums)
+        np.add.at(sums, repo_ids, np.where(valid, scores, 0.0) * weights)
+        np.add.at(totals, repo_ids, valid * weights)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return repos, sums / totals
+
+    def summary(
+        self,
+        repo: Optional[str] = None,
+        weight: Optional[str] = None,
+        percentiles: Sequence[float] = (25, 75, 90),
+    ) -> Dict[str, Dict[str, float]]:
+        # Per category: count and (weighted) mean, median and percentiles of one repo or of everything
+        with self._lock:
+            count = self._count
+            scores = self._scores[:count].astype(np.float64)
+            mask = slice(None) if repo is None else self._repo_ids[:count] == self._repos.get(repo, -1)
+
+        scores = scores[mask]
+        weights = self._weights(weight, count)[mask][:, None]
+        valid = ~np.isnan(scores)
+        counts = valid.sum(axis=0)
+
+        stats = {"count": counts.astype(float)}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats["mean"] = (np.where(valid, scores, 0.0) * weights).sum(axis=0) / (valid * weights).sum(axis=0)
+        if len(scores):
+            # Quantiles are weighted as the mean is
+            quantiles = np.array([self._weightedPercentiles(scores[:, column], weights[:, 0], (50, *percentiles))
+                                  for column in range(len(self.categories))]).T
+            stats["median"] = quantiles[0]
+            for percentile, values in zip(percentiles, quantiles[1:]):
+                stats[f"p{percentile:g}"] = values
+
+        return {
+            category: {name: float(values[column]) for name, values in stats.items()}
+            for column, category in enumerate(self.categories)
+            if counts[column]
+        }
+
+    @staticmethod
+    def _weightedPercentiles(values: np.ndarray, weights: np.ndarray, percentiles: Sequence[float]) -> np.ndarray:
+        # Each sorted value sits at the middle of its share of the total weight, with
+        # linear interpolation in between; for equal weights this is np.percentile's
+        # "hazen" method. NaN scores are skipped
+        valid = ~np.isnan(values)
+        values, weights = values[valid], weights[valid]
+        if not len(values):
+            return np.full(len(percentiles), np.nan)
+        order = np.argsort(values)
+        values, weights = values[order], weights[order]
+        positions = (np.cumsum(weights) - weights / 2) / weights.sum()
+        return np.interp(np.asarray(percentiles) / 100, positions, values)
+
+    def means(self, weight: Optional[str] = None, digits: int = 1) -> Dict[str, Dict[str, float]]:
+        # Per repo, the per-category averages finalScores has always reported
+        repos, table = self.table(weight)
+        return {
+            repo: {
+                category: round(float(row[column]), digits)
+                for column, category in enumerate(self.categories)
+                if not np.isnan(row[column])
+            }
+            for repo, row in zip(repos, table)
+        }
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import subprocess
+from typing import Dict, List, Optional
+from .score_aggregator import ScoreAggregator
+from ... import logger
+
+OUTPUT_SUFFIX = "_output.txt"
+
+
+class RepoScorer:
+    # Turns the review outputs already on disk into per-repo scores; it needs no
+    # LLM client, so scoring-only workers never import one
+
+    def __init__(self):
+        self.logger = logger.setupLogger()
+
+    def loadReviews(self, repoPath) -> List[Dict]:
+        directory = os.path.join(repoPath, "output_data")
+        reviews = []
+
+        for filename in os.listdir(directory):
+            if filename.endswith(OUTPUT_SUFFIX):
+                with open(os.path.join(directory, filename), "r") as file:
+                    reviews.append(json.load(file))
+        return reviews
+
+    def loadInto(self, aggregator: ScoreAggregator, repoPath) -> None:
+        # Like loadReviews, but keeps which review unit each output belongs to
+        directory = os.path.join(repoPath, "output_data")
+        for filename in os.listdir(directory):
+            if filename.endswith(OUTPUT_SUFFIX):
+                with open(os.path.join(directory, filename), "r") as file:
+                    review = json.load(file)
+                chunkId = filename[:-len(OUTPUT_SUFFIX)]
+                aggregator.add(repoPath, review, os.path.join(directory, filename), chunk_id=chunkId)
+
+    def finalScores(self, repoPath):
+        return self.scoreReviews(self.loadReviews(repoPath), repoPath)
+
+    def scoreReviews(self, reviews, repoPath):
+        aggregator = ScoreAggregator()
+        aggregator.extend(repoPath, reviews)
+        return self.scoreRepo(aggregator, repoPath)
+
+    def scoreRepo(self, aggregator: ScoreAggregator, repoPath, weight: Optional[str] = None):
+        return self.scoreRepos(aggregator, [repoPath], weight)[0]
+
+    def scoreRepos(self, aggregator: ScoreAggregator, repoPaths, weight: Optional[str] = None) -> List[Dict]:
+        # Each category is averaged over the reviews that scored it; one pass for all repos
+        means = aggregator.means(weight)
+        scores = []
+        for repoPath in repoPaths:
+            score_aggregation = means.get(repoPath, {})
+            score_aggregation["repo_link"] = self.getGithubUrl(repoPath)
+            scores.append(score_aggregation)
+        return scores
+
+    def scoreTable(self, aggregator: ScoreAggregator, weight: Optional[str] = None) -> List[Dict]:
+        # One row per repo, in the order the repos were first seen, from a single pass
+        rows = []
+        for repoPath, score_aggregation in aggregator.means(weight).items():
+            score_aggregation["repo_link"] = self.getGithubUrl(repoPath)
+            rows.append(score_aggregation)
+        return rows
+
+    def getGithubUrl(self, repoPath):
+        try:
+            result = subprocess.run(
+                ["git", "config", "--get", "remote.origin.url"],
+                cwd=repoPath,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            return result.stdout.strip()
+        except subprocess.CalledProcessError:
+            self.logger.warning(f"Unable to get GitHub URL for repo: {repoPath}")
+            return "Unknown Repository"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score already reviewed repositories")
+    parser.add_argument("repoPaths", nargs="+", help="Cloned repositories with an output_data folder")
+    parser.add_argument("--weight", choices=ScoreAggregator.WEIGHTS, help="Weight reviews by chunk size or lines")
+    args = parser.parse_args()
+
+    scorer = RepoScorer()
+    aggregator = ScoreAggregator()
+    for repoPath in args.repoPaths:
+        scorer.loadInto(aggregator, repoPath)
+    print(json.dumps(scorer.scoreTable(aggregator, args.weight), indent=2))
@@ -0,0 +1,8 @@
+from ... import lazy
+
+__getattr__, __dir__, __all__ = lazy.lazyExports(__name__, {
+    "ChunkDeduplicator": ".chunk_deduplicator",
+    "Assignment": ".chunk_deduplicator",
+    "MinHasher": ".minhash",
+    "LshIndex": ".minhash",
+})
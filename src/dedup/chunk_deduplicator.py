@@ -0,0 +1,129 @@
+import hashlib
+import json
+import threading
+from typing import Dict, List, NamedTuple, Optional
+import numpy as np
+from .minhash import LshIndex, MinHasher
+
+
+class Assignment(NamedTuple):
+    representative: str  # key of the review unit whose review this one reuses; itself when new
+    kind: str  # "unique", "exact" or "near"
+    similarity: float
+
+
+class ChunkDeduplicator:
+    # Online clustering of review units across every repo of a run. The first
+    # unit of a cluster is its representative and the only one sent for review:
+    # byte-identical units match on a content hash, near-identical ones (renamed
+    # variables, reformatted or lightly edited copies) on MinHash signatures
+    # found through LSH. Only representatives are indexed, so a cluster never
+    # drifts away from the code that was actually reviewed
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        min_shingles: int = 16,
+    ):
+        if bands <= 0 or num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        # Tiny units (an import line, a constant) look alike everywhere; they are only matched exactly
+        self.min_shingles = min_shingles
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self.index = LshIndex(bands=bands, rows=num_perm // bands)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._digests: Dict[str, str] = {}
+            self._signatures: Dict[str, np.ndarray] = {}
+            self._groups: Dict[str, Optional[str]] = {}
+            self._members: Dict[str, List[str]] = {}
+            self._assigned: Dict[str, Assignment] = {}
+            self.index.clear()
+
+    def assign(self, key: str, code: str, group: Optional[str] = None) -> Assignment:
+        # group is what the report calls a team: the repo the unit comes from
+        digest = hashlib.blake2b(code.encode("utf-8"), digest_size=16).hexdigest()
+        with self._lock:
+            if key in self._assigned:
+                return self._assigned[key]
+            representative = self._digests.get(digest)
+            if representative is not None:
+                return self._join(key, group, Assignment(representative, "exact", 1.0))
+
+        # Signatures are computed outside the lock; they are the expensive part
+        shingles = self.hasher.shingles(code)
+        signature = self.hasher.signature(code, shingles) if len(shingles) >= self.min_shingles else None
+
+        with self._lock:
+            # Another thread may have added the same key or content meanwhile
+            if key in self._assigned:
+                return self._assigned[key]
+            representative = self._digests.get(digest)
+            if representative is not None:
+                return self._join(key, group, Assignment(representative, "exact", 1.0))
+
+            if signature is not None:
+                best, bestSimilarity = None, self.threshold
+                for candidate in self.index.candidates(signature):
+                    similarity = self.hasher.similarity(signature, self._signatures[candidate])
+                    if similarity >= bestSimilarity:
+                        best, bestSimilarity = candidate, similarity
+                if best is not None:
+                    return self._join(key, group, Assignment(best, "near", bestSimilarity))
+                self._signatures[key] = signature
+                self.index.insert(key, signature)
+
+            self._digests[digest] = key
+            self._groups[key] = group
+            self._members[key] = []
+            assignment = self._assigned[key] = Assignment(key, "unique", 1.0)
+            return assignment
+
+    def _join(self, key: str, group: Optional[str], assignment: Assignment) -> Assignment:
+        self._groups[key] = group
+        self._members[assignment.representative].append(key)
+        self._assigned[key] = assignment
+        return assignment
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            kinds = [assignment.kind for assignment in self._assigned.values()]
+        return {kind: kinds.count(kind) for kind in ("unique", "exact", "near")}
+
+    def clusters(self, shared_only: bool = False) -> List[Dict]:
+        # Every cluster with duplicates; shared_only keeps those spanning several groups
+        with self._lock:
+            clusters = []
+            for representative, members in self._members.items():
+                if not members:
+                    continue
+                groups = sorted({self._groups[key] for key in [representative] + members}, key=str)
+                if shared_only and len(groups) < 2:
+                    continue
+                clusters.append({
+                    "representative": representative,
+                    "groups": groups,
+                    "members": [
+                        {
+                            "key": key,
+                            "group": self._groups[key],
+                            "kind": self._assigned[key].kind,
+                            "similarity": round(self._assigned[key].similarity, 3),
+                        }
+                        for key in members
+                    ],
+                })
+        clusters.sort(key=lambda cluster: (-len(cluster["groups"]), -len(cluster["members"])))
+        return clusters
+
+    def writeReport(self, path: str) -> None:
+        report = {"stats": self.stats(), "shared": self.clusters(shared_only=True), "clusters": self.clusters()}
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
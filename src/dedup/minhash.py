@@ -0,0 +1,80 @@
+import re
+import zlib
+from typing import List, Optional
+import numpy as np
+
+# Universal hashing h(x) = (a * x + b) mod p over 32-bit shingle hashes; with
+# a, b < 2^32 every intermediate value fits in uint64
+_PRIME = np.uint64(4294967311)
+_MASK = np.uint64(0xFFFFFFFF)
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+class MinHasher:
+    # MinHash signatures of token shingles: whitespace and layout do not matter,
+    # and the fraction of equal signature slots estimates the Jaccard similarity
+    # of two chunks' shingle sets
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.default_rng(seed)
+        self._a = generator.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)[:, None]
+        self._b = generator.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)[:, None]
+
+    @staticmethod
+    def tokens(text: str) -> List[str]:
+        return _TOKEN.findall(text)
+
+    def shingles(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(token.encode("utf-8")) for token in self.tokens(text)), dtype=np.uint64
+        )
+        count = len(hashes) - self.shingle_size + 1
+        if count <= 0:
+            return np.unique(hashes)
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset in range(self.shingle_size):
+            shingles = (shingles * np.uint64(1000003) + hashes[offset:offset + count]) & _MASK
+        return np.unique(shingles)
+
+    def signature(self, text: str, shingles: Optional[np.ndarray] = None) -> np.ndarray:
+        if shingles is None:
+            shingles = self.shingles(text)
+        if not len(shingles):
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        return ((self._a * shingles[None, :] + self._b) % _PRIME).min(axis=1)
+
+    @staticmethod
+    def similarity(left: np.ndarray, right: np.ndarray) -> float:
+        return float(np.count_nonzero(left == right)) / len(left)
+
+
+class LshIndex:
+    # Signatures cut into bands of rows; two signatures sharing any whole band are
+    # candidates. With b bands of r rows, pairs above about (1/b)^(1/r) similarity
+    # are found with high probability
+
+    def __init__(self, bands: int = 16, rows: int = 8):
+        self.bands = bands
+        self.rows = rows
+        self._buckets = [dict() for _ in range(bands)]
+
+    def _keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def candidates(self, signature: np.ndarray) -> List[str]:
+        found = {}
+        for band, key in self._keys(signature):
+            for item in self._buckets[band].get(key, ()):
+                found[item] = None
+        return list(found)
+
+    def insert(self, item: str, signature: np.ndarray) -> None:
+        for band, key in self._keys(signature):
+            self._buckets[band].setdefault(key, []).append(item)
+
+    def clear(self) -> None:
+        for bucket in self._buckets:
+            bucket.clear()
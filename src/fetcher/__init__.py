@@ -1,5 +1,14 @@
-from .git_handler import GitHandler
-from .repository_manager import RepositoryManager
-from .__main__ import fetch_repository
+from ... import lazy
 
-__all__ = ["GitHandler", "RepositoryManager", "fetch_repository"]
+__getattr__, __dir__, __all__ = lazy.lazyExports(__name__, {
+    "GitHandler": ".git_handler",
+    "RepositoryManager": ".repository_manager",
+    "FileHunks": ".repository_manager",
+    "ParallelCloner": ".parallel_cloner",
+    "CloneResult": ".parallel_cloner",
+    "RepositorySource": ".repository_source",
+    "GitTreeSource": ".repository_source",
+    "WorkingTreeSource": ".repository_source",
+    "SourceBlob": ".repository_source",
+    "fetch_repository": ".__main__",
+})
@@ -1,3 +1,4 @@
+import argparse
 from .git_handler import GitHandler
 from .repository_manager import RepositoryManager
 
@@ -9,10 +10,18 @@ def fetch_repository(url: str, base_path: str) -> str:
 
 
 if __name__ == "__main__":
-    url = "https://github.com/woaitsAryan/regit"
-    base_path = "./cloned_repos"
-    
-    git_handler = GitHandler()
-    repo_manager = RepositoryManager(git_handler)
-    fetch_repository(url, base_path)
-    # repo_manager.complete_cleanup()
\ No newline at end of file
+    # Clone-only entry point: imports nothing beyond pygit2
+    from .parallel_cloner import ParallelCloner
+
+    parser = argparse.ArgumentParser(description="Clone repositories without reviewing them")
+    parser.add_argument("urls", nargs="+", help="Repository URLs to clone")
+    parser.add_argument("--base-path", default="./cloned_repos")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=1, help="History depth, 0 for a full clone")
+    parser.add_argument("--no-checkout", action="store_true", help="Clone bare")
+    args = parser.parse_args()
+
+    repo_manager = RepositoryManager(GitHandler())
+    cloner = ParallelCloner(repo_manager, workers=args.workers, depth=args.depth, bare=args.no_checkout)
+    for result in cloner.clone_all(args.urls, args.base_path):
+        print(f"{result.url}\t{result.path or result.error}")
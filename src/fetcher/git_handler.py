@@ -1,31 +1,92 @@
 import pygit2
 import os
+import re
 import shutil
+from typing import Optional
 from ... import logger
 
+# user@host:path, git's scp-like syntax for ssh remotes
+_SCP_LIKE = re.compile(r"^[\w.-]+@[\w.-]+:")
+# libgit2 error for a depth>0 fetch over file:// or a plain path
+_SHALLOW_UNSUPPORTED = "shallow fetch is not supported by the local transport"
+
 
 class GitHandler:
     def __init__(self):
         self.logger = logger.setupLogger()
 
-    def clone_repository(self, url: str, path: str) -> pygit2.Repository:
+    def clone_repository(
+        self,
+        url: str,
+        path: str,
+        depth: int = 0,
+        bare: bool = False,
+        callbacks: Optional[pygit2.RemoteCallbacks] = None,
+    ) -> pygit2.Repository:
         try:
             if os.path.exists(path):
-                if os.path.exists(os.path.join(path, ".git")):
+                repo = self.open_repository(path)
+                if repo is not None:
                     self.logger.info(f"Repository already exists at path: {path}")
-                else:
-                    self.logger.warning(
-                        f"Directory exists but is not a Git repository: {path}"
-                    )
-                    shutil.rmtree(path)
-            else:
-                self.logger.info(f"Cloning repository to: {path}")
-                pygit2.clone_repository(url, path)
+                    return repo
+                self.logger.warning(
+                    f"Directory exists but is not a Git repository, cloning again: {path}"
+                )
+                shutil.rmtree(path)
+
+            self.logger.info(f"Cloning repository to: {path}")
+            try:
+                return self._clone(url, path, depth, bare, callbacks)
+            except pygit2.GitError as e:
+                # libgit2's local transport (file:// and plain paths) cannot fetch
+                # shallowly; such a clone is retried in full rather than failed
+                if not (depth and self.is_local(url) and _SHALLOW_UNSUPPORTED in str(e)):
+                    raise
+                self.logger.warning(f"Shallow clone unsupported for local {url}, cloning in full")
+                shutil.rmtree(path, ignore_errors=True)
+                return self._clone(url, path, 0, bare, callbacks)
 
         except pygit2.GitError as e:
             self.logger.error(f"Error while cloning repository: {e}")
             raise e
 
+    @staticmethod
+    def _clone(
+        url: str,
+        path: str,
+        depth: int,
+        bare: bool,
+        callbacks: Optional[pygit2.RemoteCallbacks],
+    ) -> pygit2.Repository:
+        # A bare clone goes into path/.git, so the chunk and output folders the
+        # pipeline writes to path stay out of the git directory.
+        # depth=1 fetches only the tip commit, which is all the pipeline reads
+        return pygit2.clone_repository(
+            url,
+            os.path.join(path, ".git") if bare else path,
+            bare=bare,
+            callbacks=callbacks,
+            depth=depth,
+        )
+
+    @staticmethod
+    def open_repository(path: str) -> Optional[pygit2.Repository]:
+        # The clone rooted at path, bare or not; NO_SEARCH keeps an enclosing
+        # repository from answering for it
+        try:
+            repo = pygit2.Repository(path, pygit2.GIT_REPOSITORY_OPEN_NO_SEARCH)
+        except (pygit2.GitError, KeyError):
+            return None
+        if os.path.samefile(repo.path, path):
+            # A bare clone at path itself, from before they moved into path/.git
+            return None
+        return repo
+
+    @staticmethod
+    def is_local(url: str) -> bool:
+        # file:// URLs and plain paths go through the local transport
+        return url.startswith("file://") or ("://" not in url and not _SCP_LIKE.match(url))
+
     def get_latest_commit(self, repo: pygit2.Repository) -> pygit2.Commit:
         try:
             return repo.head.peel(pygit2.Commit)
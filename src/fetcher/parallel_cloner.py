@@ -0,0 +1,180 @@
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Dict, List, NamedTuple, Optional
+import pygit2
+from .repository_manager import RepositoryManager
+from ... import logger, metrics
+
+
+class CloneTimeout(Exception):
+    pass
+
+
+class CloneResult(NamedTuple):
+    url: str
+    path: Optional[str]
+    bytes_fetched: int
+    seconds: float
+    error: Optional[str] = None
+
+
+class TransferCallbacks(pygit2.RemoteCallbacks):
+    def __init__(self, url: str, timeout: Optional[float]):
+        super().__init__()
+        self.url = url
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self.received_bytes = 0
+        self.abandoned = False
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def transfer_progress(self, stats):
+        self.received_bytes = stats.received_bytes
+        # Raising here makes libgit2 abort the transfer
+        if self.abandoned or (self.deadline is not None and time.monotonic() > self.deadline):
+            raise CloneTimeout(f"Clone of {self.url} exceeded its timeout")
+
+    def abandon(self) -> bool:
+        # Called by the watchdog; False if the clone finished in the meantime
+        with self._lock:
+            if self._finished:
+                return False
+            self.abandoned = True
+            return True
+
+    def finish(self) -> bool:
+        # Called by the cloning thread; False if the watchdog already gave up on it
+        with self._lock:
+            self._finished = True
+            return not self.abandoned
+
+
+class ParallelCloner:
+    def __init__(
+        self,
+        repo_manager: RepositoryManager,
+        workers: int = 8,
+        depth: int = 1,
+        timeout: Optional[float] = 300.0,
+        bare: bool = False,
+    ):
+        self.logger = logger.setupLogger()
+        self.repo_manager = repo_manager
+        self.workers = workers
+        self.depth = depth
+        self.timeout = timeout
+        self.bare = bare
+
+    def clone_all(self, urls: List[str], base_path: str) -> List[CloneResult]:
+        os.makedirs(base_path, exist_ok=True)
+        results = []
+        queued = deque(urls)
+        running: Dict[Future, TransferCallbacks] = {}
+
+        # libgit2 releases the GIL during network and pack I/O, so threads scale.
+        # The deadline is enforced here rather than only in transfer_progress: a
+        # stalled connection reports no progress, so it would never trip it
+        while queued or running:
+            while queued and len(running) < self.workers:
+                callbacks = TransferCallbacks(queued[0], self.timeout)
+                running[self._start(queued.popleft(), base_path, callbacks)] = callbacks
+
+            done, _ = wait(running, timeout=self._untilNextDeadline(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                results.append(future.result())
+
+            now = time.monotonic()
+            for future, callbacks in list(running.items()):
+                if callbacks.deadline is not None and now > callbacks.deadline and callbacks.abandon():
+                    # The thread stays blocked in libgit2 until the socket gives up;
+                    # it is a daemon and cleans up after itself when it returns
+                    running.pop(future)
+                    results.append(
+                        self._record(
+                            CloneResult(
+                                url=callbacks.url,
+                                path=None,
+                                bytes_fetched=callbacks.received_bytes,
+                                seconds=now - callbacks.started,
+                                error=f"Clone of {callbacks.url} exceeded its timeout of {self.timeout}s",
+                            )
+                        )
+                    )
+
+        total_bytes = sum(result.bytes_fetched for result in results)
+        failed = sum(1 for result in results if result.error is not None)
+        self.logger.info(
+            f"Cloned {len(results) - failed}/{len(results)} repositories, "
+            f"{total_bytes / 1e6:.1f} MB fetched"
+        )
+        return results
+
+    def _start(self, url: str, base_path: str, callbacks: TransferCallbacks) -> Future:
+        # A daemon thread rather than a pool worker: an abandoned clone must not
+        # keep the interpreter from exiting
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self.clone_one(url, base_path, callbacks))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"clone-{url}", daemon=True).start()
+        return future
+
+    @staticmethod
+    def _untilNextDeadline(running: Dict[Future, TransferCallbacks]) -> Optional[float]:
+        deadlines = [callbacks.deadline for callbacks in running.values() if callbacks.deadline is not None]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def clone_one(
+        self, url: str, base_path: str, callbacks: Optional[TransferCallbacks] = None
+    ) -> CloneResult:
+        callbacks = callbacks or TransferCallbacks(url, self.timeout)
+        target = os.path.join(base_path, url.split("/")[-1].replace(".git", ""))
+        existed = self.repo_manager.git_handler.open_repository(target) is not None
+        try:
+            path = self.repo_manager.clone_repository(
+                url, base_path, depth=self.depth, bare=self.bare, callbacks=callbacks
+            )
+            error = None
+        except Exception as e:
+            path = None
+            error = str(e)
+
+        result = CloneResult(
+            url=url,
+            path=path,
+            bytes_fetched=callbacks.received_bytes,
+            seconds=time.monotonic() - callbacks.started,
+            error=error,
+        )
+        if not callbacks.finish():
+            # Already reported as timed out, so whatever arrived late is discarded
+            self.repo_manager.repos.pop(url, None)
+            path = None
+        if path is None and not existed and os.path.isdir(target):
+            # Never leave a half-written clone behind for the next run to trip over
+            shutil.rmtree(target, ignore_errors=True)
+        return result if callbacks.abandoned else self._record(result)
+
+    def _record(self, result: CloneResult) -> CloneResult:
+        metrics.count("repos_cloned", outcome="success" if result.error is None else "error")
+        metrics.count("bytes_fetched", result.bytes_fetched)
+        metrics.observe("clone_seconds", result.seconds)
+        if result.error is None:
+            self.logger.info(
+                f"Fetched {result.url}: {result.bytes_fetched} bytes in {result.seconds:.2f}s"
+            )
+        else:
+            self.logger.error(f"Failed to clone {result.url} after {result.seconds:.2f}s: {result.error}")
+        return result
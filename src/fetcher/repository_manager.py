@@ -1,18 +1,33 @@
 import os
-from typing import List, Dict
+from typing import List, Dict, NamedTuple, Optional, Tuple
 import logging
 from .git_handler import GitHandler
 import pygit2
 import shutil
 
 
+class FileHunks(NamedTuple):
+    old_path: str
+    old_oid: str
+    new_oid: str
+    # (old_start, old_lines, new_start, new_lines) in git's 1-based convention
+    hunks: List[Tuple[int, int, int, int]]
+
+
 class RepositoryManager:
     def __init__(self, git_handler: GitHandler):
         self.logger = logging.getLogger(__name__)
         self.git_handler = git_handler
         self.repos: Dict[str, str] = {}  # url, path
 
-    def clone_repository(self, url: str, base_path: str) -> str:
+    def clone_repository(
+        self,
+        url: str,
+        base_path: str,
+        depth: int = 0,
+        bare: bool = False,
+        callbacks: Optional[pygit2.RemoteCallbacks] = None,
+    ) -> str:
         repo_name = url.split("/")[-1].replace(".git", "")
         path = os.path.join(base_path, repo_name)
         if url in self.repos:
@@ -20,7 +35,9 @@ class RepositoryManager:
             return self.repos[url]
 
         try:
-            self.git_handler.clone_repository(url, path)
+            self.git_handler.clone_repository(
+                url, path, depth=depth, bare=bare, callbacks=callbacks
+            )
             self.repos[url] = path
             self.logger.info(f"Repository cloned at path: {path}")
             return path
@@ -37,19 +54,73 @@ class RepositoryManager:
 
     def update_repository(self, url: str) -> str:
         if url not in self.repos:
-            raise ValueError(f"Repository not found at path: {self.repos[url]}")
+            raise ValueError(f"Repository not registered: {url}")
 
         local_path = self.repos[url]
         repo = pygit2.Repository(local_path)
 
         try:
             repo.remotes["origin"].fetch()
-            repo.checkout_tree(repo.get("origin/main"))
-            self.logger.info(f"Successfully updated repository: {url}")
+            commit = self._remote_head(repo)
+            repo.checkout_tree(commit, strategy=pygit2.GIT_CHECKOUT_FORCE)
+            repo.set_head(commit.id)
+            self.logger.info(f"Successfully updated repository: {url} to {commit.id}")
+            return str(commit.id)
         except Exception as e:
             self.logger.error(f"Failed to update repository {url}: {e}")
             raise e
 
+    @staticmethod
+    def _remote_head(repo: pygit2.Repository) -> pygit2.Commit:
+        for ref in ("origin/HEAD", "origin/main", "origin/master"):
+            try:
+                return repo.revparse_single(ref).peel(pygit2.Commit)
+            except (KeyError, pygit2.GitError):
+                continue
+        raise pygit2.GitError(f"No remote branch to update from in: {repo.path}")
+
+    def get_head_commit(self, path: str) -> str:
+        repo = pygit2.Repository(path)
+        return str(self.git_handler.get_latest_commit(repo).id)
+
+    def diff_commits(self, path: str, old_commit: str, new_commit: str) -> Tuple[List[str], List[str]]:
+        # Returns (added or modified, deleted) paths relative to the repo root
+        repo = pygit2.Repository(path)
+        old_tree = repo.revparse_single(old_commit).peel(pygit2.Tree)
+        new_tree = repo.revparse_single(new_commit).peel(pygit2.Tree)
+
+        changed, deleted = [], []
+        for delta in repo.diff(old_tree, new_tree).deltas:
+            status = delta.status
+            if status == pygit2.GIT_DELTA_DELETED:
+                deleted.append(delta.old_file.path)
+            elif status in (pygit2.GIT_DELTA_RENAMED, pygit2.GIT_DELTA_TYPECHANGE):
+                if delta.old_file.path != delta.new_file.path:
+                    deleted.append(delta.old_file.path)
+                changed.append(delta.new_file.path)
+            elif status in (pygit2.GIT_DELTA_ADDED, pygit2.GIT_DELTA_MODIFIED, pygit2.GIT_DELTA_COPIED):
+                changed.append(delta.new_file.path)
+        return changed, deleted
+
+    def diff_hunks(self, path: str, old_commit: str, new_commit: str) -> Dict[str, FileHunks]:
+        # Line hunks of every modified or renamed file, keyed by its new relative path
+        repo = pygit2.Repository(path)
+        old_tree = repo.revparse_single(old_commit).peel(pygit2.Tree)
+        new_tree = repo.revparse_single(new_commit).peel(pygit2.Tree)
+
+        files = {}
+        for patch in repo.diff(old_tree, new_tree, context_lines=0):
+            delta = patch.delta
+            if delta.status not in (pygit2.GIT_DELTA_MODIFIED, pygit2.GIT_DELTA_RENAMED) or delta.is_binary:
+                continue
+            files[delta.new_file.path] = FileHunks(
+                old_path=delta.old_file.path,
+                old_oid=str(delta.old_file.id),
+                new_oid=str(delta.new_file.id),
+                hunks=[(h.old_start, h.old_lines, h.new_start, h.new_lines) for h in patch.hunks],
+            )
+        return files
+
     def get_repository_path(self, url: str) -> str:
         if url not in self.repos:
             raise ValueError(f"Repository not found at path: {self.repos[url]}")
@@ -0,0 +1,159 @@
+import hashlib
+import mmap
+import os
+from abc import ABC, abstractmethod
+from typing import Callable, Iterator, NamedTuple, Optional
+import pygit2
+
+
+class SourceBlob(NamedTuple):
+    path: str  # repoPath joined with relative_path, the key every stage maps by
+    relative_path: str
+    data: bytes
+    oid: str
+
+
+class RepositorySource(ABC):
+    # Pipeline output folders written next to the sources in a working tree
+    GENERATED_DIRS = {"asts", "chunk_data", "output_data"}
+    # Third-party code committed along with a project, at any depth; none of it is the team's work
+    VENDORED_DIRS = {
+        "node_modules", "bower_components", "jspm_packages", "vendor", "third_party",
+        "site-packages", "venv", "__pycache__", "dist",
+    }
+    # Minified bundles and generated code
+    GENERATED_SUFFIXES = (".min.js", ".min.css", "-min.js", ".bundle.js", "_pb2.py", "_pb2_grpc.py", ".pb.go", ".g.dart")
+
+    def __init__(self, repoPath: str, skip_hidden: bool = True, skip_vendored: bool = True):
+        self.repoPath = repoPath
+        self.skip_hidden = skip_hidden
+        self.skip_vendored = skip_vendored
+
+    @staticmethod
+    def open(repoPath: str, skip_hidden: bool = True, skip_vendored: bool = True) -> "RepositorySource":
+        try:
+            # NO_SEARCH: a clone root nested inside another repo must not resolve to the parent
+            repo = pygit2.Repository(repoPath, pygit2.GIT_REPOSITORY_OPEN_NO_SEARCH)
+            if not repo.head_is_unborn:
+                return GitTreeSource(repoPath, repo, skip_hidden, skip_vendored)
+        except pygit2.GitError:
+            pass
+        return WorkingTreeSource(repoPath, skip_hidden, skip_vendored)
+
+    def skipDirectory(self, name: str) -> bool:
+        return (self.skip_hidden and name.startswith(".")) or (self.skip_vendored and name in self.VENDORED_DIRS)
+
+    def skipFile(self, name: str) -> bool:
+        return self.skip_vendored and name.lower().endswith(self.GENERATED_SUFFIXES)
+
+    def skipPath(self, path: str) -> bool:
+        # Whether walk would leave this file out, for paths that come from a diff
+        *directories, name = self.toRelative(path).split("/")
+        return any(self.skipDirectory(directory) for directory in directories) or self.skipFile(name)
+
+    def toPath(self, relative_path: str) -> str:
+        return os.path.join(self.repoPath, *relative_path.split("/"))
+
+    def toRelative(self, path: str) -> str:
+        return os.path.relpath(path, self.repoPath).replace(os.path.sep, "/")
+
+    @abstractmethod
+    def walk(self, include: Optional[Callable[[str], bool]] = None) -> Iterator[SourceBlob]:
+        ...
+
+    @abstractmethod
+    def listPaths(self, include: Optional[Callable[[str], bool]] = None) -> Iterator[str]:
+        ...
+
+    @abstractmethod
+    def read(self, path: str) -> bytes:
+        ...
+
+    def buffer(self, path: str):
+        # Bytes-like view of a file for readers that slice it many times
+        return self.read(path)
+
+
+class GitTreeSource(RepositorySource):
+    def __init__(self, repoPath: str, repo: pygit2.Repository, skip_hidden: bool = True, skip_vendored: bool = True):
+        super().__init__(repoPath, skip_hidden, skip_vendored)
+        self.repo = repo
+        self.tree = repo.head.peel(pygit2.Commit).tree
+
+    def _entries(self, include: Optional[Callable[[str], bool]]):
+        stack = [("", self.tree)]
+        while stack:
+            prefix, tree = stack.pop()
+            for entry in tree:
+                relative_path = prefix + entry.name
+                if entry.filemode == pygit2.GIT_FILEMODE_TREE:
+                    if self.skipDirectory(entry.name):
+                        continue
+                    stack.append((relative_path + "/", self.repo[entry.id]))
+                    continue
+                # Symlinks and submodules carry no reviewable source
+                if entry.filemode not in (pygit2.GIT_FILEMODE_BLOB, pygit2.GIT_FILEMODE_BLOB_EXECUTABLE):
+                    continue
+                if self.skipFile(entry.name):
+                    continue
+
+                path = self.toPath(relative_path)
+                # Filter on the path first so skipped blobs are never inflated
+                if include is not None and not include(path):
+                    continue
+                yield path, relative_path, entry.id
+
+    def walk(self, include: Optional[Callable[[str], bool]] = None) -> Iterator[SourceBlob]:
+        for path, relative_path, oid in self._entries(include):
+            yield SourceBlob(
+                path=path,
+                relative_path=relative_path,
+                data=self.repo[oid].data,
+                oid=str(oid),
+            )
+
+    def listPaths(self, include: Optional[Callable[[str], bool]] = None) -> Iterator[str]:
+        for path, _, _ in self._entries(include):
+            yield path
+
+    def read(self, path: str) -> bytes:
+        return self.repo[self.tree[self.toRelative(path)].id].data
+
+
+class WorkingTreeSource(RepositorySource):
+    def walk(self, include: Optional[Callable[[str], bool]] = None) -> Iterator[SourceBlob]:
+        for path in self.listPaths(include):
+            data = self.read(path)
+            yield SourceBlob(
+                path=path,
+                relative_path=self.toRelative(path),
+                data=data,
+                oid=self.blobOid(data),
+            )
+
+    def listPaths(self, include: Optional[Callable[[str], bool]] = None) -> Iterator[str]:
+        for root, dirs, files in os.walk(self.repoPath):
+            dirs[:] = [d for d in dirs if not self.skipDirectory(d)]
+            if root == self.repoPath:
+                dirs[:] = [d for d in dirs if d not in self.GENERATED_DIRS]
+            for file in files:
+                if self.skipFile(file):
+                    continue
+                path = os.path.join(root, file)
+                if os.path.isfile(path) and (include is None or include(path)):
+                    yield path
+
+    def read(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    def buffer(self, path: str):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""  # empty files cannot be mapped
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def blobOid(data: bytes) -> str:
+        # Same id git would give the blob, so cache keys agree across both sources
+        return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
@@ -0,0 +1,5 @@
+from ... import lazy
+
+__getattr__, __dir__, __all__ = lazy.lazyExports(__name__, {
+    "IncrementalReviewer": ".incremental_reviewer",
+})
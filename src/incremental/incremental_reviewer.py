@@ -0,0 +1,122 @@
+import json
+import os
+from typing import Dict, Optional
+from ..ast_generator.incremental_parser import IncrementalParser
+from ..chunker2.chunk_extractor import ChunkExtractor2
+from ..code_analyser.code_analyser import CodeAnalyser
+from ..fetcher.repository_manager import RepositoryManager
+from ... import logger, metrics
+
+
+class IncrementalReviewer:
+    STATE_FILE = "review_state.json"
+    CHUNK_MAPPING_FILE = "file_chunk_mapping.json"
+    OUTPUT_MAPPING_FILE = "file_output_mapping.json"
+
+    def __init__(
+        self,
+        repo_manager: RepositoryManager,
+        chunk_extractor: ChunkExtractor2,
+        code_analyser: CodeAnalyser,
+        incremental_parser: Optional[IncrementalParser] = None,
+    ):
+        self.logger = logger.setupLogger()
+        self.repo_manager = repo_manager
+        self.chunk_extractor = chunk_extractor
+        self.code_analyser = code_analyser
+        # Only worth it in a long-lived process that reviews the same repos again:
+        # its tree cache does not outlive the process, and a miss is a full parse
+        self.incremental_parser = incremental_parser
+
+    def reviewRepository(self, url: str, base_path: str) -> Dict:
+        repoPath = self.repo_manager.clone_repository(url, base_path)
+        reviewedCommit = self.loadState(repoPath).get("commit")
+
+        if reviewedCommit is None:
+            headCommit = self.repo_manager.get_head_commit(repoPath)
+            self.logger.info(f"No reviewed commit recorded, running full review of: {url}")
+            with metrics.stage("full_review", repo=repoPath):
+                self.fullReview(repoPath)
+        else:
+            headCommit = self.repo_manager.update_repository(url)
+            if headCommit == reviewedCommit:
+                self.logger.info(f"No new commits since last review of: {url}")
+            else:
+                with metrics.stage("incremental_review", repo=repoPath):
+                    self.reviewChanges(repoPath, reviewedCommit, headCommit)
+
+        self.saveState(repoPath, {"commit": headCommit})
+        return self.code_analyser.finalScores(repoPath)
+
+    def fullReview(self, repoPath: str) -> None:
+        chunkMapping = {}
+        self.chunk_extractor.processRepo(repoPath, chunkMapping)
+        self.saveMapping(repoPath, self.CHUNK_MAPPING_FILE, chunkMapping)
+
+        outputMapping = {}
+        self.code_analyser.processRepo(repoPath, outputMapping)
+        self.saveMapping(repoPath, self.OUTPUT_MAPPING_FILE, outputMapping)
+
+        if self.incremental_parser is not None:
+            self.incremental_parser.prime(repoPath)
+
+    def reviewChanges(self, repoPath: str, oldCommit: str, newCommit: str) -> None:
+        changed, deleted = self.repo_manager.diff_commits(repoPath, oldCommit, newCommit)
+        self.logger.info(
+            f"Reviewing {len(changed)} changed and dropping {len(deleted)} deleted files "
+            f"in {repoPath} ({oldCommit[:8]}..{newCommit[:8]})"
+        )
+
+        def toPath(path):
+            return os.path.join(repoPath, *path.split("/"))
+
+        trees = None
+        if self.incremental_parser is not None:
+            trees = self.reparse(repoPath, oldCommit, newCommit, deleted)
+
+        # Changed files are chunked again in full, since packing is per file and one edit
+        # can move every later chunk boundary; only review units whose text changed are
+        # returned for review, the others keep their reviews
+        chunkMapping = self.loadMapping(repoPath, self.CHUNK_MAPPING_FILE)
+        rechunked, stale = self.chunk_extractor.updateFiles(
+            repoPath,
+            [toPath(path) for path in changed],
+            [toPath(path) for path in deleted],
+            chunkMapping,
+            trees=trees,
+        )
+        self.saveMapping(repoPath, self.CHUNK_MAPPING_FILE, chunkMapping)
+        self.logger.info(f"{len(rechunked)} review units changed, {len(stale)} removed in {repoPath}")
+
+        outputMapping = self.loadMapping(repoPath, self.OUTPUT_MAPPING_FILE)
+        self.code_analyser.updateFiles(repoPath, rechunked, stale, outputMapping)
+        self.saveMapping(repoPath, self.OUTPUT_MAPPING_FILE, outputMapping)
+
+    def reparse(self, repoPath: str, oldCommit: str, newCommit: str, deleted) -> Dict:
+        # New trees of the modified files, handed to the chunker so it does not parse them again
+        for path in deleted:
+            self.incremental_parser.forget(os.path.join(repoPath, *path.split("/")))
+
+        updates = self.incremental_parser.update(repoPath, oldCommit, newCommit)
+        reparsed = sum(update.incremental for update in updates.values())
+        self.logger.info(f"Incrementally reparsed {reparsed}/{len(updates)} modified files in {repoPath}")
+        return {path: update.tree for path, update in updates.items()}
+
+    def loadState(self, repoPath: str) -> Dict:
+        return self.loadMapping(repoPath, self.STATE_FILE)
+
+    def saveState(self, repoPath: str, state: Dict) -> None:
+        self.saveMapping(repoPath, self.STATE_FILE, state)
+
+    @staticmethod
+    def loadMapping(repoPath: str, fileName: str) -> Dict:
+        path = os.path.join(repoPath, fileName)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r") as f:
+            return json.load(f)
+
+    @staticmethod
+    def saveMapping(repoPath: str, fileName: str, mapping: Dict) -> None:
+        with open(os.path.join(repoPath, fileName), "w") as f:
+            json.dump(mapping, f, indent=2)
@@ -0,0 +1,6 @@
+from ... import lazy
+
+__getattr__, __dir__, __all__ = lazy.lazyExports(__name__, {
+    "PipelineRunner": ".pipeline_runner",
+    "FileRecord": ".pipeline_runner",
+})
@@ -0,0 +1,308 @@
+import json
+import os
+import queue
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from ..ast_generator.ast_generator import AstGenerator
+from ..ast_generator.repo_ast import RepoAst
+from ..chunker2.chunk_extractor import ChunkExtractor2
+from ..code_analyser.code_analyser import CodeAnalyser
+from ..code_analyser.score_aggregator import ScoreAggregator
+from ..fetcher.repository_source import RepositorySource
+from ... import logger, metrics
+
+_STOP = object()
+
+
+class FileRecord(NamedTuple):
+    repo_path: str
+    path: str
+    relative_path: str
+    data: bytes
+    oid: str
+    language: str
+    tree: Any = None
+    chunks: Optional[List[str]] = None
+    reviews: Optional[List[Any]] = None  # one per request the chunks were grouped into
+    weights: Optional[List[Tuple[int, int]]] = None  # (characters, lines) of each of those requests
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        work: Callable[[FileRecord], Optional[FileRecord]],
+        inbox: queue.Queue,
+        outbox: queue.Queue,
+        workers: int,
+        downstream: Optional["Stage"] = None,
+        batch_size: int = 1,
+    ):
+        self.logger = logger.setupLogger()
+        self.name = name
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.workers = workers
+        self.downstream = downstream
+        # Above 1, work takes a list of whatever records are already waiting, up to
+        # batch_size, and returns a list of results
+        self.batch_size = batch_size
+        self._remaining = workers
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{index}", daemon=True)
+            for index in range(workers)
+        ]
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self) -> None:
+        while True:
+            records, stopped = self._take()
+            if records:
+                self._process(records)
+            if stopped:
+                break
+
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last:
+            # One stop per downstream worker; the final stage signals the sink once
+            if self.downstream is not None:
+                self.downstream.stop()
+            else:
+                self.outbox.put(_STOP)
+
+    def _take(self) -> Tuple[List[FileRecord], bool]:
+        # Blocks for one record, then takes the ones already queued behind it without waiting
+        record = self.inbox.get()
+        if record is _STOP:
+            return [], True
+        records = [record]
+        while len(records) < self.batch_size:
+            try:
+                record = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if record is _STOP:
+                return records, True
+            records.append(record)
+        return records, False
+
+    def _process(self, records: List[FileRecord]) -> None:
+        try:
+            with metrics.timer("pipeline_record_seconds", stage=self.name):
+                if self.batch_size == 1:
+                    results = [self.work(records[0])]
+                else:
+                    results = self.work(records)
+        except Exception as e:
+            metrics.count("pipeline_failures", len(records), stage=self.name)
+            for record in records:
+                self.logger.info(f"{self.name} stage failed for {record.path}: {e}")
+            return
+        metrics.count("pipeline_records", len(records), stage=self.name)
+        for result in results:
+            if result is not None:
+                # Blocks while the next stage is saturated, which is the backpressure
+                self.outbox.put(result)
+
+    def stop(self) -> None:
+        for _ in range(self.workers):
+            self.inbox.put(_STOP)
+
+
+class PipelineRunner:
+    def __init__(
+        self,
+        chunk_extractor: ChunkExtractor2,
+        code_analyser: CodeAnalyser,
+        ast_generator: Optional[AstGenerator] = None,
+        queue_size: int = 64,
+        parse_workers: int = 2,
+        chunk_workers: int = 2,
+        review_workers: int = 16,
+        review_batch_records: int = 8,
+        parse: bool = True,
+        persist_asts: bool = False,
+        persist_chunks: bool = False,
+        persist_outputs: bool = False,
+    ):
+        self.logger = logger.setupLogger()
+        self.chunk_extractor = chunk_extractor
+        self.code_analyser = code_analyser
+        self.ast_generator = ast_generator or AstGenerator()
+        self.repo_ast = RepoAst(self.ast_generator)
+        self.queue_size = queue_size
+        self.parse_workers = parse_workers
+        self.chunk_workers = chunk_workers
+        # Review workers only wait on the dispatcher, which owns the real concurrency limit
+        self.review_workers = review_workers
+        # Files a review worker submits together, so their small units can share batch requests
+        self.review_batch_records = review_batch_records
+        self.parse = parse or persist_asts
+        self.persist_asts = persist_asts
+        self.persist_chunks = persist_chunks
+        self.persist_outputs = persist_outputs
+        self._mapping_lock = threading.Lock()
+        self._mappings = defaultdict(lambda: defaultdict(dict))
+
+    def run(self, repoPaths: List[str], aggregator: Optional[ScoreAggregator] = None) -> List[Dict]:
+        self._mappings.clear()
+        self.code_analyser.resetDeduplication()
+        fetched = queue.Queue(self.queue_size)
+        parsed = queue.Queue(self.queue_size)
+        chunked = queue.Queue(self.queue_size)
+        reviewed = queue.Queue(self.queue_size)
+
+        review = Stage(
+            "review", self.reviewRecords, chunked, reviewed, self.review_workers,
+            batch_size=self.review_batch_records,
+        )
+        chunkInbox = parsed if self.parse else fetched
+        chunk = Stage("chunk", self.chunkRecord, chunkInbox, chunked, self.chunk_workers, review)
+        stages = [chunk, review]
+        if self.parse:
+            stages.insert(0, Stage("parse", self.parseRecord, fetched, parsed, self.parse_workers, chunk))
+        for stage in stages:
+            stage.start()
+
+        feeder = threading.Thread(
+            target=self._fetch, args=(repoPaths, fetched, stages[0]), name="fetch", daemon=True
+        )
+        feeder.start()
+
+        if aggregator is None:
+            aggregator = ScoreAggregator()
+        while True:
+            record = reviewed.get()
+            if record is _STOP:
+                break
+            for index, (review, (size, lines)) in enumerate(zip(record.reviews, record.weights)):
+                partFilePath = self._partFilePath(record, index)
+                aggregator.add(
+                    record.repo_path, review, partFilePath, size, lines, self.code_analyser.chunkId(partFilePath)
+                )
+            if self.persist_outputs:
+                self._persistOutput(record)
+        feeder.join()
+
+        for repoPath in repoPaths:
+            mappings = self._mappings[repoPath]
+            if self.persist_chunks:
+                self._saveMapping(repoPath, "file_chunk_mapping.json", mappings["chunks"])
+            if self.persist_outputs:
+                self._saveMapping(repoPath, "file_output_mapping.json", mappings["outputs"])
+            if self.persist_asts:
+                self._saveMapping(os.path.join(repoPath, "asts"), "fileAstMap.json", mappings["asts"])
+        return self.code_analyser.scorer.scoreRepos(aggregator, repoPaths)
+
+    def _fetch(self, repoPaths: List[str], outbox: queue.Queue, first: Stage) -> None:
+        try:
+            for repoPath in repoPaths:
+                source = RepositorySource.open(repoPath)
+                for blob in source.walk(include=self._isKnownLanguage):
+                    outbox.put(
+                        FileRecord(
+                            repo_path=repoPath,
+                            path=blob.path,
+                            relative_path=blob.relative_path,
+                            data=blob.data,
+                            oid=blob.oid,
+                            language=self.chunk_extractor.detectLanguage(blob.path),
+                        )
+                    )
+        except Exception as e:
+            self.logger.error(f"Fetch stage failed: {e}")
+        finally:
+            first.stop()
+
+    def _isKnownLanguage(self, path: str) -> bool:
+        return self.chunk_extractor.detectLanguage(path) != "unknown"
+
+    def parseRecord(self, record: FileRecord) -> FileRecord:
+        # Parsers are pooled per thread, so each parse worker warms its own on first use
+        with metrics.timer("parse_seconds", stage="pipeline"):
+            tree = self.ast_generator.generateAstFromBytes(record.data, record.language, record.path)
+        metrics.count("files_parsed", stage="pipeline")
+        metrics.count("bytes_parsed", len(record.data), stage="pipeline")
+        if tree is not None and self.persist_asts:
+            astsDir = os.path.join(record.repo_path, "asts")
+            os.makedirs(astsDir, exist_ok=True)
+            astFilePath = os.path.join(astsDir, record.relative_path.replace("/", "_") + ".json")
+            with open(astFilePath, "w") as astFile:
+                self.repo_ast.writeNodeJson(tree.root_node, astFile)
+            self._record(record.repo_path, "asts", record.path, astFilePath)
+        return record._replace(tree=tree)
+
+    def chunkRecord(self, record: FileRecord) -> Optional[FileRecord]:
+        chunks = self.chunk_extractor.chunkContent(record.path, record.data, record.tree)
+        if not chunks:
+            return None
+        if self.persist_chunks:
+            chunkFolder = os.path.join(record.repo_path, "chunk_data")
+            os.makedirs(chunkFolder, exist_ok=True)
+            partFilePaths = self.chunk_extractor.writeChunks(record.path, chunkFolder, chunks)
+            self._record(record.repo_path, "chunks", record.path, partFilePaths[0])
+        # The parse tree is not needed past chunking; let it go early
+        return record._replace(tree=None, chunks=chunks)
+
+    def reviewRecords(self, records: List[FileRecord]) -> List[Optional[FileRecord]]:
+        # Every review unit of the records goes in one submission, through the same
+        # batching and deduplication path as CodeAnalyser.submitFiles, so small units
+        # of different files can share a request
+        codes = [
+            [self.chunk_extractor.formatChunks(group) for group in self.chunk_extractor.groupChunks(record.chunks)]
+            for record in records
+        ]
+        units = [
+            (self._partFilePath(record, index), code, record.repo_path)
+            for record, recordCodes in zip(records, codes)
+            for index, code in enumerate(recordCodes)
+        ]
+        futures = iter(self.code_analyser.submitUnits(units))
+
+        results = []
+        for record, recordCodes in zip(records, codes):
+            recordFutures = [next(futures) for _ in recordCodes]
+            try:
+                reviews = [future.result() for future in recordFutures]
+            except Exception as e:
+                # Only this file is lost, not the others it was submitted with
+                metrics.count("pipeline_failures", stage="review")
+                self.logger.info(f"review stage failed for {record.path}: {e}")
+                results.append(None)
+                continue
+            weights = [self.code_analyser.codeWeights(code) for code in recordCodes]
+            results.append(record._replace(reviews=reviews, weights=weights, data=b""))
+        return results
+
+    def _persistOutput(self, record: FileRecord) -> None:
+        outputFolder = os.path.join(record.repo_path, "output_data")
+        os.makedirs(outputFolder, exist_ok=True)
+        with self._mapping_lock:
+            mapping = self._mappings[record.repo_path]["outputs"]
+        for index, review in enumerate(record.reviews):
+            self.code_analyser.writeOutput(review, self._partFilePath(record, index), outputFolder, mapping)
+
+    def _partFilePath(self, record: FileRecord, index: int) -> str:
+        # Where the chunk file of this review unit is, or would be when persisted
+        chunkFilePath = self.chunk_extractor.chunkFilePath(
+            record.path, os.path.join(record.repo_path, "chunk_data")
+        )
+        return self.chunk_extractor.partFilePath(chunkFilePath, index)
+
+    def _record(self, repoPath: str, kind: str, key: str, value: str) -> None:
+        with self._mapping_lock:
+            self._mappings[repoPath][kind][key] = value
+
+    @staticmethod
+    def _saveMapping(directory: str, fileName: str, mapping: Dict) -> None:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, fileName), "w") as f:
+            json.dump(mapping, f, indent=2)
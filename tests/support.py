@@ -0,0 +1,77 @@
+import importlib
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The repository root is itself the package, imported under its folder name as the
+# benchmarks do
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+BENCHMARKS = os.path.join(ROOT, "benchmarks")
+
+
+def load(module: str):
+    if os.path.dirname(ROOT) not in sys.path:
+        sys.path.insert(0, os.path.dirname(ROOT))
+    return importlib.import_module(PACKAGE + module)
+
+
+class GitHttpServer(ThreadingHTTPServer):
+    # Serves the repositories under a folder over git's smart HTTP protocol through
+    # git http-backend. libgit2's local transport cannot fetch shallowly, this can
+    daemon_threads = True
+
+    def __init__(self, project_root: str):
+        super().__init__(("127.0.0.1", 0), _GitHttpHandler)
+        self.project_root = project_root
+        threading.Thread(target=self.serve_forever, name="git-http", daemon=True).start()
+
+    def url(self, name: str) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/{name}"
+
+    def close(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _GitHttpHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        env = dict(
+            os.environ,
+            GIT_PROJECT_ROOT=self.server.project_root,
+            GIT_HTTP_EXPORT_ALL="1",
+            PATH_INFO=path,
+            QUERY_STRING=query,
+            REQUEST_METHOD=self.command,
+            CONTENT_TYPE=self.headers.get("Content-Type", ""),
+            CONTENT_LENGTH=str(len(body)),
+            GIT_PROTOCOL=self.headers.get("Git-Protocol", ""),
+            REMOTE_ADDR=self.client_address[0],
+        )
+        output = subprocess.run(["git", "http-backend"], input=body, env=env, capture_output=True).stdout
+        head, _, data = output.partition(b"\r\n\r\n")
+
+        status, headers = 200, []
+        for line in head.decode("latin-1").split("\r\n"):
+            name, _, value = line.partition(":")
+            if name.lower() == "status":
+                status = int(value.split()[0])
+            elif name:
+                headers.append((name, value.strip()))
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_POST = do_GET
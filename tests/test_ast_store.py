@@ -0,0 +1,63 @@
+import pytest
+
+from support import load
+
+ast_store = load(".src.ast_generator.ast_store")
+ast_generator = load(".src.ast_generator.ast_generator")
+
+SOURCES = {
+    "a.py": b"import os\n\nclass A:\n    def f(self):\n        return os.sep\n",
+    "b.js": b"function g(x) {\n  return x + 1;\n}\n",
+}
+
+
+def tree_dict(node):
+    return {
+        "type": node.type,
+        "start_point": tuple(node.start_point),
+        "end_point": tuple(node.end_point),
+        "children": [tree_dict(child) for child in node.children],
+    }
+
+
+@pytest.fixture
+def trees():
+    generator = ast_generator.AstGenerator()
+    return {
+        path: generator.generateAstFromBytes(data, generator.detectLanguage(path), path)
+        for path, data in SOURCES.items()
+    }
+
+
+def test_store_round_trips_every_file(trees, tmp_path):
+    writer = ast_store.AstStoreWriter(str(tmp_path / "repo.astbin"))
+    roots = {"a.py": writer.add("a.py", trees["a.py"])}
+    # Files flattened elsewhere, as worker processes do, merge the same way
+    roots["b.js"] = writer.add_flat("b.js", *ast_store.flatten_tree(trees["b.js"]))
+    path = writer.close()
+
+    store = ast_store.AstStore(path)
+    try:
+        assert store.files == roots
+        for file_path, tree in trees.items():
+            root = store.root(file_path)
+            assert root.to_dict() == tree_dict(tree.root_node)
+            assert root.parent is None
+            assert all(child.parent.index == root.index for child in root.children)
+
+        reference = ast_store.AstStore.reference(path, roots["b.js"])
+        assert ast_store.AstStore.is_reference(reference)
+        assert ast_store.AstStore.parse_reference(reference) == (path, roots["b.js"])
+        with pytest.raises(IndexError):
+            store.node(store.node_count)
+    finally:
+        store.close()
+
+
+def test_store_rejects_other_files(tmp_path):
+    path = tmp_path / "notes.astbin"
+    path.write_bytes(b"not an AST store at all, just some bytes")
+
+    with pytest.raises(ValueError):
+        ast_store.AstStore(str(path))
+    assert not ast_store.AstStore.is_reference(str(tmp_path / "a.json") + "#3")
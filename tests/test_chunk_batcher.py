@@ -0,0 +1,139 @@
+import concurrent.futures
+import queue
+import threading
+
+from support import load
+
+chunk_batcher = load(".src.code_analyser.chunk_batcher")
+code_analyser = load(".src.code_analyser.code_analyser")
+review_cache = load(".src.code_analyser.review_cache")
+models = load(".src.code_analyser.code_file_eval_model")
+chunk_extractor = load(".src.chunker2.chunk_extractor")
+pipeline_runner = load(".src.pipeline.pipeline_runner")
+
+
+class RecordingDispatcher:
+    # Records every request; completes it from another thread, like the event loop does
+    def __init__(self, respond=False):
+        self.requests = []
+        self.respond = respond
+        self.threads = []
+
+    def submit(self, model, messages, response_model):
+        self.requests.append((messages, response_model))
+        future = concurrent.futures.Future()
+        if self.respond:
+            thread = threading.Thread(target=lambda: future.set_result(self.answer(messages, response_model)), name="loop")
+            self.threads.append(thread)
+            thread.start()
+        return future
+
+    @staticmethod
+    def answer(messages, response_model):
+        review = review_model()
+        if response_model is models.CodeReviewModel:
+            return review
+        count = messages[-1]["content"].count("### CHUNK ")
+        return models.BatchReviewModel(reviews=[models.ChunkReview(chunk_id=str(index + 1), review=review) for index in range(count)])
+
+
+def review_model():
+    fields = models.CodeReviewModel.model_fields
+    return models.CodeReviewModel(**{name: models.CodeReviewCategory(score=5) for name in fields})
+
+
+def chunk_files(tmp_path, count, size):
+    paths = []
+    for index in range(count):
+        path = tmp_path / f"chunk{index}.txt"
+        path.write_text(f"# chunk {index}\n" + "x = 1\n" * (size // 6))
+        paths.append(str(path))
+    return paths
+
+
+def test_pack_respects_token_budget():
+    batcher = chunk_batcher.ChunkBatcher(token_budget=4000)
+    items = [(index, "y" * 3900) for index in range(16)]
+    batches = batcher.pack(items)
+
+    assert sorted(index for batch in batches for index, _ in batch) == list(range(16))
+    for batch in batches:
+        tokens = sum(batcher.estimateTokens(code) + batcher.CHUNK_OVERHEAD for _, code in batch)
+        assert tokens <= batcher.token_budget
+
+
+def test_submitted_batches_stay_within_token_budget(tmp_path):
+    dispatcher = RecordingDispatcher()
+    analyser = code_analyser.CodeAnalyser(dispatcher=dispatcher, batch_token_budget=4000)
+    output = tmp_path / "output_data"
+    output.mkdir()
+    analyser.submitFiles(chunk_files(tmp_path, 16, 3900), str(output), {})
+
+    assert len(dispatcher.requests) > 2
+    for messages, _ in dispatcher.requests:
+        chunks = messages[-1]["content"]
+        assert analyser.batcher.estimateTokens(chunks) <= analyser.batcher.token_budget
+
+
+def test_batch_reviews_are_cached_under_the_batch_key_off_the_loop(tmp_path):
+    cache = review_cache.ReviewCache(str(tmp_path / "cache.sqlite"))
+    writers = []
+    put = cache.put
+
+    def recording_put(key, review):
+        writers.append((key, threading.current_thread().name))
+        put(key, review)
+
+    cache.put = recording_put
+    dispatcher = RecordingDispatcher(respond=True)
+    analyser = code_analyser.CodeAnalyser(dispatcher=dispatcher, cache=cache)
+    output = tmp_path / "output_data"
+    output.mkdir()
+    paths = chunk_files(tmp_path, 3, 600)
+    pending = analyser.submitFiles(paths, str(output), {})
+    for future, *_ in pending:
+        future.result(timeout=10)
+
+    codes = [analyser.get_code(path) for path in paths]
+    assert len(dispatcher.requests) == 1
+    assert sorted(key for key, _ in writers) == sorted(analyser.batchCacheKey(code) for code in codes)
+    assert all(name.startswith("review-cache") for _, name in writers)
+    for code in codes:
+        single_key = review_cache.ReviewCache.makeKey(code_analyser.SYS_PROMPT, analyser.model, models.CodeReviewModel, code)
+        assert cache.get(single_key, models.CodeReviewModel) is None
+        assert analyser.lookupCache(code, batched=True)[0] is not None
+    cache.close()
+
+
+def test_pipeline_review_stage_batches_small_units_across_files(tmp_path):
+    dispatcher = RecordingDispatcher(respond=True)
+    analyser = code_analyser.CodeAnalyser(dispatcher=dispatcher)
+    runner = pipeline_runner.PipelineRunner(chunk_extractor.ChunkExtractor2(token_budget=2000), analyser, parse=False)
+    records = [
+        pipeline_runner.FileRecord(
+            repo_path=str(tmp_path),
+            path=str(tmp_path / f"module{index}.py"),
+            relative_path=f"module{index}.py",
+            data=b"",
+            oid=str(index),
+            language="python",
+            chunks=[f"def f{index}():\n    return {index}\n"],
+        )
+        for index in range(4)
+    ]
+    results = runner.reviewRecords(records)
+
+    assert len(dispatcher.requests) == 1
+    assert dispatcher.requests[0][1] is models.BatchReviewModel
+    assert [len(result.reviews) for result in results] == [1, 1, 1, 1]
+
+
+def test_stage_takes_the_records_already_queued():
+    inbox = queue.Queue()
+    for record in range(5):
+        inbox.put(record)
+    inbox.put(pipeline_runner._STOP)
+    stage = pipeline_runner.Stage("review", None, inbox, None, workers=1, batch_size=3)
+
+    assert stage._take() == ([0, 1, 2], False)
+    assert stage._take() == ([3, 4], True)
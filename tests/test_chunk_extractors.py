@@ -0,0 +1,60 @@
+import pytest
+
+from support import load
+
+chunk_extractor = load(".src.chunker.chunk_extractor")
+tree_chunk_extractor = load(".src.chunker.tree_chunk_extractor")
+
+SOURCES = {
+    "app.py": (
+        "import os\n"
+        "from pkg import util\n"
+        "\n"
+        "LIMIT = 3\n"
+        "\n"
+        "class Runner:\n"
+        "    def run(self):\n"
+        "        return util.helper(LIMIT)\n"
+        "\n"
+        "    def stop(self):\n"
+        "        pass\n"
+        "\n"
+        "def main():\n"
+        "    Runner().run()\n"
+        "\n"
+        "if __name__ == '__main__':\n"
+        "    main()\n"
+    ),
+    "pkg/util.py": "def helper(value):\n    return value * 2\r\n\r\ndef unused():\n    return None\n",
+    "pkg/empty.py": "",
+    "notes.md": "# not code\n",
+}
+
+
+@pytest.fixture
+def repo(tmp_path):
+    for name, text in SOURCES.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(text.encode())
+    return str(tmp_path)
+
+
+def chunk_dicts(extractor):
+    return {path: graph.to_dict() for path, graph in extractor.extract_chunks(export_to_json=False).items()}
+
+
+@pytest.mark.parametrize("ast_format", ["json", "binary"])
+def test_tree_cursor_backend_matches_ast_file_backend(repo, ast_format):
+    expected = chunk_dicts(chunk_extractor.ChunkExtractor(repo, ast_format=ast_format))
+    actual = chunk_dicts(tree_chunk_extractor.TreeChunkExtractor(repo))
+
+    assert expected
+    assert actual == expected
+
+
+def test_tree_cursor_backend_shares_the_base_setup(repo):
+    extractor = tree_chunk_extractor.TreeChunkExtractor(repo)
+
+    assert isinstance(extractor.store, chunk_extractor.ChunkStore)
+    assert extractor.ast_lookup.keys() == chunk_extractor.ChunkExtractor(repo).ast_lookup.keys()
@@ -0,0 +1,116 @@
+import random
+from collections import Counter
+
+from support import load
+
+models = load(".src.chunker.models")
+ChunkNode, ChunkType = models.ChunkNode, models.ChunkType
+
+
+class DictChunkGraph:
+    # The dict-of-tuples ChunkGraph that ChunkStore replaced, as the reference
+    def __init__(self):
+        self.nodes, self.edges, self.root_id = {}, {}, None
+
+    def add_node(self, node):
+        self.nodes[node.id] = node
+        if node.type == ChunkType.FILE and self.root_id is None:
+            self.root_id = node.id
+
+    def add_edge(self, parent_id, child_id):
+        self.edges.setdefault(parent_id, []).append(child_id)
+
+    def to_dict(self):
+        return {
+            node_id: {
+                'id': node.id, 'type': node.type.value, 'file_path': node.file_path,
+                'start_line': node.start_line, 'end_line': node.end_line, 'content': node.content,
+                'children': self.edges.get(node_id, []), 'imports': node.imports,
+            }
+            for node_id, node in self.nodes.items()
+        }
+
+    def generate_summary(self):
+        node_types = Counter(node.type for node in self.nodes.values())
+        return {
+            'total_nodes': len(self.nodes),
+            'node_types': {chunk_type.value: node_types[chunk_type] for chunk_type in ChunkType},
+            'avg_children': sum(len(children) for children in self.edges.values()) / len(self.nodes),
+            'max_depth': self._get_max_depth(),
+        }
+
+    def _get_max_depth(self):
+        deepest, max_depth, stack = {}, 0, [(self.root_id, 1)]
+        while stack:
+            node_id, depth = stack.pop()
+            if deepest.get(node_id, 0) >= depth:
+                continue
+            deepest[node_id] = depth
+            max_depth = max(max_depth, depth)
+            stack.extend((child, depth + 1) for child in self.edges.get(node_id, []))
+        return max_depth
+
+
+def node(file_path, index, chunk_type, rng):
+    start = index * 10
+    spelled = rng.choice([f"{file_path}:{start}:{start + 5}", f"{file_path}:immediate:{start}_{start + 5}", f"{file_path}#{index}"])
+    imports = [f"import m{index}"] if chunk_type == ChunkType.FILE else []
+    return ChunkNode(spelled, chunk_type, file_path, start, start + 5, f"content {file_path} {index}", [], imports)
+
+
+def test_shared_store_matches_the_dict_graphs():
+    rng = random.Random(7)
+    store = models.ChunkStore()
+    files = [f"repo/file{index}.py" for index in range(4)]
+    graphs = {file_path: (models.ChunkGraph(store), DictChunkGraph()) for file_path in files}
+    ids = {file_path: [] for file_path in files}
+
+    for file_path, (graph, reference) in graphs.items():
+        root = node(file_path, 0, ChunkType.FILE, rng)
+        for target in (graph, reference):
+            target.add_node(root)
+        ids[file_path].append(root.id)
+
+    # Graphs grow interleaved, with reads in between that compact the pending edges
+    for step in range(400):
+        file_path = rng.choice(files)
+        graph, reference = graphs[file_path]
+        action = rng.random()
+        if action < 0.35:
+            new = node(file_path, len(ids[file_path]), rng.choice(list(ChunkType)[1:]), rng)
+            for target in (graph, reference):
+                target.add_node(new)
+            if new.id not in ids[file_path]:
+                ids[file_path].append(new.id)
+        elif action < 0.9:
+            # Parents come before their children, as in a parsed tree, so the graph stays acyclic
+            child = rng.randrange(1, len(ids[file_path])) if len(ids[file_path]) > 1 else 0
+            parent, child = ids[file_path][rng.randrange(child or 1)], ids[file_path][child]
+            if parent == child:
+                continue
+            for target in (graph, reference):
+                target.add_edge(parent, child)
+        else:
+            probe = rng.choice(ids[file_path])
+            assert list(graph.edges.get(probe, [])) == reference.edges.get(probe, [])
+
+    for file_path, (graph, reference) in graphs.items():
+        assert graph.to_dict() == reference.to_dict()
+        assert graph.root_id == reference.root_id
+        assert graph.generate_summary() == reference.generate_summary()
+    assert len(store) == sum(len(reference.nodes) for _, reference in graphs.values())
+
+
+def test_overwritten_node_keeps_its_index_and_edges():
+    graph = models.ChunkGraph()
+    root = ChunkNode("a.py:0:9", ChunkType.FILE, "a.py", 0, 9, "old", [], ["import os"])
+    child = ChunkNode("a.py:2:3", ChunkType.FUNCTION, "a.py", 2, 3, "def f(): pass")
+    graph.add_node(root)
+    graph.add_node(child)
+    graph.add_edge(root.id, child.id)
+    graph.add_node(root._replace(content="new", imports=[]))
+
+    assert len(graph.store) == 2
+    assert graph.to_dict()[root.id]["content"] == "new"
+    assert graph.to_dict()[root.id]["imports"] == []
+    assert [chunk.id for chunk in graph.child_chunks(root.id)] == [child.id]
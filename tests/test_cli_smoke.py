@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+
+import pytest
+
+from support import BENCHMARKS, GitHttpServer, load
+
+sys.path.insert(0, BENCHMARKS)
+from fake_groq import FakeGroqServer  # noqa: E402
+from synthetic_repos import generateCorpus  # noqa: E402
+
+cli = load(".src.__main__")
+
+
+@pytest.fixture
+def fake_groq(monkeypatch):
+    server = FakeGroqServer(latency=0.0, jitter=0.0)
+    server.startInBackground()
+    monkeypatch.setenv("API_KEYS", "smoke-test-key")
+    monkeypatch.setenv("GROQ_BASE_URL", server.base_url)
+    monkeypatch.setenv("LLM_REQUESTS_PER_MINUTE", "1000000")
+    monkeypatch.setenv("LLM_TOKENS_PER_MINUTE", "1000000000")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    repos = generateCorpus(str(tmp_path / "corpus"), repos=2, files=4, lines=40, mix={"py": 1.0})
+    # codeReviewer works in ./cloned_repos
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    # Served over HTTP, so the default shallow clone runs as it would against a forge
+    server = GitHttpServer(str(tmp_path / "corpus"))
+    yield [server.url(os.path.basename(path)) for path in repos]
+    server.close()
+
+
+@pytest.mark.parametrize("options", [{}, {"incremental": True}, {"streaming": True, "no_checkout": True}])
+def test_code_reviewer_end_to_end(fake_groq, corpus, options):
+    scores = cli.codeReviewer(repr(corpus), use_cache=False, **options)
+
+    assert len(scores) == len(corpus)
+    assert fake_groq.requests > 0
+    for url in corpus:
+        repoPath = os.path.join("cloned_repos", os.path.basename(url))
+        assert os.listdir(os.path.join(repoPath, "output_data"))
+
+    with open(os.path.join("cloned_repos", "run_report.json")) as f:
+        report = json.load(f)
+    assert report["counters"]
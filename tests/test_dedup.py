@@ -0,0 +1,67 @@
+from support import load
+
+minhash = load(".src.dedup.minhash")
+chunk_deduplicator = load(".src.dedup.chunk_deduplicator")
+
+
+def function(name, lines, edit=None):
+    body = [f"    total_{index} = values[{index}] * {index} + offset" for index in range(lines)]
+    if edit is not None:
+        body[edit] = "    total_edit = compute(values, offset) - 1"
+    return f"def {name}(values, offset):\n" + "\n".join(body) + "\n    return total_0\n"
+
+
+def jaccard(hasher, left, right):
+    left, right = set(hasher.shingles(left).tolist()), set(hasher.shingles(right).tolist())
+    return len(left & right) / len(left | right)
+
+
+def test_signature_similarity_estimates_jaccard():
+    hasher = minhash.MinHasher(num_perm=256)
+    base = function("f", 40)
+    for other in (function("f", 40, edit=5), function("f", 30), function("g", 40, edit=20)):
+        estimate = hasher.similarity(hasher.signature(base), hasher.signature(other))
+        assert abs(estimate - jaccard(hasher, base, other)) < 0.1
+
+
+def test_near_duplicates_join_above_the_threshold():
+    deduplicator = chunk_deduplicator.ChunkDeduplicator(threshold=0.85)
+    original = function("f", 60)
+
+    assert deduplicator.assign("a", original, "team1").kind == "unique"
+    # Same tokens, different layout
+    reformatted = deduplicator.assign("b", original.replace(" = ", "  =  "), "team2")
+    assert (reformatted.representative, reformatted.kind, reformatted.similarity) == ("a", "near", 1.0)
+    edited = deduplicator.assign("c", function("f", 60, edit=30), "team2")
+    assert edited.representative == "a" and edited.kind == "near" and edited.similarity >= 0.85
+    assert deduplicator.assign("d", original, "team3") == ("a", "exact", 1.0)
+    assert deduplicator.assign("e", "class Other:\n" + function("h", 60).replace("values", "items"), "team1").kind == "unique"
+
+    assert deduplicator.stats() == {"unique": 2, "exact": 1, "near": 2}
+    [cluster] = deduplicator.clusters(shared_only=True)
+    assert cluster["representative"] == "a"
+    assert cluster["groups"] == ["team1", "team2", "team3"]
+
+
+def test_threshold_decides_how_different_a_copy_may_be():
+    hasher = minhash.MinHasher()
+    original, shorter = function("f", 60), function("f", 36)
+    similarity = hasher.similarity(hasher.signature(original), hasher.signature(shorter))
+    assert 0.4 < similarity < 0.8
+
+    strict = chunk_deduplicator.ChunkDeduplicator(threshold=0.85)
+    strict.assign("a", original)
+    assert strict.assign("b", shorter).kind == "unique"
+
+    # Shorter bands, so LSH also proposes candidates this far apart
+    loose = chunk_deduplicator.ChunkDeduplicator(threshold=similarity - 0.05, bands=32)
+    loose.assign("a", original)
+    assert loose.assign("b", shorter).representative == "a"
+
+
+def test_tiny_units_only_match_exactly():
+    deduplicator = chunk_deduplicator.ChunkDeduplicator()
+
+    assert deduplicator.assign("a", "import os\n").kind == "unique"
+    assert deduplicator.assign("b", "import  os\n").kind == "unique"
+    assert deduplicator.assign("c", "import os\n").kind == "exact"
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from support import load
+
+dependency_index = load(".src.chunker.dependency_index")
+tree_chunk_extractor = load(".src.chunker.tree_chunk_extractor")
+Ref = dependency_index.Ref
+
+SOURCES = {
+    "base.py": "def helper():\n    return 1\n",
+    # a and b import each other
+    "pkg/__init__.py": "",
+    "pkg/a.py": "from pkg.b import g\n\ndef f():\n    return g()\n",
+    "pkg/b.py": "from pkg import a\nfrom base import helper\n\ndef g():\n    return helper()\n\ndef h():\n    return a.f()\n",
+    "app.py": "from pkg.a import f\n\nf()\n",
+    # A three-file cycle of its own that nothing else touches
+    "ring/x.py": "from ring.y import y\n\ndef x():\n    return y()\n",
+    "ring/y.py": "from ring.z import z\n\ndef y():\n    return z()\n",
+    "ring/z.py": "from ring.x import x\n\ndef z():\n    return x()\n",
+}
+
+
+@pytest.fixture
+def repo(tmp_path):
+    for name, text in SOURCES.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    return str(tmp_path)
+
+
+def relative(repo, paths):
+    return [os.path.relpath(path, repo).replace(os.sep, "/") for path in paths]
+
+
+def assert_dependencies_first(index):
+    position = {}
+    for group_index, group in enumerate(index.components()):
+        for file_path in group:
+            position[file_path] = group_index
+    for file_path in position:
+        for ref in index.dependencies(file_path):
+            assert position[ref.file_path] <= position[file_path]
+
+
+def test_import_cycles_become_components_in_dependency_order(repo):
+    index = tree_chunk_extractor.TreeChunkExtractor(repo).build_dependency_index()
+    groups = [relative(repo, group) for group in index.components()]
+
+    assert ["pkg/a.py", "pkg/b.py"] in groups
+    assert ["ring/x.py", "ring/y.py", "ring/z.py"] in groups
+    assert groups.index(["base.py"]) < groups.index(["pkg/a.py", "pkg/b.py"]) < groups.index(["app.py"])
+    assert sorted(map(sorted, (relative(repo, cycle) for cycle in index.cycles()))) == [
+        ["pkg/a.py", "pkg/b.py"], ["ring/x.py", "ring/y.py", "ring/z.py"],
+    ]
+    assert relative(repo, index.topological_order()) == [path for group in groups for path in group]
+    assert_dependencies_first(index)
+
+
+def test_chunk_level_edges_follow_the_names_used(repo):
+    index = tree_chunk_extractor.TreeChunkExtractor(repo).build_dependency_index()
+    path = lambda name: os.path.join(repo, name)
+
+    assert index.dependencies(path("pkg/b.py"), "g") == [Ref(path("base.py"), "helper")]
+    assert index.dependencies(path("pkg/b.py"), "h") == [Ref(path("pkg/a.py"), "f")]
+    assert Ref(path("app.py")) in index.dependents(path("pkg/a.py"), "f")
+    # Walks from a file stay at file level
+    assert Ref(path("base.py")) in index.dependencies(path("app.py"), transitive=True)
+
+
+def test_update_breaks_and_removal_drops_a_cycle(repo):
+    extractor = tree_chunk_extractor.TreeChunkExtractor(repo)
+    index = extractor.build_dependency_index()
+    path = lambda name: os.path.join(repo, name)
+
+    with open(path("pkg/b.py"), "w") as f:
+        f.write("from base import helper\n\ndef g():\n    return helper()\n")
+    index.update_file(path("pkg/b.py"), extractor.extract_file_chunks(path("pkg/b.py")))
+    order = relative(repo, index.topological_order())
+
+    assert order.index("base.py") < order.index("pkg/b.py") < order.index("pkg/a.py") < order.index("app.py")
+    assert [relative(repo, cycle) for cycle in index.cycles()] == [["ring/x.py", "ring/y.py", "ring/z.py"]]
+    assert_dependencies_first(index)
+
+    index.remove_file(path("ring/y.py"))
+    assert index.cycles() == []
+    assert path("ring/y.py") not in index.topological_order()
+    assert index.dependencies(path("ring/x.py")) == []
+    assert_dependencies_first(index)
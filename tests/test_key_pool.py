@@ -0,0 +1,84 @@
+import sys
+
+import pytest
+
+from support import BENCHMARKS, load
+
+sys.path.insert(0, BENCHMARKS)
+from fake_groq import FakeGroqHandler, FakeGroqServer  # noqa: E402
+
+key_pool = load(".src.code_analyser.key_pool")
+llm_dispatcher = load(".src.code_analyser.llm_dispatcher")
+models = load(".src.code_analyser.code_file_eval_model")
+
+MESSAGES = [{"role": "user", "content": "def f():\n    return 1\n"}]
+
+
+class RejectingHandler(FakeGroqHandler):
+    # Answers 401 to every key starting with "bad"
+    def do_POST(self):
+        if self.headers.get("Authorization", "").startswith("Bearer bad"):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with self.server.lock:
+                self.server.rejected += 1
+            return self._send(401, {"error": {"message": "Invalid API Key", "code": "invalid_api_key"}})
+        super().do_POST()
+
+
+@pytest.fixture
+def server():
+    server = FakeGroqServer(latency=0.0, jitter=0.0)
+    server.RequestHandlerClass = RejectingHandler
+    server.rejected = 0
+    server.startInBackground()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_keys_with_the_same_suffix_get_their_own_metrics():
+    pool = key_pool.KeyPool(["first-abcd", "second-abcd", "first-abcd"])
+
+    assert len(pool.states) == 2
+    assert len(pool.metrics()) == 2
+
+
+def test_disabled_keys_are_skipped_until_none_is_left():
+    pool = key_pool.KeyPool(["one", "two"])
+    one, two = pool.states.values()
+    pool.recordAuthError(one)
+
+    for _ in range(3):
+        assert pool.choose(10)[0] is two
+    pool.recordAuthError(two)
+    with pytest.raises(key_pool.NoUsableKeyError):
+        pool.choose(10)
+
+
+def test_rejected_key_is_taken_out_of_rotation(server):
+    dispatcher = llm_dispatcher.LlmDispatcher(
+        ["bad-key", "good-key"], requests_per_minute=1e6, tokens_per_minute=1e9, base_url=server.base_url
+    )
+    try:
+        for _ in range(4):
+            dispatcher.submit("model", MESSAGES, models.CodeReviewModel).result(timeout=10)
+    finally:
+        dispatcher.close()
+
+    assert server.rejected <= 1
+    bad, good = dispatcher.key_pool.states.values()
+    assert bad.disabled and not good.disabled
+    assert good.request_count == 4
+
+
+def test_all_keys_rejected_fails_without_retrying(server):
+    dispatcher = llm_dispatcher.LlmDispatcher(
+        ["bad-one", "bad-two"], requests_per_minute=1e6, tokens_per_minute=1e9, base_url=server.base_url
+    )
+    try:
+        with pytest.raises(key_pool.NoUsableKeyError):
+            dispatcher.submit("model", MESSAGES, models.CodeReviewModel).result(timeout=10)
+    finally:
+        dispatcher.close()
+
+    assert server.rejected == 2
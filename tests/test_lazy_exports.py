@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from support import PACKAGE, ROOT, load
+
+code_analyser_package = load(".src.code_analyser")
+
+
+def test_exports_resolve_on_access():
+    assert "ScoreAggregator" in dir(code_analyser_package)
+    assert "ScoreAggregator" in code_analyser_package.__all__
+    aggregator = code_analyser_package.ScoreAggregator
+    assert aggregator is load(".src.code_analyser.score_aggregator").ScoreAggregator
+    with pytest.raises(AttributeError):
+        code_analyser_package.Missing
+
+
+def test_importing_a_package_imports_none_of_its_exports():
+    script = (
+        f"import sys, {PACKAGE}.src.code_analyser as package\n"
+        f"assert '{PACKAGE}.src.code_analyser.code_analyser' not in sys.modules\n"
+        "package.ChunkBatcher\n"
+        f"assert '{PACKAGE}.src.code_analyser.chunk_batcher' in sys.modules\n"
+        f"assert '{PACKAGE}.src.code_analyser.code_analyser' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(ROOT), check=True)
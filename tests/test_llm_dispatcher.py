@@ -0,0 +1,110 @@
+import email.utils
+import sys
+import time
+from types import SimpleNamespace
+
+import groq
+import pytest
+
+from support import BENCHMARKS, load
+
+sys.path.insert(0, BENCHMARKS)
+from fake_groq import FakeGroqHandler, FakeGroqServer  # noqa: E402
+
+llm_dispatcher = load(".src.code_analyser.llm_dispatcher")
+models = load(".src.code_analyser.code_file_eval_model")
+
+MESSAGES = [{"role": "user", "content": "def f():\n    return 1\n"}]
+
+
+class ScriptedHandler(FakeGroqHandler):
+    # Answers the first len(server.script) requests with the scripted (status, retry-after)
+    def do_POST(self):
+        with self.server.lock:
+            self.server.seen += 1
+            step = self.server.script.pop(0) if self.server.script else None
+        if step is None:
+            return super().do_POST()
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, retry_after = step
+        headers = {"retry-after": retry_after} if retry_after is not None else {}
+        self._send(status, {"error": {"message": f"scripted {status}"}}, headers)
+
+
+@pytest.fixture
+def server():
+    server = FakeGroqServer(latency=0.0, jitter=0.0)
+    server.RequestHandlerClass = ScriptedHandler
+    server.script = []
+    server.seen = 0
+    server.startInBackground()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def dispatcher(server, **options):
+    return llm_dispatcher.LlmDispatcher(
+        ["key"], requests_per_minute=1e6, tokens_per_minute=1e9, base_url=server.base_url, **options
+    )
+
+
+def test_throttled_request_waits_for_retry_after_then_succeeds(server):
+    server.script = [(429, "0.3"), (503, None)]
+    client = dispatcher(server, base_delay=0.05)
+    try:
+        started = time.monotonic()
+        client.submit("model", MESSAGES, models.CodeReviewModel).result(timeout=10)
+        elapsed = time.monotonic() - started
+    finally:
+        client.close()
+
+    # One request per attempt: instructor does not retry API errors on its own
+    assert server.seen == 3
+    assert elapsed >= 0.3
+    state, = client.key_pool.states.values()
+    assert state.throttle_count == 1 and state.error_count == 1
+
+
+def test_non_retryable_error_fails_at_once(server):
+    server.script = [(400, None)]
+    client = dispatcher(server)
+    try:
+        with pytest.raises(Exception) as raised:
+            client.submit("model", MESSAGES, models.CodeReviewModel).result(timeout=10)
+    finally:
+        client.close()
+
+    assert isinstance(client._findApiError(raised.value), groq.BadRequestError)
+    assert server.seen == 1
+
+
+def test_retries_stop_after_max_retries(server):
+    server.script = [(503, None)] * 10
+    client = dispatcher(server, max_retries=2, base_delay=0.01)
+    try:
+        with pytest.raises(Exception):
+            client.submit("model", MESSAGES, models.CodeReviewModel).result(timeout=10)
+    finally:
+        client.close()
+
+    assert server.seen == 3
+
+
+def test_retry_after_is_clamped_to_max_delay(server):
+    client = dispatcher(server, base_delay=0.5, max_delay=2.0)
+
+    for _ in range(20):
+        assert 2.0 <= client._backoff(0, 3600.0) <= 2.5
+    assert client._backoff(0, 0.0) <= 0.5
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    def error(value):
+        return SimpleNamespace(response=SimpleNamespace(headers={"retry-after": value}))
+
+    retryAfter = llm_dispatcher.LlmDispatcher._retryAfter
+    assert retryAfter(error("7")) == 7.0
+    assert 25 <= retryAfter(error(email.utils.formatdate(time.time() + 30, usegmt=True))) <= 30
+    assert retryAfter(error(email.utils.formatdate(time.time() - 30, usegmt=True))) == 0.0
+    assert retryAfter(error("soon")) is None
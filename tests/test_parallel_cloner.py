@@ -0,0 +1,89 @@
+import os
+import socket
+import subprocess
+import time
+
+import pytest
+
+from support import GitHttpServer, load
+
+git_handler = load(".src.fetcher.git_handler")
+repository_manager = load(".src.fetcher.repository_manager")
+parallel_cloner = load(".src.fetcher.parallel_cloner")
+
+
+def git(*args, cwd=None):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def remote(tmp_path):
+    # A bare repository with three commits, so a depth-1 clone is observably shallow
+    work = tmp_path / "work"
+    work.mkdir()
+    git("init", "-q", cwd=work)
+    for index in range(3):
+        (work / "module.py").write_text(f"VALUE = {index}\n")
+        git("add", "module.py", cwd=work)
+        git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", f"c{index}", cwd=work)
+    git("clone", "-q", "--bare", str(work), str(tmp_path / "remotes" / "demo.git"))
+    return tmp_path / "remotes"
+
+
+def cloner(**options):
+    return parallel_cloner.ParallelCloner(repository_manager.RepositoryManager(git_handler.GitHandler()), **options)
+
+
+def test_depth_one_clone_is_shallow(remote, tmp_path):
+    server = GitHttpServer(str(remote))
+    try:
+        [result] = cloner(depth=1).clone_all([server.url("demo.git")], str(tmp_path / "clones"))
+    finally:
+        server.close()
+
+    assert result.error is None
+    repo = git_handler.GitHandler.open_repository(result.path)
+    assert repo.is_shallow
+    assert len(list(repo.walk(repo.head.target))) == 1
+
+
+def test_local_shallow_clone_falls_back_to_full(remote, tmp_path):
+    url = "file://" + str(remote / "demo.git")
+    [result] = cloner(depth=1).clone_all([url], str(tmp_path / "clones"))
+
+    assert result.error is None
+    repo = git_handler.GitHandler.open_repository(result.path)
+    assert not repo.is_shallow
+    assert len(list(repo.walk(repo.head.target))) == 3
+
+
+def test_stalled_clone_times_out(tmp_path):
+    # Accepts the connection and never answers, so libgit2 reports no progress
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    url = "http://127.0.0.1:%d/stalled.git" % listener.getsockname()[1]
+    try:
+        started = time.monotonic()
+        [result] = cloner(timeout=1.0).clone_all([url], str(tmp_path / "clones"))
+        elapsed = time.monotonic() - started
+    finally:
+        listener.close()
+
+    assert result.path is None
+    assert "timeout" in result.error
+    assert elapsed < 5
+
+
+def test_bare_clone_is_reused_on_rerun(remote, tmp_path):
+    url = "file://" + str(remote / "demo.git")
+    [first] = cloner(bare=True).clone_all([url], str(tmp_path / "clones"))
+    # Pipeline output lands next to the git dir, not inside it
+    os.makedirs(os.path.join(first.path, "output_data"))
+    [second] = cloner(bare=True).clone_all([url], str(tmp_path / "clones"))
+
+    assert second.error is None and second.bytes_fetched == 0
+    assert os.path.isdir(os.path.join(second.path, "output_data"))
+    repo = git_handler.GitHandler.open_repository(second.path)
+    assert repo.is_bare
+    assert os.path.samefile(repo.path, os.path.join(second.path, ".git"))
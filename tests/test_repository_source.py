@@ -0,0 +1,47 @@
+import subprocess
+
+import pytest
+
+from support import load
+
+repository_source = load(".src.fetcher.repository_source")
+
+
+def git(*args, cwd=None):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def checkout(tmp_path):
+    work = tmp_path / "work"
+    (work / "pkg").mkdir(parents=True)
+    (work / "pkg" / "core.py").write_text("def run():\n    return 1\n")
+    (work / "app.js").write_text("export const x = 1;\n")
+    (work / "app.min.js").write_text("var x=1;\n")
+    (work / "node_modules" / "dep").mkdir(parents=True)
+    (work / "node_modules" / "dep" / "index.js").write_text("module.exports = 1;\n")
+    git("init", "-q", cwd=work)
+    git("add", "-A", cwd=work)
+    git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "init", cwd=work)
+    return work
+
+
+def test_repository_source_is_abstract():
+    with pytest.raises(TypeError):
+        repository_source.RepositorySource("unused")
+
+
+def test_bare_clone_and_working_tree_agree(checkout, tmp_path):
+    bare = tmp_path / "bare"
+    git("clone", "-q", "--bare", str(checkout), str(bare / ".git"))
+    # Pipeline output next to a bare clone's git dir is not part of its tree
+    (bare / "output_data").mkdir()
+
+    tree = repository_source.RepositorySource.open(str(bare))
+    working = repository_source.WorkingTreeSource(str(checkout))
+
+    assert isinstance(tree, repository_source.GitTreeSource)
+    blobs = {blob.relative_path: blob.oid for blob in tree.walk()}
+    assert blobs == {blob.relative_path: blob.oid for blob in working.walk()}
+    assert sorted(blobs) == ["app.js", "pkg/core.py"]
+    assert tree.read(tree.toPath("pkg/core.py")) == (checkout / "pkg" / "core.py").read_bytes()
@@ -0,0 +1,71 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from support import load
+
+review_cache = load(".src.code_analyser.review_cache")
+models = load(".src.code_analyser.code_file_eval_model")
+
+
+def review(score):
+    fields = models.CodeReviewModel.model_fields
+    return models.CodeReviewModel(**{name: models.CodeReviewCategory(score=score) for name in fields})
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A strictly increasing clock, so access order never ties
+    clock = itertools.count(1000)
+    monkeypatch.setattr(review_cache, "time", SimpleNamespace(time=lambda: float(next(clock))))
+    cache = review_cache.ReviewCache(str(tmp_path / "cache" / "reviews.sqlite"), max_entries=3)
+    yield cache
+    cache.close()
+
+
+def test_keys_depend_on_prompt_model_and_code():
+    key = review_cache.ReviewCache.makeKey("prompt", "model", models.CodeReviewModel, "code")
+
+    assert key == review_cache.ReviewCache.makeKey("prompt", "model", models.CodeReviewModel, "code")
+    assert key != review_cache.ReviewCache.makeKey("prompt", "other", models.CodeReviewModel, "code")
+    assert key != review_cache.ReviewCache.makeKey("prompt", "model", models.CodeReviewModel, "code ")
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for key in ("a", "b", "c"):
+        cache.put(key, review(5))
+    # Reading a makes b the least recently used
+    assert cache.get("a", models.CodeReviewModel) == review(5)
+    cache.put("d", review(7))
+
+    assert cache.get("b", models.CodeReviewModel) is None
+    for key in ("a", "c", "d"):
+        assert cache.get(key, models.CodeReviewModel) is not None
+    assert cache.stats()["entries"] == 3
+
+
+def test_unreadable_entry_is_dropped_as_a_miss(cache):
+    cache.put("a", review(5))
+    cache._conn.execute("UPDATE reviews SET review = 'not json' WHERE key = 'a'")
+
+    assert cache.get("a", models.CodeReviewModel) is None
+    assert cache.stats() == {"hits": 0, "misses": 1, "entries": 0}
+
+
+def test_purge_empties_the_cache_and_its_stats(cache, tmp_path):
+    cache.put("a", review(5))
+    cache.get("a", models.CodeReviewModel)
+    cache.get("missing", models.CodeReviewModel)
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+    cache.purge()
+
+    assert cache.stats() == {"hits": 0, "misses": 0, "entries": 0}
+    assert cache.get("a", models.CodeReviewModel) is None
+    # Entries survive reopening until purged
+    cache.put("b", review(6))
+    cache.close()
+    reopened = review_cache.ReviewCache(cache.path)
+    assert reopened.get("b", models.CodeReviewModel) == review(6)
+    reopened.close()
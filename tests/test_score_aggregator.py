@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+
+from support import load
+
+score_aggregator = load(".src.code_analyser.score_aggregator")
+scoring = load(".src.code_analyser.scoring")
+
+
+def review(score):
+    return {"readability": {"score": score}}
+
+
+def test_unweighted_quantiles_match_numpy_hazen():
+    aggregator = score_aggregator.ScoreAggregator(categories=("readability",))
+    scores = [3, 9, 4, 7, 7, 1, 8]
+    for score in scores:
+        aggregator.add("repo", review(score))
+    stats = aggregator.summary()["readability"]
+
+    assert stats["median"] == np.median(scores)
+    for percentile in (25, 75, 90):
+        assert np.isclose(stats[f"p{percentile}"], np.percentile(scores, percentile, method="hazen"))
+
+
+def test_quantiles_follow_the_weight():
+    aggregator = score_aggregator.ScoreAggregator(categories=("readability",))
+    # One large unit scored 9 against three small ones scored 2
+    aggregator.add("repo", review(9), size=9000)
+    for _ in range(3):
+        aggregator.add("repo", review(2), size=100)
+
+    assert aggregator.summary()["readability"]["median"] == 2
+    weighted = aggregator.summary(weight="size")["readability"]
+    assert weighted["median"] > 8
+    assert weighted["mean"] > 8
+
+
+def test_score_repos_computes_means_once(monkeypatch, tmp_path):
+    aggregator = score_aggregator.ScoreAggregator(categories=("readability",))
+    repos = [str(tmp_path / name) for name in ("a", "b", "c")]
+    for index, repo in enumerate(repos):
+        aggregator.add(repo, review(index + 1))
+    calls = []
+    means = aggregator.means
+    monkeypatch.setattr(aggregator, "means", lambda weight=None: calls.append(weight) or means(weight))
+    scorer = scoring.RepoScorer()
+    monkeypatch.setattr(scorer, "getGithubUrl", lambda repoPath: repoPath)
+
+    scores = scorer.scoreRepos(aggregator, repos)
+
+    assert len(calls) == 1
+    assert [score["readability"] for score in scores] == [1.0, 2.0, 3.0]
+    assert [score["repo_link"] for score in scores] == repos
+
+
+def test_load_reviews_reads_only_review_outputs(tmp_path):
+    output = tmp_path / "output_data"
+    output.mkdir()
+    (output / ("unit" + scoring.OUTPUT_SUFFIX)).write_text(json.dumps(review(6)))
+    (output / "notes.txt").write_text("not a review")
+
+    assert scoring.RepoScorer().loadReviews(str(tmp_path)) == [review(6)]
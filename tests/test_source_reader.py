@@ -0,0 +1,58 @@
+import io
+
+import pytest
+
+from support import load
+
+source_reader = load(".src.chunker.source_reader")
+repository_source = load(".src.fetcher.repository_source")
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"one\ntwo\nthree",
+    b"one\r\ntwo\r\n\r\nthree\r\n",
+    b"mixed\r\nold mac\runix\n\rend",
+    b"trailing cr\r",
+])
+def test_lines_match_text_mode_readlines(data):
+    source_file = source_reader.SourceFile("memory", data)
+    expected = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8").readlines()
+
+    assert source_file.line_count == len(expected)
+    assert source_file.lines() == expected
+    assert source_file.text() == "".join(expected)
+
+
+def test_crlf_line_spans_cover_the_raw_bytes():
+    data = b"a = 1\r\nb = 2\r\nc = 3\r\n"
+    source_file = source_reader.SourceFile("memory", data)
+
+    assert list(source_file.offsets) == [0, 7, 14, 21]
+    assert bytes(source_file.line_bytes(1, 1)) == b"b = 2\r\n"
+    assert source_file.text(1, 2) == "b = 2\nc = 3\n"
+    # Clamped like lines[start:end + 1]
+    assert source_file.text(2, 10) == "c = 3\n"
+    assert source_file.text(5, 6) == ""
+
+
+def test_pinned_files_survive_eviction(tmp_path):
+    paths = []
+    for index in range(4):
+        path = tmp_path / f"f{index}.py"
+        path.write_text(f"x = {index}\n")
+        paths.append(str(path))
+    reader = source_reader.SourceReader(repository_source.WorkingTreeSource(str(tmp_path)), max_files=2)
+
+    with reader.open(paths[0]):
+        pinned = reader.get(paths[0])
+        for path in paths[1:]:
+            reader.get(path)
+        # f1 and f2 were evicted in its place
+        assert list(reader._files) == [paths[0], paths[3]]
+        assert reader._files[paths[0]] is pinned
+        assert pinned.text() == "x = 0\n"
+    # Unpinned, it is the least recently used file and goes on the next eviction
+    reader.get(paths[1])
+    assert list(reader._files) == [paths[3], paths[1]]
+    reader.close()